@@ -1,23 +1,75 @@
-import { useState } from 'react'
-import type { RecentPlay } from '@/types/dashboard'
+import { useEffect, useState } from 'react'
+import type { RecentPlay, RecentPlaysArchiveIndex } from '@/types/dashboard'
 
 interface RecentPlaysTableProps {
   plays: RecentPlay[]
 }
 
+// GitHub Pagesの場合はbasePathを考慮
+const ARCHIVE_PATH = `${process.env.NODE_ENV === 'production' ? '/games-dashboard' : ''}/data/dashboard/recentPlaysArchive`
+
 export default function RecentPlaysTable({ plays }: RecentPlaysTableProps) {
   const [viewMode, setViewMode] = useState<'initial' | 'paginated'>('initial')
   const [currentPage, setCurrentPage] = useState(1)
+  // アーカイブ（recentPlays より古いプレイ）: undefined = 未取得、null = 無し
+  const [archiveIndex, setArchiveIndex] = useState<RecentPlaysArchiveIndex | null | undefined>(undefined)
+  // 読み込み済みのアーカイブのプレイ（新しい順）と読み込んだシャード数（末尾のシャードから読む）
+  const [archivePlays, setArchivePlays] = useState<RecentPlay[]>([])
+  const [loadedShards, setLoadedShards] = useState(0)
+  const [loadingShard, setLoadingShard] = useState(false)
 
   const INITIAL_DISPLAY = 10
   const ITEMS_PER_PAGE = 100
 
+  const allPlays = plays.concat(archivePlays)
+  const totalCount = plays.length + (archiveIndex?.totalPlays ?? 0)
+
   // 表示するデータを計算
   const displayPlays = viewMode === 'initial'
-    ? plays.slice(0, INITIAL_DISPLAY)
-    : plays.slice((currentPage - 1) * ITEMS_PER_PAGE, currentPage * ITEMS_PER_PAGE)
+    ? allPlays.slice(0, INITIAL_DISPLAY)
+    : allPlays.slice((currentPage - 1) * ITEMS_PER_PAGE, currentPage * ITEMS_PER_PAGE)
+
+  const totalPages = Math.max(1, Math.ceil(totalCount / ITEMS_PER_PAGE))
 
-  const totalPages = Math.ceil(plays.length / ITEMS_PER_PAGE)
+  // ページングモードに入ったらアーカイブのインデックスを取得（無ければ recentPlays だけをページングする）
+  useEffect(() => {
+    if (viewMode !== 'paginated' || archiveIndex !== undefined) {
+      return
+    }
+    fetch(`${ARCHIVE_PATH}/index.json?t=${Date.now()}`, { cache: 'no-store' })
+      .then(response => (response.ok ? response.json() : null))
+      .then(index => setArchiveIndex(index))
+      .catch(() => setArchiveIndex(null))
+  }, [viewMode, archiveIndex])
+
+  // 表示するページに必要な分だけ、新しいシャードから順にアーカイブを読み込む
+  useEffect(() => {
+    if (!archiveIndex || loadingShard || loadedShards >= archiveIndex.shards.length) {
+      return
+    }
+    if (allPlays.length >= currentPage * ITEMS_PER_PAGE) {
+      return
+    }
+    const shard = archiveIndex.shards[archiveIndex.shards.length - 1 - loadedShards]
+    setLoadingShard(true)
+    fetch(`${ARCHIVE_PATH}/${shard.file}?v=${shard.hash}`)
+      .then(response => {
+        if (!response.ok) {
+          throw new Error(`Failed to fetch archive shard: ${shard.file}`)
+        }
+        return response.json()
+      })
+      .then((shardPlays: RecentPlay[]) => {
+        // シャードは古い順なので逆順にして続ける
+        setArchivePlays(previous => previous.concat(shardPlays.reverse()))
+        setLoadedShards(previous => previous + 1)
+      })
+      .catch(err => {
+        console.error('Error fetching recent plays archive:', err)
+        setArchiveIndex(null)
+      })
+      .finally(() => setLoadingShard(false))
+  }, [archiveIndex, loadedShards, loadingShard, currentPage, allPlays.length])
 
   const handleShowMore = () => {
     setViewMode('paginated')
@@ -48,7 +100,7 @@ export default function RecentPlaysTable({ plays }: RecentPlaysTableProps) {
           最近のプレイ記録
         </h2>
         <span className="text-sm text-gray-500 dark:text-gray-400">
-          全{plays.length}件
+          全{totalCount}件
         </span>
       </div>
 
@@ -112,7 +164,7 @@ export default function RecentPlaysTable({ plays }: RecentPlaysTableProps) {
             onClick={handleShowMore}
             className="px-6 py-2 bg-indigo-600 text-white rounded-lg hover:bg-indigo-700 transition-colors font-medium"
           >
-            もっと見る（全{plays.length}件）
+            もっと見る（全{totalCount}件）
           </button>
         </div>
       )}
@@ -143,7 +195,7 @@ export default function RecentPlaysTable({ plays }: RecentPlaysTableProps) {
             </button>
 
             <span className="px-4 py-2 text-sm text-gray-700 dark:text-gray-300">
-              {currentPage} / {totalPages} ページ
+              {currentPage} / {totalPages} ページ{loadingShard && '（読み込み中...）'}
             </span>
 
             <button
@@ -160,7 +212,7 @@ export default function RecentPlaysTable({ plays }: RecentPlaysTableProps) {
           </div>
 
           <div className="text-sm text-gray-500 dark:text-gray-400">
-            {(currentPage - 1) * ITEMS_PER_PAGE + 1} - {Math.min(currentPage * ITEMS_PER_PAGE, plays.length)} 件目
+            {(currentPage - 1) * ITEMS_PER_PAGE + 1} - {Math.min(currentPage * ITEMS_PER_PAGE, totalCount)} 件目
           </div>
         </div>
       )}
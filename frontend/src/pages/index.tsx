@@ -7,7 +7,7 @@ import SongPlaysByDifficultyTable from '@/components/SongPlaysByDifficultyTable'
 import SongPlayCountsByDifficultyTable from '@/components/SongPlayCountsByDifficultyTable'
 import LoginForm from '@/components/LoginForm'
 import { isAuthenticated, logout } from '@/utils/auth'
-import type { DashboardData } from '@/types/dashboard'
+import type { DashboardData, DashboardManifest } from '@/types/dashboard'
 
 export default function Home() {
   const [authenticated, setAuthenticated] = useState(false)
@@ -33,9 +33,9 @@ export default function Home() {
       setUpdateMessage(null)
       // GitHub Pagesの場合はbasePathを考慮
       const basePath = process.env.NODE_ENV === 'production' ? '/games-dashboard' : ''
-      // キャッシュバスティング: タイムスタンプを追加して常に最新データを取得
+      // マニフェストはキャッシュバスティング: タイムスタンプを追加して常に最新データを取得
       const cacheBuster = `?t=${Date.now()}`
-      const response = await fetch(`${basePath}/data/dashboard.json${cacheBuster}`, {
+      const response = await fetch(`${basePath}/data/dashboard/manifest.json${cacheBuster}`, {
         cache: 'no-store',
         headers: {
           'Cache-Control': 'no-cache'
@@ -46,7 +46,23 @@ export default function Home() {
         throw new Error('Failed to fetch dashboard data')
       }
 
-      const jsonData: DashboardData = await response.json()
+      const manifest: DashboardManifest = await response.json()
+
+      // セクションは内容のハッシュをクエリに付けて取得（変更のないセクションはブラウザのキャッシュを使う）
+      const sections = await Promise.all(
+        Object.entries(manifest.sections).map(async ([name, section]) => {
+          const sectionResponse = await fetch(`${basePath}/data/dashboard/${section.file}?v=${section.hash}`)
+          if (!sectionResponse.ok) {
+            throw new Error(`Failed to fetch dashboard section: ${name}`)
+          }
+          return [name, await sectionResponse.json()] as const
+        })
+      )
+
+      const jsonData = {
+        lastUpdated: manifest.lastUpdated,
+        ...Object.fromEntries(sections),
+      } as DashboardData
       const oldTime = data?.lastUpdated
       setData(jsonData)
       setError(null)
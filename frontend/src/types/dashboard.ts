@@ -2,11 +2,15 @@ export interface DashboardData {
   lastUpdated: string;
   kpi: KPI;
   dailyActiveUsers: DailyActiveUser[];
+  retention?: Retention;
+  rollingActiveUsers?: RollingActiveUser[];
   characterDistribution: Record<string, number>;
   difficultyDistribution: Record<string, number>;
   clearRankDistribution: Record<string, number>;
   languageDistribution: Record<string, number>;
   cutsceneSkipRate: CutsceneSkipRate;
+  funnels?: Funnel[];
+  sessions?: Sessions;
   excludedDataStats?: ExcludedDataStats;
   recentPlays: RecentPlay[];
   songPlaysByDifficulty: SongPlayByDifficulty[];
@@ -17,6 +21,34 @@ export interface DashboardData {
   costumeDistribution?: CostumeDistribution[];
   platformCostumeCross?: PlatformCostumeCross[];
   ga4?: GA4Data;
+  meta?: DashboardMeta;
+}
+
+// データ更新ジョブの各スクリプトのステージごとの実行時間・処理件数
+export interface DashboardMeta {
+  pipeline: Record<string, PipelineRunSummary>;
+}
+
+export interface PipelineRunSummary {
+  finishedAt: string;
+  totalSeconds: number;
+  stages: {
+    name: string;
+    seconds: number;
+    records: number | null;
+  }[];
+}
+
+export interface DashboardManifest {
+  version: number;
+  lastUpdated: string;
+  sections: Record<string, DashboardSectionEntry>;
+}
+
+export interface DashboardSectionEntry {
+  file: string;
+  hash: string;
+  bytes: number;
 }
 
 export interface KPI {
@@ -29,12 +61,97 @@ export interface KPI {
 export interface DailyActiveUser {
   date: string;
   users: number;
+  // HyperLogLog で推定した場合の相対標準誤差
+  relativeError?: number;
 }
 
-export interface CutsceneSkipRate {
+// dailyActiveUsers と同じ日付。wau / mau28 / mau はその日を含む直近 7 / 28 / 30 日間のユーザー数
+export interface RollingActiveUser {
+  date: string;
+  dau: number;
+  wau: number;
+  mau28: number;
+  mau: number;
+  // DAU / MAU（%）
+  stickiness: number;
+}
+
+// コホートは初めて起動した日（週）のユーザー、リテンションは %
+export interface Retention {
+  days: number[];
+  overall: {
+    day: number;
+    cohortUsers: number;
+    retainedUsers: number;
+    rate: number;
+  }[];
+  // retention は days と同じ順（データの最終日より後の日は null）
+  daily: {
+    date: string;
+    newUsers: number;
+    retention: (number | null)[];
+  }[];
+  // retention[k] は k 週後にアクティブだった割合（week は月曜日）
+  weeklyCohorts: {
+    week: string;
+    newUsers: number;
+    retention: number[];
+  }[];
+}
+
+// プレイセッション（gapSeconds 秒の無操作、または launch / AppStart で区切る）
+export interface Sessions {
+  gapSeconds: number;
+  totalSessions: number;
+  // 秒
+  sessionLength: SessionStats & { distribution: { bracket: string; sessions: number }[] };
+  songsPerSession: SessionStats & { distribution: { songs: string; sessions: number }[] };
+  sessionsPerUser: SessionStats;
+  sessionsPerDay: { date: string; sessions: number }[];
+}
+
+// mean と p10 / p25 / p50 / p75 / p90
+export type SessionStats = Record<string, number>;
+
+// イベントのファネル（window は最初のステップからの制限時間（秒）、null なら無制限）
+export interface Funnel {
+  name: string;
+  window: number | null;
+  steps: FunnelStep[];
+}
+
+export interface FunnelStep {
+  step: string;
+  // このステップまで進んだ試行の数
+  count: number;
+  // 最初のステップに対する割合（%）
+  conversionRate: number;
+  // 直前のステップから進まなかった割合（%）
+  dropOffRate: number;
+  // 直前のステップからの秒数のパーセンタイル（最初のステップは null）
+  latency: Record<string, number> | null;
+}
+
+export interface CutsceneSkipRateStats {
   totalStart: number;
   totalSkip: number;
   skipRate: number;
+  totalSkipButtonPresses?: number;
+}
+
+// 全体の値はオープニング（Op）
+export interface CutsceneSkipRate extends CutsceneSkipRateStats {
+  byCutscene?: CutsceneSkipRateByCutscene[];
+  byCharacter?: CutsceneSkipRateByCharacter[];
+}
+
+export interface CutsceneSkipRateByCutscene extends CutsceneSkipRateStats {
+  cutscene: string;
+  character: string | null;
+}
+
+export interface CutsceneSkipRateByCharacter extends CutsceneSkipRateStats {
+  character: string;
 }
 
 export interface ExcludedDataStats {
@@ -52,12 +169,39 @@ export interface RecentPlay {
   clearType: string;
 }
 
+export interface RecentPlaysArchiveIndex {
+  version: number;
+  shardSize: number;
+  totalPlays: number;
+  boundary: string;
+  shards: RecentPlaysArchiveShard[];
+}
+
+export interface RecentPlaysArchiveShard {
+  file: string;
+  hash: string;
+  count: number;
+  from: string;
+  to: string;
+}
+
 export interface SongPlayByDifficulty {
   songId: string;
   easy: number;
   normal: number;
   hard: number;
   total: number;
+  // songPlaysByDifficulty を HyperLogLog で推定した場合の相対標準誤差
+  relativeError?: number;
+}
+
+// クリアレートのパーセンタイル（p50 は stats.median と同じ値）
+export interface ClearRatePercentiles {
+  p10: number;
+  p25: number;
+  p50: number;
+  p75: number;
+  p90: number;
 }
 
 export interface PlayerClearRateDistribution {
@@ -67,6 +211,7 @@ export interface PlayerClearRateDistribution {
     median: number;
     totalPlayers: number;
   };
+  percentiles?: ClearRatePercentiles;
 }
 
 export interface PlayClearRateDistribution {
@@ -76,6 +221,7 @@ export interface PlayClearRateDistribution {
     median: number;
     totalPlays: number;
   };
+  percentiles?: ClearRatePercentiles;
 }
 
 export interface GA4Data {
@@ -121,6 +267,8 @@ export interface PlatformDistribution {
   platform: string;
   plays: number;
   users: number;
+  // users を HyperLogLog で推定した場合の相対標準誤差
+  usersRelativeError?: number;
 }
 
 export interface CostumeDistribution {
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Aggregation Engine
+users_data を1回だけ走査し、登録されたアキュムレータへ各レコードを配信する
+"""
+
+import json
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from operator import itemgetter
+
+from timestamp_normalizer import TimestampNormalizer
+
+# 並列集計で1つのワーカーに渡すユーザー数
+SHARD_SIZE = 500
+
+
+class RebuildRequired(Exception):
+    """増分集計ができない（全件の再集計が必要な）データ変更を検出した"""
+
+
+class Accumulator:
+    """
+    集計アキュムレータの基底クラス
+
+    エンジンはユーザーごとに以下の順でフックを呼び出す:
+      start_user → add_result（results の各エントリ）→ add_event（timeStamp の各エントリ、キー順）→ end_user
+    必要なフックだけをオーバーライドすればよい。
+
+    add_result / add_event に渡されるキーは TimestampNormalizer で正規化済み（仏暦は西暦に変換）で、
+    day は集計対象なら 'YYYY-MM-DD'、異常年・未来日付などの除外対象なら None。
+
+    dependencies に他のアキュムレータを列挙すると、それらも（重複なく）フックを受け取る。
+    複数のセクションが1つの中間データ（列指向テーブルなど）を共有する場合に使う。
+
+    増分集計では add_result / add_event には前回以降に追加されたキーだけが渡され、
+    start_user / end_user は毎回全ユーザーに対して呼ばれる。
+    キーから集計した値は get_state / set_state で永続化し、
+    ユーザー単位の値（起動回数や最新の設定など）は毎回 start_user / end_user で集計する。
+    未来日付のキーは全ユーザーの走査後に add_result / add_event だけで渡される（永続化されない）。
+
+    並列集計では users_data を連続したシャードに分けてワーカーごとに集計し、
+    get_partial の値を users_data の順に merge_partial で結合する。
+    順に結合すれば値の初出順も1プロセスで集計した場合と一致する。
+    """
+
+    dependencies = ()
+
+    def start_user(self, user_id, user_data):
+        """ユーザーの走査開始時に呼ばれる"""
+
+    def add_result(self, user_id, result_id, result_data, day):
+        """results の1エントリごとに呼ばれる（result_data が辞書とは限らない）"""
+
+    def add_event(self, user_id, timestamp_key, event_type, day):
+        """timeStamp の1エントリごとに呼ばれる"""
+
+    def end_user(self, user_id, user_data):
+        """ユーザーの走査終了時に呼ばれる"""
+
+    def get_state(self):
+        """キーから集計した値を JSON 化できる形で返す"""
+        return None
+
+    def set_state(self, state):
+        """get_state で保存した値を復元する"""
+
+    def get_partial(self):
+        """並列集計で1シャード分の集計値を返す（既定は get_state、ユーザー単位の値も含める場合はオーバーライド）"""
+        return self.get_state()
+
+    def merge_partial(self, partial):
+        """別のシャードの get_partial の値を結合する（シャードは users_data の順に結合される）"""
+        raise NotImplementedError
+
+    def result(self):
+        """集計結果を返す"""
+        raise NotImplementedError
+
+
+def _overrides(accumulator, hook_name):
+    """アキュムレータが基底クラスのフックをオーバーライドしているか"""
+    return getattr(type(accumulator), hook_name) is not getattr(Accumulator, hook_name)
+
+
+def collect_receivers(accumulators):
+    """フックを受け取るアキュムレータ（依存を先に、同じインスタンスは1回だけ）"""
+    receivers = []
+    for accumulator in accumulators.values():
+        for receiver in (*accumulator.dependencies, accumulator):
+            if not any(receiver is seen for seen in receivers):
+                receivers.append(receiver)
+    return receivers
+
+
+def get_states(accumulators):
+    """全アキュムレータの永続化用の状態を返す"""
+    return {name: acc.get_state() for name, acc in accumulators.items()}
+
+
+def set_states(accumulators, states):
+    """get_states で保存した状態を全アキュムレータに復元する"""
+    for name, acc in accumulators.items():
+        acc.set_state(states[name])
+
+
+def _split_new_entries(entries, normalize, is_future, watermark, folded_count):
+    """
+    ウォーターマークより新しいエントリを (今回集計するもの, 未来日付のもの) に分ける
+
+    entries は (生キー, 値) の列。戻り値は (due, pending, [新しいウォーターマーク, 集計済み件数])。
+    due / pending の要素は (正規化済みキー, 値, 日付)。
+    ウォーターマーク以下のキーの件数が前回と異なる場合は RebuildRequired を送出する。
+    """
+    due = []
+    pending = []
+    at_or_below = 0
+    for raw_key, value in entries:
+        key, day = normalize(raw_key)
+        if watermark is not None and key <= watermark:
+            at_or_below += 1
+        elif day is None and is_future(key):
+            pending.append((key, value, day))
+        else:
+            due.append((key, value, day))
+
+    if at_or_below != folded_count:
+        raise RebuildRequired('keys at or below the watermark have changed')
+
+    for key, _, _ in due:
+        if watermark is None or key > watermark:
+            watermark = key
+    return due, pending, [watermark, folded_count + len(due)]
+
+
+def _collect_hooks(accumulators):
+    """オーバーライドされたフックだけを {フック名: [メソッド]} で返す（何もしないフック呼び出しを避ける）"""
+    receivers = collect_receivers(accumulators)
+    return {
+        name: [getattr(acc, name) for acc in receivers if _overrides(acc, name)]
+        for name in ('start_user', 'add_result', 'add_event', 'end_user')
+    }
+
+
+def scan_users(users_data, accumulators, normalizer=None, watermarks=None):
+    """
+    users_data を1パスで走査して全アキュムレータに配信する
+
+    users_data は辞書、または items() で (user_id, user_data) を順に返すオブジェクト（RawDataReader など）。
+    accumulators は {セクション名: Accumulator} の辞書。
+    各キーの解析は normalizer（省略時は新規の TimestampNormalizer）で1回だけ行う。
+
+    watermarks（{user_id: [results の最大キー, 件数, timeStamp の最大キー, 件数]}）を渡すと、
+    各ユーザーのウォーターマークより新しいキーだけを集計し、辞書をその場で更新する（空の辞書なら全件）。
+    前回集計済みのデータが変わっていた場合は RebuildRequired を送出する。
+
+    未来日付のキーは配信せず、ウォーターマークにも含めない。
+    戻り値はそれらの (pending_results, pending_events) で、feed_pending で後から配信する。
+    """
+    normalizer = normalizer or TimestampNormalizer()
+    normalize = normalizer.normalize
+    is_future = normalizer.is_future
+
+    hooks = _collect_hooks(accumulators)
+    start_hooks = hooks['start_user']
+    result_hooks = hooks['add_result']
+    event_hooks = hooks['add_event']
+    end_hooks = hooks['end_user']
+
+    incremental = watermarks is not None
+    previous_user_count = len(watermarks) if incremental else 0
+    known_users = 0
+    pending_results = []
+    pending_events = []
+    first_key = itemgetter(0)
+
+    for user_id, user_data in users_data.items():
+        for hook in start_hooks:
+            hook(user_id, user_data)
+
+        results = user_data.get('results', {})
+        if not isinstance(results, dict):
+            results = {}
+        timestamps = user_data.get('timeStamp', {})
+
+        previous = watermarks.get(user_id) if incremental else None
+        if previous is None:
+            previous = [None, 0, None, 0]
+        else:
+            known_users += 1
+
+        due_results, pending, results_mark = _split_new_entries(
+            results.items(), normalize, is_future, previous[0], previous[1]
+        )
+        pending_results.extend((user_id, entry) for entry in pending)
+
+        due_events, pending, events_mark = _split_new_entries(
+            timestamps.items(), normalize, is_future, previous[2], previous[3]
+        )
+        pending_events.extend((user_id, entry) for entry in sorted(pending, key=first_key))
+
+        if incremental:
+            watermarks[user_id] = results_mark + events_mark
+
+        for result_id, result_data, day in due_results:
+            for hook in result_hooks:
+                hook(user_id, result_id, result_data, day)
+
+        # イベントはキー（時刻）順に配信する
+        due_events.sort(key=first_key)
+        for timestamp_key, event_type, day in due_events:
+            for hook in event_hooks:
+                hook(user_id, timestamp_key, event_type, day)
+
+        for hook in end_hooks:
+            hook(user_id, user_data)
+
+    if known_users != previous_user_count:
+        raise RebuildRequired('users have been removed since the last aggregation')
+
+    return pending_results, pending_events
+
+
+def feed_pending(accumulators, pending):
+    """scan_users が返した未来日付のキーを配信する"""
+    hooks = _collect_hooks(accumulators)
+    pending_results, pending_events = pending
+
+    for user_id, (result_id, result_data, day) in pending_results:
+        for hook in hooks['add_result']:
+            hook(user_id, result_id, result_data, day)
+    for user_id, (timestamp_key, event_type, day) in pending_events:
+        for hook in hooks['add_event']:
+            hook(user_id, timestamp_key, event_type, day)
+
+
+def run_accumulators(users_data, accumulators, normalizer=None, watermarks=None, on_checkpoint=None):
+    """
+    users_data を1パスで走査して全アキュムレータに配信し、結果を返す
+
+    引数は scan_users と同じ。戻り値は {セクション名: accumulator.result()} の辞書（登録順）。
+    未来日付のキーは全ユーザーの走査後に集計する（その直前に on_checkpoint() を呼ぶ）。
+    """
+    pending = scan_users(users_data, accumulators, normalizer, watermarks)
+
+    if on_checkpoint is not None:
+        on_checkpoint()
+
+    # 未来日付のキー（日付が来れば集計対象になるため、永続化する状態には含めない）
+    feed_pending(accumulators, pending)
+
+    return {name: acc.result() for name, acc in accumulators.items()}
+
+
+def iter_shards(users_data, shard_size=SHARD_SIZE):
+    """
+    users_data を shard_size 人ずつの連続したシャードに分ける
+
+    users_data が shards() を持つ場合（RawDataReader）はその JSON 文字列を、
+    それ以外は {user_id: user_data} の辞書を返す。
+    """
+    if hasattr(users_data, 'shards'):
+        yield from users_data.shards(shard_size)
+        return
+
+    shard = {}
+    for user_id, user_data in users_data.items():
+        shard[user_id] = user_data
+        if len(shard) >= shard_size:
+            yield shard
+            shard = {}
+    if shard:
+        yield shard
+
+
+def _scan_shard(build_accumulators, shard, today):
+    """ワーカープロセスで1シャードを集計し、(get_partial の値, ウォーターマーク, 未来日付のキー) を返す"""
+    if isinstance(shard, str):
+        shard = json.loads(shard)
+
+    accumulators = build_accumulators()
+    watermarks = {}
+    pending = scan_users(shard, accumulators, TimestampNormalizer(today), watermarks)
+    partials = {name: acc.get_partial() for name, acc in accumulators.items()}
+    return partials, watermarks, pending
+
+
+def run_accumulators_parallel(users_data, accumulators, build_accumulators, workers, normalizer=None,
+                              watermarks=None, on_checkpoint=None, shard_size=SHARD_SIZE):
+    """
+    users_data をシャードに分けてプロセスプールで集計し、accumulators に結合して結果を返す
+
+    build_accumulators は accumulators と同じ構成のアキュムレータ一式を新しく返すモジュールレベルの関数
+    （ワーカーへ渡すため pickle できる必要がある）。各シャードは新しいアキュムレータで集計し、
+    users_data の順に merge_partial で結合するため、結果は run_accumulators で集計した場合と同じになる。
+    watermarks に空の辞書を渡すと全ユーザーのウォーターマークを書き込む（増分集計の状態の作成用）。
+    """
+    today = (normalizer or TimestampNormalizer()).today
+    pending_results = []
+    pending_events = []
+
+    def merge(future):
+        partials, shard_watermarks, (shard_results, shard_events) = future.result()
+        for name, acc in accumulators.items():
+            acc.merge_partial(partials[name])
+        if watermarks is not None:
+            watermarks.update(shard_watermarks)
+        pending_results.extend(shard_results)
+        pending_events.extend(shard_events)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        # シャードを読み込みすぎないよう、実行中のシャード数を制限して順に結合する
+        in_flight = deque()
+        for shard in iter_shards(users_data, shard_size):
+            in_flight.append(executor.submit(_scan_shard, build_accumulators, shard, today))
+            if len(in_flight) >= workers * 2:
+                merge(in_flight.popleft())
+        while in_flight:
+            merge(in_flight.popleft())
+
+    if on_checkpoint is not None:
+        on_checkpoint()
+
+    feed_pending(accumulators, (pending_results, pending_events))
+
+    return {name: acc.result() for name, acc in accumulators.items()}
@@ -46,10 +46,11 @@ python3 "$SCRIPT_DIR/firebase_collector.py"
 
 # バックアップコピー
 echo "💾 Creating backup..."
-cp "$PROJECT_DIR/public/data/raw_data.json" "$BACKUP_DIR/raw_data_${TIMESTAMP}.json"
+# JSON が必要な場合: python3 scripts/raw_snapshot.py to-json backups/raw_data_XXX.snap raw_data.json
+cp "$PROJECT_DIR/public/data/raw_data.snap" "$BACKUP_DIR/raw_data_${TIMESTAMP}.snap"
 
 echo ""
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
 echo "✅ Backup completed successfully"
-echo "📁 Saved to: backups/raw_data_${TIMESTAMP}.json"
+echo "📁 Saved to: backups/raw_data_${TIMESTAMP}.snap"
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
@@ -18,18 +18,23 @@ echo "━━━━━━━━━━━━━━━━━━━━━━━━
 # バックアップディレクトリ作成
 mkdir -p "$BACKUP_DIR"
 
-# dashboard.json（集計済みデータ）
-echo "📥 Downloading dashboard.json..."
-curl -s https://takuroh51.github.io/games-dashboard/data/dashboard.json > "$BACKUP_DIR/dashboard_${TIMESTAMP}.json"
-
-# raw_data.json（生データ）
-echo "📥 Downloading raw_data.json..."
-curl -s https://takuroh51.github.io/games-dashboard/data/raw_data.json > "$BACKUP_DIR/raw_data_${TIMESTAMP}.json"
+# dashboard/（集計済みデータ、manifest.json に載っているセクションごとのJSON）
+echo "📥 Downloading dashboard sections..."
+DASHBOARD_DIR="$BACKUP_DIR/dashboard_${TIMESTAMP}"
+mkdir -p "$DASHBOARD_DIR"
+curl -s https://takuroh51.github.io/games-dashboard/data/dashboard/manifest.json > "$DASHBOARD_DIR/manifest.json"
+for FILE in $(python3 -c "import json, sys; print(' '.join(s['file'] for s in json.load(open(sys.argv[1]))['sections'].values()))" "$DASHBOARD_DIR/manifest.json"); do
+    curl -s "https://takuroh51.github.io/games-dashboard/data/dashboard/$FILE" > "$DASHBOARD_DIR/$FILE"
+done
+
+# raw_data.snap（生データ、JSON への変換は scripts/raw_snapshot.py to-json）
+echo "📥 Downloading raw_data.snap..."
+curl -s https://takuroh51.github.io/games-dashboard/data/raw_data.snap > "$BACKUP_DIR/raw_data_${TIMESTAMP}.snap"
 
 echo ""
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
 echo "✅ Backup completed successfully"
 echo "📁 Saved to: backups/"
-echo "   - dashboard_${TIMESTAMP}.json"
-echo "   - raw_data_${TIMESTAMP}.json"
+echo "   - dashboard_${TIMESTAMP}/"
+echo "   - raw_data_${TIMESTAMP}.snap"
 echo "━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━"
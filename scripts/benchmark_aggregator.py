@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Aggregator Benchmark
+合成データ（synthetic_data.py）のユーザー数ごとに、data_aggregator の各 calculate_* 関数と
+全セクションの集計（aggregate_sections）の処理時間・ピークメモリを測り、保存したベースラインと比較する
+
+    python scripts/benchmark_aggregator.py                          # 1k / 10k / 100k
+    python scripts/benchmark_aggregator.py --sizes 1000000          # 1M（生成に十数分かかる）
+    python scripts/benchmark_aggregator.py --targets aggregate_sections calculate_kpi
+    python scripts/benchmark_aggregator.py --save-baseline          # 結果をベースラインとして保存
+    python scripts/benchmark_aggregator.py --check                  # 悪化があれば終了コード1
+
+各計測は別プロセスで実行し、プロセスごとの最大RSSを測る（benchmark_memory.py と同じ方法）。
+生成したデータは --data-dir に保存し、同じユーザー数・seed・生成ロジックなら再利用する。
+ベースラインの集計結果のハッシュと異なる場合は、出力が変わったことも表示する。
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import synthetic_data
+
+SIZES = (1000, 10000, 100000, 1000000)
+DEFAULT_SIZES = (1000, 10000, 100000)
+END_TO_END_TARGET = 'aggregate_sections'
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmark_baseline.json')
+BASELINE_VERSION = 1
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), 'games-dashboard-benchmark')
+
+# ベースラインからの悪化とみなす割合と、小さいデータで誤差を拾わないための最小差
+DEFAULT_TOLERANCE = 0.25
+MIN_SECONDS_DIFF = 0.05
+MIN_MB_DIFF = 5.0
+
+
+def _max_rss_mb():
+    """このプロセスの最大RSS（MB、Linux の ru_maxrss は KB 単位）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def benchmark_targets():
+    """計測対象の関数名（calculate_* と全セクションの集計）"""
+    import data_aggregator
+
+    names = sorted(name for name in dir(data_aggregator) if name.startswith('calculate_'))
+    return names + [END_TO_END_TARGET]
+
+
+def run_target(target, input_path):
+    """1つの関数で集計し、計測結果を辞書で返す（子プロセスで呼ぶ）"""
+    import data_aggregator
+    from raw_data_reader import RawDataReader
+
+    function = getattr(data_aggregator, target)
+    baseline_mb = _max_rss_mb()
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        value = function(RawDataReader(input_path))
+
+    elapsed = time.perf_counter() - start
+    cpu_seconds = time.process_time() - cpu_start
+    digest = hashlib.sha256(json.dumps(value, ensure_ascii=False, sort_keys=True).encode('utf-8')).hexdigest()
+
+    return {
+        'seconds': round(elapsed, 3),
+        'cpuSeconds': round(cpu_seconds, 3),
+        'peakMb': round(_max_rss_mb(), 1),
+        'dataMb': round(_max_rss_mb() - baseline_mb, 1),
+        'sha256': digest[:16],
+    }
+
+
+def dataset_path(data_dir, size, seed):
+    return os.path.join(data_dir, f"synthetic_{size}_seed{seed}_v{synthetic_data.GENERATOR_VERSION}.snap")
+
+
+def prepare_dataset(data_dir, size, seed):
+    """合成データを用意し、(パス, 件数の辞書) を返す（生成済みならそのまま使う）"""
+    path = dataset_path(data_dir, size, seed)
+    counts_path = f"{path}.counts.json"
+    if os.path.exists(path) and os.path.exists(counts_path):
+        with open(counts_path, 'r', encoding='utf-8') as f:
+            return path, json.load(f)
+
+    print(f"Generating {size} users → {path}")
+    os.makedirs(data_dir, exist_ok=True)
+    start = time.perf_counter()
+    counts = synthetic_data.write_synthetic_data(size, path, seed)
+    print(f"✅ Generated in {time.perf_counter() - start:.1f}s "
+          f"({counts['results']} results, {counts['events']} events)")
+
+    with open(counts_path, 'w', encoding='utf-8') as f:
+        json.dump(counts, f)
+    return path, counts
+
+
+def load_baseline(path):
+    """保存済みのベースライン（無い・形式が合わない場合は空のベースライン）"""
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('version') == BASELINE_VERSION:
+            return baseline
+    return {'version': BASELINE_VERSION, 'datasets': {}, 'results': {}}
+
+
+def save_baseline(path, baseline, seed, datasets, results):
+    """計測したユーザー数の結果をベースラインに上書きして保存（他のユーザー数の結果は残す）"""
+    baseline['seed'] = seed
+    baseline['generatorVersion'] = synthetic_data.GENERATOR_VERSION
+    baseline['environment'] = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'system': platform.system(),
+        'cpus': os.cpu_count(),
+    }
+    for size, counts in datasets.items():
+        baseline['datasets'][str(size)] = counts
+    for size, size_results in results.items():
+        baseline['results'].setdefault(str(size), {}).update(size_results)
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(baseline, f, ensure_ascii=False, indent=2)
+        f.write('\n')
+
+
+def compare(result, previous, tolerance):
+    """ベースラインと比べた注記のリスト（悪化・出力の変化）"""
+    if not previous:
+        return []
+
+    notes = []
+    if (result['seconds'] > previous['seconds'] * (1 + tolerance)
+            and result['seconds'] - previous['seconds'] >= MIN_SECONDS_DIFF):
+        notes.append(f"time {previous['seconds']}s → {result['seconds']}s")
+    if (result['peakMb'] > previous['peakMb'] * (1 + tolerance)
+            and result['peakMb'] - previous['peakMb'] >= MIN_MB_DIFF):
+        notes.append(f"memory {previous['peakMb']}MB → {result['peakMb']}MB")
+    return notes
+
+
+def _parse_sizes(value):
+    return [int(size) for size in value.split(',')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark data_aggregator on synthetic data of several sizes')
+    parser.add_argument('--sizes', type=_parse_sizes, default=list(DEFAULT_SIZES),
+                        help=f"comma-separated user counts (default: {','.join(map(str, DEFAULT_SIZES))}, "
+                             f"up to {SIZES[-1]})")
+    parser.add_argument('--targets', nargs='+', help='functions to measure (default: every calculate_* and '
+                                                     f'{END_TO_END_TARGET})')
+    parser.add_argument('--seed', type=int, default=synthetic_data.DEFAULT_SEED)
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR, help='where generated datasets are kept')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help='relative slowdown / memory growth reported as a regression')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    parser.add_argument('--check', action='store_true', help='exit with status 1 if anything regressed')
+    parser.add_argument('--run', nargs=2, metavar=('TARGET', 'INPUT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run:
+        print(json.dumps(run_target(*args.run)))
+        return
+
+    targets = args.targets or benchmark_targets()
+    unknown = sorted(set(targets) - set(benchmark_targets()))
+    if unknown:
+        print(f"Error: unknown targets: {', '.join(unknown)}")
+        sys.exit(1)
+
+    baseline = load_baseline(args.baseline)
+    if baseline['datasets'] and (baseline.get('seed') != args.seed
+                                 or baseline.get('generatorVersion') != synthetic_data.GENERATOR_VERSION):
+        print("⚠️  Baseline was measured on different synthetic data; comparisons are not meaningful")
+
+    compared = any(baseline['results'].get(str(size)) for size in args.sizes)
+    datasets = {}
+    results = {}
+    regressions = 0
+    for size in args.sizes:
+        input_path, counts = prepare_dataset(args.data_dir, size, args.seed)
+        datasets[size] = counts
+        results[size] = {}
+        previous_results = baseline['results'].get(str(size), {})
+
+        print(f"\n{size} users ({counts['results']} results, {counts['events']} events)")
+        print(f"{'target':<44}{'time (s)':>10}{'cpu (s)':>10}{'peak RSS (MB)':>15}{'data (MB)':>11}")
+        for target in targets:
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--run', target, input_path],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            results[size][target] = result
+
+            previous = previous_results.get(target)
+            notes = compare(result, previous, args.tolerance)
+            regressions += len(notes)
+            if previous and previous['sha256'] != result['sha256']:
+                notes.append('output changed')
+
+            line = (f"{target:<44}{result['seconds']:>10.2f}{result['cpuSeconds']:>10.2f}"
+                    f"{result['peakMb']:>15.1f}{result['dataMb']:>11.1f}")
+            print(f"{line}  ⚠️  {'; '.join(notes)}" if notes else line)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, baseline, args.seed, datasets, results)
+        print(f"\n✅ Baseline saved to {args.baseline}")
+
+    if regressions:
+        print(f"\n⚠️  {regressions} regressions against the baseline (tolerance {args.tolerance:.0%})")
+        if args.check:
+            sys.exit(1)
+    elif compared:
+        print("\n✅ No regressions against the baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Memory Benchmark
+生データを全件読み込む場合（load_raw_data）と RawDataReader で1ユーザーずつ読む場合の
+ピークメモリ（最大RSS）と処理時間を比較する
+
+    python scripts/benchmark_memory.py [public/data/raw_data.snap]
+
+各方式は別プロセスで実行し、プロセスごとの最大RSSを測る。
+"""
+
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+MODES = ('load', 'stream')
+
+
+def _max_rss_mb():
+    """このプロセスの最大RSS（MB、Linux の ru_maxrss は KB 単位）"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_mode(mode, input_path):
+    """1つの方式で集計し、計測結果を辞書で返す（子プロセスで呼ぶ）"""
+    import data_aggregator
+    from raw_data_reader import RawDataReader
+
+    baseline_mb = _max_rss_mb()
+    start = time.perf_counter()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if mode == 'load':
+            users_data = data_aggregator.load_raw_data(input_path)
+        else:
+            users_data = RawDataReader(input_path)
+        sections = data_aggregator.aggregate_sections(users_data)
+
+    elapsed = time.perf_counter() - start
+    digest = hashlib.sha256(json.dumps(sections, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    return {
+        'mode': mode,
+        'seconds': round(elapsed, 2),
+        'baselineMb': round(baseline_mb, 1),
+        'peakMb': round(_max_rss_mb(), 1),
+        'sha256': digest,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare peak memory of loading all raw data and streaming aggregation')
+    parser.add_argument('input_path', nargs='?', default='public/data/raw_data.snap')
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.input_path)))
+        return
+
+    if not os.path.exists(args.input_path):
+        print(f"Error: {args.input_path} not found")
+        sys.exit(1)
+
+    size_mb = os.path.getsize(args.input_path) / (1024 * 1024)
+    print(f"Input: {args.input_path} ({size_mb:.1f} MB)")
+    print(f"{'mode':<8}{'time (s)':>10}{'baseline (MB)':>15}{'peak RSS (MB)':>15}{'data (MB)':>11}")
+
+    results = []
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--mode', mode, args.input_path],
+            check=True, capture_output=True, text=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        results.append(result)
+        print(f"{mode:<8}{result['seconds']:>10}{result['baselineMb']:>15}{result['peakMb']:>15}"
+              f"{result['peakMb'] - result['baselineMb']:>11.1f}")
+
+    if len({result['sha256'] for result in results}) == 1:
+        print("✅ Both modes produced identical sections")
+    else:
+        print("⚠️  Sections differ between modes")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
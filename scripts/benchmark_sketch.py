@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Sketch Benchmark
+ユニークユーザー数を正確に数える場合（ユーザーIDのセット）と HyperLogLog で推定する場合の
+集計時間・集計状態のサイズ・推定誤差を比較する
+
+    python scripts/benchmark_sketch.py [public/data/raw_data.snap] [--sketch-error 0.02]
+"""
+
+import argparse
+import contextlib
+import gzip
+import io
+import json
+import os
+import sys
+import time
+
+import data_aggregator
+from aggregation_engine import get_states, run_accumulators
+from hyperloglog import DEFAULT_ERROR, precision_for_error, relative_error
+from raw_data_reader import RawDataReader
+
+# HyperLogLog で推定するセクション → (行のキー, ユーザー数の列)
+SKETCH_SECTIONS = {
+    'dailyActiveUsers': ('date', ['users']),
+    'songPlaysByDifficulty': ('songId', ['easy', 'normal', 'hard']),
+    'platformDistribution': ('platform', ['users']),
+}
+
+
+def run_mode(users_data, sketch_precision):
+    """1つの方式で集計し、(セクション, 秒数, gzip した状態のバイト数) を返す"""
+    accumulators = data_aggregator.build_dashboard_accumulators(sketch_precision=sketch_precision)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        sections = run_accumulators(users_data, accumulators)
+    elapsed = time.perf_counter() - start
+
+    state = {name: get_states(accumulators)[name] for name in SKETCH_SECTIONS}
+    state_bytes = len(gzip.compress(json.dumps(state, separators=(',', ':')).encode('utf-8')))
+    return sections, elapsed, state_bytes
+
+
+def relative_errors(exact, estimated):
+    """セクションごとの各値の相対誤差のリスト"""
+    errors = {}
+    for name, (key, columns) in SKETCH_SECTIONS.items():
+        estimated_rows = {row[key]: row for row in estimated[name]}
+        errors[name] = [
+            abs(estimated_rows[row[key]][column] - row[column]) / row[column]
+            for row in exact[name] for column in columns if row[column]
+        ]
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare exact unique user counts with HyperLogLog estimates')
+    parser.add_argument('input_path', nargs='?', default='public/data/raw_data.snap')
+    parser.add_argument('--sketch-error', type=float, default=DEFAULT_ERROR)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_path):
+        print(f"Error: {args.input_path} not found")
+        sys.exit(1)
+
+    precision = precision_for_error(args.sketch_error)
+    users_data = RawDataReader(args.input_path)
+    print(f"Input: {args.input_path} (precision {precision}, "
+          f"relative standard error {relative_error(precision):.4f})")
+
+    exact, exact_seconds, exact_bytes = run_mode(users_data, None)
+    estimated, sketch_seconds, sketch_bytes = run_mode(users_data, precision)
+
+    print(f"{'mode':<8}{'time (s)':>10}{'state (KB)':>12}")
+    print(f"{'exact':<8}{exact_seconds:>10.2f}{exact_bytes / 1024:>12.1f}")
+    print(f"{'sketch':<8}{sketch_seconds:>10.2f}{sketch_bytes / 1024:>12.1f}")
+
+    print(f"{'section':<24}{'values':>8}{'mean error':>12}{'max error':>11}")
+    for name, errors in relative_errors(exact, estimated).items():
+        if errors:
+            print(f"{name:<24}{len(errors):>8}{sum(errors) / len(errors):>12.4f}{max(errors):>11.4f}")
+
+
+if __name__ == '__main__':
+    main()
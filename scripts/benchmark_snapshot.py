@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Snapshot Benchmark
+生データの保存形式ごとのファイルサイズ・書き込み時間・読み込み時間を比較する
+
+    python scripts/benchmark_snapshot.py [public/data/raw_data.snap]
+
+入力は raw snapshot / raw_data.json のどちらでもよい。
+一時ディレクトリに以前の形式（indent=2 の JSON）と raw snapshot を書き出し、
+全件の読み込み（json.load / load_snapshot）と1ユーザーずつの読み込み（RawDataReader）の時間を測る。
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+from raw_data_reader import RawDataReader
+from raw_snapshot import is_snapshot, load_snapshot, write_snapshot
+
+
+def _timed(function):
+    """function() の (戻り値, 秒数)"""
+    start = time.perf_counter()
+    value = function()
+    return value, time.perf_counter() - start
+
+
+def _write_json(data, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+
+def _load_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _stream(path):
+    """RawDataReader で全ユーザーを読み、ユーザー数を返す"""
+    return sum(1 for _ in RawDataReader(path).items())
+
+
+def run_benchmark(data, work_dir):
+    """各形式の計測結果を [{'format', 'sizeMb', 'writeSeconds', 'loadSeconds', 'streamSeconds'}] で返す"""
+    json_path = os.path.join(work_dir, 'raw_data.json')
+    snapshot_path = os.path.join(work_dir, 'raw_data.snap')
+
+    formats = [
+        ('json (indent=2)', json_path, lambda: _write_json(data, json_path), lambda: _load_json(json_path)),
+        ('raw snapshot', snapshot_path, lambda: write_snapshot(data.items(), snapshot_path),
+         lambda: load_snapshot(snapshot_path)),
+    ]
+
+    results = []
+    for name, path, write, load in formats:
+        _, write_seconds = _timed(write)
+        loaded, load_seconds = _timed(load)
+        if loaded != data:
+            raise AssertionError(f"{name} did not round-trip the raw data")
+        del loaded
+        _, stream_seconds = _timed(lambda: _stream(path))
+
+        results.append({
+            'format': name,
+            'sizeMb': os.path.getsize(path) / (1024 * 1024),
+            'writeSeconds': write_seconds,
+            'loadSeconds': load_seconds,
+            'streamSeconds': stream_seconds,
+        })
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare file size and load time of raw data formats')
+    parser.add_argument('input_path', nargs='?', default='public/data/raw_data.snap')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input_path):
+        print(f"Error: {args.input_path} not found")
+        sys.exit(1)
+
+    data = load_snapshot(args.input_path) if is_snapshot(args.input_path) else _load_json(args.input_path)
+    print(f"Input: {args.input_path} ({len(data)} users)")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_benchmark(data, work_dir)
+
+    print(f"{'format':<18}{'size (MB)':>11}{'write (s)':>11}{'load (s)':>10}{'stream (s)':>12}")
+    for result in results:
+        print(f"{result['format']:<18}{result['sizeMb']:>11.2f}{result['writeSeconds']:>11.2f}"
+              f"{result['loadSeconds']:>10.2f}{result['streamSeconds']:>12.2f}")
+
+    baseline, snapshot = results
+    print(f"✅ raw snapshot is {baseline['sizeMb'] / snapshot['sizeMb']:.1f}x smaller "
+          f"and loads {baseline['loadSeconds'] / snapshot['loadSeconds']:.1f}x faster")
+
+
+if __name__ == '__main__':
+    main()
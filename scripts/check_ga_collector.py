@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+GA4 Collector Check
+BetaAnalyticsDataClient の代わりに固定のアクセスログから run_report に答える偽のクライアントで
+ga_collector.fetch_all_reports を実行し、一時的なエラーのリトライ後も同じ結果になることと、
+日別キャッシュを使った結果が全期間を取得し直した結果と同じになることを確認する
+
+    python scripts/check_ga_collector.py
+"""
+
+import random
+import threading
+from collections import defaultdict
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import ga_collector
+from google.api_core import exceptions as api_exceptions
+
+PROPERTY_ID = '0'
+TODAY = date(2025, 1, 20)
+
+LANGUAGES = ['ja', 'en', 'ko']
+PAGES = [('/', 'Top'), ('/news', 'News'), ('/guideline', 'Guideline'), ('/guideline/en', 'Guideline EN')]
+
+
+def generate_hits(days=20, users=40, hits=600, seed=0):
+    """アクセスログ [(日付, ユーザー, 言語, pagePath, pageTitle), ...]"""
+    rng = random.Random(seed)
+    first_day = TODAY - timedelta(days=days - 1)
+    return [
+        (first_day + timedelta(days=rng.randrange(days)), f"user{rng.randrange(users)}",
+         rng.choice(LANGUAGES), *rng.choice(PAGES))
+        for _ in range(hits)
+    ]
+
+
+def _value(value):
+    return SimpleNamespace(value=value)
+
+
+class FakeAnalyticsClient:
+    """
+    run_report だけを持つ偽の GA4 クライアント
+
+    date・language・pagePath・pageTitle のディメンションと screenPageViews・activeUsers・totalUsers の指標、
+    pagePath の CONTAINS フィルタ、limit / offset のページングに答える。最初の failures 回の呼び出しは error を送出する。
+    """
+
+    def __init__(self, hits, today=TODAY, failures=0, error=api_exceptions.ServiceUnavailable):
+        self.hits = hits
+        self.today = today
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _date(self, value):
+        return self.today if value == 'today' else date.fromisoformat(value)
+
+    def run_report(self, request):
+        with self._lock:
+            self.calls += 1
+            if self.calls <= self.failures:
+                raise self.error('fake transient error')
+
+        date_range = request.date_ranges[0]
+        start, end = self._date(date_range.start_date), self._date(date_range.end_date)
+        contains = request.dimension_filter.filter.string_filter.value
+        dimensions = [dimension.name for dimension in request.dimensions]
+
+        groups = defaultdict(list)
+        for day, user, language, page_path, page_title in self.hits:
+            if not start <= day <= end or contains not in page_path:
+                continue
+            values = {'date': day.strftime('%Y%m%d'), 'language': language,
+                      'pagePath': page_path, 'pageTitle': page_title}
+            groups[tuple(values[name] for name in dimensions)].append(user)
+
+        rows = []
+        for key in sorted(groups):
+            users = groups[key]
+            metrics = {'screenPageViews': len(users), 'activeUsers': len(set(users)), 'totalUsers': len(set(users))}
+            rows.append(SimpleNamespace(
+                dimension_values=[_value(value) for value in key],
+                metric_values=[_value(str(metrics[metric.name])) for metric in request.metrics],
+            ))
+
+        offset = request.offset
+        page = rows[offset:offset + request.limit] if request.limit else rows[offset:]
+        return SimpleNamespace(rows=page, row_count=len(rows))
+
+
+def check_retries():
+    """一時的なエラーをリトライし、上限を超えた場合とリトライしないエラーはそのまま送出する"""
+    hits = generate_hits()
+    delays = []
+    request = SimpleNamespace(
+        date_ranges=[SimpleNamespace(start_date='today', end_date='today')],
+        dimension_filter=SimpleNamespace(filter=SimpleNamespace(string_filter=SimpleNamespace(value=''))),
+        dimensions=[], metrics=[SimpleNamespace(name='screenPageViews')], limit=0, offset=0,
+    )
+
+    client = FakeAnalyticsClient(hits, failures=3)
+    report_client = ga_collector.ReportClient(client, max_attempts=4, backoff_seconds=1.0, sleep=delays.append)
+    assert report_client.run_report(request).rows
+    assert client.calls == 4 and len(delays) == 3
+    assert all(1.0 * 2 ** n <= delay <= 1.1 * 2 ** n for n, delay in enumerate(delays)), delays
+
+    client = FakeAnalyticsClient(hits, failures=4)
+    report_client = ga_collector.ReportClient(client, max_attempts=4, sleep=delays.append)
+    try:
+        report_client.run_report(request)
+        raise AssertionError('expected ServiceUnavailable after 4 attempts')
+    except api_exceptions.ServiceUnavailable:
+        assert client.calls == 4
+
+    client = FakeAnalyticsClient(hits, failures=1, error=api_exceptions.PermissionDenied)
+    report_client = ga_collector.ReportClient(client, max_attempts=4, sleep=delays.append)
+    try:
+        report_client.run_report(request)
+        raise AssertionError('expected PermissionDenied without retries')
+    except api_exceptions.PermissionDenied:
+        assert client.calls == 1
+
+    print("✅ ReportClient retries transient errors with exponential backoff")
+
+
+def check_fetch_all_reports():
+    """最初の数回の呼び出しが失敗しても、失敗しない場合と同じ ga4_data のセクションを返す"""
+    hits = generate_hits()
+    # ページングも確かめるため1回に返す行数を小さくする
+    ga_collector.REPORT_ROW_LIMIT = 7
+
+    expected = ga_collector.fetch_all_reports(FakeAnalyticsClient(hits), PROPERTY_ID, daily_metrics_days=30)
+    client = FakeAnalyticsClient(hits, failures=3)
+    reports = ga_collector.fetch_all_reports(client, PROPERTY_ID, daily_metrics_days=30)
+
+    assert client.calls > 3
+    assert reports == expected
+    assert list(reports) == ['overallMetrics', 'dailyMetrics', 'languageDistribution', 'pageDistribution',
+                             'guidelineMonthlyStats']
+    assert reports['overallMetrics']['totalPageViews'] == len(hits)
+    assert sum(row['pageViews'] for row in reports['dailyMetrics']) == len(hits)
+    assert sum(row['pageViews'] for row in reports['languageDistribution']) == len(hits)
+    assert sum(row['pageViews'] for row in reports['pageDistribution']) == len(hits)
+
+    print("✅ fetch_all_reports returns the same sections after transient errors")
+
+
+def check_cached_reports():
+    """
+    キャッシュから直近の日だけを取得した結果が全期間を取得し直した結果と同じで、
+    言語別・ページ別の activeUsers が期間中のユニークユーザー数になる
+    """
+    hits = generate_hits()
+
+    cache = ga_collector.new_ga4_cache(PROPERTY_ID)
+    ga_collector.fetch_all_reports(FakeAnalyticsClient(hits, today=TODAY - timedelta(days=5)), PROPERTY_ID,
+                                   cache=cache)
+    cached = ga_collector.fetch_all_reports(FakeAnalyticsClient(hits), PROPERTY_ID, cache=cache)
+    fresh = ga_collector.fetch_all_reports(FakeAnalyticsClient(hits), PROPERTY_ID)
+    assert cached == fresh
+
+    language_users = defaultdict(set)
+    page_users = defaultdict(set)
+    for _, user, language, page_path, page_title in hits:
+        language_users[language].add(user)
+        page_users[(page_path, page_title)].add(user)
+    assert {row['language']: row['activeUsers'] for row in cached['languageDistribution']} == {
+        language: len(users) for language, users in language_users.items()
+    }
+    assert {(row['pagePath'], row['pageTitle']): row['activeUsers'] for row in cached['pageDistribution']} == {
+        page: len(users) for page, users in page_users.items()
+    }
+
+    print("✅ Cached reports match a full refetch and activeUsers are distinct users")
+
+
+def main():
+    """メイン処理"""
+    check_retries()
+    check_fetch_all_reports()
+    check_cached_reports()
+
+
+if __name__ == '__main__':
+    main()
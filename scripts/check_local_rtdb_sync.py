@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Local RTDB Sync Check
+ローカルのJSONファイル（local_rtdb.py）を Realtime Database の代わりにして firebase_collector を実行し、
+全件取得 → データベースの変更 → 差分同期 の結果が、変更後に全件取得し直した結果と一致することを確認する
+
+リクエストの一部を ConnectionError で失敗させ、再試行を経ても結果が変わらないことも確かめる。
+
+    python scripts/check_local_rtdb_sync.py [--users 300]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+
+import firebase_collector
+import local_rtdb
+from local_rtdb import LocalDatabase, key_order
+from raw_snapshot import load_snapshot, write_snapshot
+from synthetic_data import generate_users
+
+# この回数に1回のリクエストを失敗させる
+FAILURE_INTERVAL = 7
+
+NEW_KEY = '2025-12-31-23-59-59-999'
+
+
+class _FlakyGets:
+    """LocalReference / LocalQuery の get を FAILURE_INTERVAL 回に1回 ConnectionError にする"""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+        self._originals = {}
+
+    def _wrap(self, get):
+        def flaky_get(*args, **kwargs):
+            with self._lock:
+                self.calls += 1
+                fail = self.calls % FAILURE_INTERVAL == 0
+                self.failures += fail
+            if fail:
+                raise ConnectionError('injected failure')
+            return get(*args, **kwargs)
+        return flaky_get
+
+    def __enter__(self):
+        for cls in (local_rtdb.LocalReference, local_rtdb.LocalQuery):
+            self._originals[cls] = cls.get
+            cls.get = self._wrap(cls.get)
+        return self
+
+    def __exit__(self, *exc):
+        for cls, get in self._originals.items():
+            cls.get = get
+
+
+def expected_users(users):
+    """データベースの users/ から期待する取得結果（全ての子ノード、ユーザーと子ノードのキーはキー順）"""
+    return {
+        user_id: {
+            name: (
+                {key: users[user_id][name][key] for key in sorted(users[user_id][name], key=key_order)}
+                if isinstance(users[user_id][name], dict) else users[user_id][name]
+            )
+            for name in users[user_id]
+        }
+        for user_id in sorted(users, key=key_order)
+    }
+
+
+def mutate(database, user_ids):
+    """プレイ・設定変更・起動回数の更新、ユーザーの追加と削除を書き込み、(更新, 追加, 削除) のユーザーIDを返す"""
+    users_ref = database.reference('users')
+    updated = user_ids[1:len(user_ids):25]
+    for user_id in updated:
+        user_ref = users_ref.child(user_id)
+        user_ref.child('timeStamp').child(NEW_KEY).set('GameEnd_Check')
+        user_ref.child('results').child(NEW_KEY).set({'score': 1000, 'clearRank': 'S'})
+        user_ref.child('option').child(NEW_KEY).set({'settingLanguage': 'ko'})
+        user_ref.child('launch_count').set(999)
+
+    added = ['~checkUser']
+    users_ref.child(added[0]).set({
+        'launch_count': 1,
+        'systemLanguage': 'Japanese',
+        'option': {'2025-01-01-00-00-00-000': {'settingLanguage': 'en'},
+                   '2025-01-02-00-00-00-000': {'settingLanguage': 'ja'}},
+        'timeStamp': {'2025-01-02-00-00-00-000': 'launch'},
+    })
+
+    removed = [user_ids[0]]
+    users_ref.child(removed[0]).delete()
+    return updated, added, removed
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='Check firebase_collector against a local JSON database')
+    parser.add_argument('--users', type=int, default=300, help='synthetic users in the database (default: 300)')
+    args = parser.parse_args()
+
+    firebase_collector.RETRY_BACKOFF = 0
+
+    with tempfile.TemporaryDirectory() as work_dir, _FlakyGets() as flaky:
+        db_path = os.path.join(work_dir, 'db.json')
+        with open(db_path, 'w', encoding='utf-8') as f:
+            json.dump({'users': dict(generate_users(args.users))}, f)
+        database = LocalDatabase(db_path)
+        users_ref = database.reference('users')
+
+        # 全件取得（チャンクごとの問い合わせ、取得しながらスナップショットに書き出す）
+        full_path = os.path.join(work_dir, 'full.snap')
+        users_data = firebase_collector.fetch_all_users_data(users_ref, full_path, workers=4, chunk_size=37)
+        expected = expected_users(database.root['users'])
+        assert users_data == expected and list(users_data) == list(expected)
+        assert load_snapshot(full_path) == expected
+        print(f"✅ Full fetch matches all {len(expected)} users")
+
+        # データベースを変更して差分同期
+        updated, added, removed = mutate(database, list(expected))
+        delta_data, changes = firebase_collector.sync_users_data(users_ref, load_snapshot(full_path), workers=4)
+        assert changes['addedUsers'] == added
+        assert changes['removedUsers'] == removed
+        assert sorted(changes['updatedUsers']) == sorted(updated)
+        for user_id in updated:
+            assert set(changes['updatedUsers'][user_id]) == {'timeStamp', 'results', 'option', 'fields'}
+            assert changes['updatedUsers'][user_id]['option'] == [NEW_KEY]
+            assert NEW_KEY in delta_data[user_id]['option'] and 'systemLanguage' in delta_data[user_id]
+        delta_path = os.path.join(work_dir, 'delta.snap')
+        write_snapshot(delta_data.items(), delta_path)
+
+        # 変更後に全件取得し直した結果と一致する
+        refetched_path = os.path.join(work_dir, 'refetched.snap')
+        firebase_collector.fetch_all_users_data(users_ref, refetched_path, workers=4, chunk_size=37)
+        delta_snapshot = load_snapshot(delta_path)
+        refetched_snapshot = load_snapshot(refetched_path)
+        assert delta_snapshot == refetched_snapshot == expected_users(database.root['users'])
+        assert list(delta_snapshot) == list(refetched_snapshot)
+        assert flaky.failures > 0
+
+    print(f"✅ Delta sync matches a full refetch ({flaky.calls} requests, {flaky.failures} injected failures)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Recent Plays Archive Check
+合成データを全件集計してアーカイブを作り、プレイの追加 → 増分集計 → recentPlays から外れたプレイの追記 を
+繰り返した後も、recentPlays とアーカイブの間にプレイの抜け・重複が無く、全件から作り直したアーカイブと
+同じプレイを含むことを確認する
+
+古い日付のプレイしか持たない新規ユーザー（アーカイブの途中に入るプレイ）も追加する。
+
+    python scripts/check_recent_plays_archive.py [--users 400]
+"""
+
+import argparse
+import json
+import os
+import tempfile
+
+import data_aggregator
+from dashboard_sections import ARCHIVE_INDEX_NAME
+from synthetic_data import generate_users
+
+ROUNDS = 3
+
+
+def _result(song, difficulty, score):
+    return {'character': 'Check', 'difficulty': difficulty, 'score': score,
+            'clearRank': 'A', 'clearType': 'Clear', 'gameType': song}
+
+
+def add_plays(users, round_number):
+    """既存のユーザーに新しいプレイを、新規ユーザーに古い日付のプレイを追加する"""
+    for index, user_id in enumerate(list(users)[round_number::40]):
+        results = users[user_id].setdefault('results', {})
+        key = f"2025-11-2{round_number}-10-00-{index % 60:02d}-000"
+        results[f"{key}_CheckSong_Hard"] = _result('CheckSong', 'Hard', 1000 + index)
+
+    users[f"~oldPlayer{round_number}"] = {
+        'launch_count': 1,
+        'results': {
+            f"2025-09-1{round_number}-12-00-0{n}-000_CheckSong_Easy": _result('CheckSong', 'Easy', n)
+            for n in range(5)
+        },
+    }
+
+
+def read_archive(archive_dir):
+    """インデックスの順にシャードを連結したプレイ記録と、インデックス"""
+    with open(os.path.join(archive_dir, ARCHIVE_INDEX_NAME), 'r', encoding='utf-8') as f:
+        index = json.load(f)
+
+    plays = []
+    for entry in index['shards']:
+        with open(os.path.join(archive_dir, entry['file']), 'r', encoding='utf-8') as f:
+            shard = json.load(f)
+        assert len(shard) == entry['count']
+        plays.extend(shard)
+    assert index['totalPlays'] == len(plays)
+    return plays, index
+
+
+def _sorted_records(plays):
+    return sorted(json.dumps(play, sort_keys=True) for play in plays)
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='Check that incremental appends keep the recent plays archive complete')
+    parser.add_argument('--users', type=int, default=400, help='synthetic users (default: 400)')
+    args = parser.parse_args()
+
+    users = dict(generate_users(args.users))
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        state_path = os.path.join(work_dir, 'aggregator_state.json.gz')
+        archive_dir = os.path.join(work_dir, 'recentPlaysArchive')
+
+        # 全件の集計ではアーカイブを全プレイから作る
+        archive_update = {}
+        data_aggregator.aggregate_sections(users, state_path, archive_update=archive_update)
+        assert not archive_update
+        data_aggregator.save_recent_plays_archive(data_aggregator.calculate_recent_plays_archive(users), archive_dir)
+
+        for round_number in range(1, ROUNDS + 1):
+            add_plays(users, round_number)
+            archive_update = {}
+            sections = data_aggregator.aggregate_sections(users, state_path, archive_update=archive_update)
+            assert archive_update['plays'], 'expected plays leaving recentPlays'
+            assert data_aggregator.append_recent_plays_archive(archive_update, archive_dir) is not None
+
+            # recentPlays + アーカイブ = 全件から作り直した recentPlays + アーカイブ
+            archive_plays, index = read_archive(archive_dir)
+            rebuilt = data_aggregator.calculate_recent_plays_archive(users)
+            assert _sorted_records(archive_plays) == _sorted_records(rebuilt['plays'])
+            assert [play['timestamp'] for play in archive_plays] == [play['timestamp'] for play in rebuilt['plays']]
+            assert sections['recentPlays'] == data_aggregator.get_recent_plays(users)
+            assert archive_plays[-1]['timestamp'] <= sections['recentPlays'][-1]['timestamp']
+            rebuilt_dir = os.path.join(work_dir, f"rebuilt{round_number}")
+            data_aggregator.save_recent_plays_archive(rebuilt, rebuilt_dir)
+            assert index['boundary'] == read_archive(rebuilt_dir)[1]['boundary']
+            print(f"✅ Round {round_number}: appended {len(archive_update['plays'])} plays "
+                  f"({index['totalPlays']} archived + {len(sections['recentPlays'])} recent)")
+
+        # 前回の recentPlays に続かないアーカイブには追記しない（作り直しが必要）
+        archive_update['previousBoundary'] = None
+        assert data_aggregator.append_recent_plays_archive(archive_update, archive_dir) is None
+
+    print("✅ recentPlays and the archive cover every play without gaps")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Retention Check
+0 埋めされていないタイムスタンプキー（2025-9-5-...）を含むデータで
+dailyActiveUsers・retention・rollingActiveUsers が日付を 'YYYY-MM-DD' に揃えて集計できることを確認する
+
+    python scripts/check_retention.py
+"""
+
+from datetime import date
+
+import data_aggregator
+from timestamp_normalizer import TimestampNormalizer
+
+USERS_DATA = {
+    'user1': {
+        'timeStamp': {
+            '2025-09-04-10-00-00-000': 'launch',
+            '2025-9-5-10-00-00-000': 'launch',
+            '2025-09-11-10-00-00-000': 'launch',
+        },
+    },
+    'user2': {
+        'timeStamp': {
+            '2025-9-5-09-30-00-000': 'launch',
+            '2025-09-05-12-00-00-000': 'launch',
+            '2025-9-6_extra': 'launch',
+        },
+    },
+}
+
+
+def main():
+    """メイン処理"""
+    normalizer = TimestampNormalizer(today=date(2025, 12, 31))
+    assert normalizer.normalize('2025-9-5-10-00-00-000') == ('2025-9-5-10-00-00-000', '2025-09-05')
+    assert normalizer.normalize('2568-9-5-10-00-00-000') == ('2025-9-5-10-00-00-000', '2025-09-05')
+    assert normalizer.normalize('2025-09-05-10-00-00-000')[1] == '2025-09-05'
+
+    daily = data_aggregator.calculate_daily_active_users(USERS_DATA)
+    assert [(row['date'], row['users']) for row in daily] == [
+        ('2025-09-04', 1), ('2025-09-05', 2), ('2025-09-06', 1), ('2025-09-11', 1),
+    ], daily
+
+    retention = data_aggregator.calculate_retention(USERS_DATA)
+    assert [(row['date'], row['newUsers']) for row in retention['daily']] == [
+        ('2025-09-04', 1), ('2025-09-05', 1), ('2025-09-06', 0), ('2025-09-11', 0),
+    ], retention['daily']
+    assert retention['daily'][0]['retention'][:2] == [100.0, 100.0]
+    assert retention['daily'][1]['retention'][0] == 100.0
+
+    rolling = data_aggregator.calculate_rolling_active_users(USERS_DATA)
+    assert [(row['date'], row['dau'], row['wau']) for row in rolling] == [
+        ('2025-09-04', 1, 1), ('2025-09-05', 2, 2), ('2025-09-06', 1, 2), ('2025-09-11', 1, 2),
+    ], rolling
+
+    print("✅ Unpadded timestamp keys are aggregated as YYYY-MM-DD days")
+
+
+if __name__ == '__main__':
+    main()
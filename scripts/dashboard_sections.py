@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Dashboard Sections
+ダッシュボード用データをセクションごとのJSONファイルとマニフェストに書き出す
+
+    public/data/dashboard/
+      manifest.json          # {'version', 'lastUpdated', 'sections': {名前: {'file', 'hash', 'bytes'}}}
+      kpi.json               # セクションごとのコンパクトなJSON
+      kpi.json.gz            # 事前圧縮（.br は brotli がある場合のみ）
+      ...
+
+      recentPlaysArchive/    # recentPlays より古いプレイ（--recent-plays-archive の場合のみ）
+        index.json           # {'version', 'shardSize', 'totalPlays', 'boundary',
+                             #  'shards': [{'file', 'hash', 'count', 'from', 'to'}]}
+        00000.json           # 古い順に shardSize 件ずつ
+        ...
+
+内容のハッシュが前回のマニフェスト（インデックス）と同じファイルは書き直さない（無い事前圧縮ファイルだけを作る）。
+ファイルは一時ファイル経由で置き換えるため、書き込み途中のファイルが読まれることはない。
+"""
+
+import gzip
+import hashlib
+import heapq
+import json
+import os
+
+try:
+    import brotli
+except ImportError:  # brotli が無い環境では .br を作らない
+    brotli = None
+
+SECTIONS_DIR = 'public/data/dashboard'
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 1
+
+ARCHIVE_INDEX_NAME = 'index.json'
+# アーカイブの1シャードのプレイ数
+ARCHIVE_SHARD_SIZE = 1000
+
+# 事前圧縮したファイルの拡張子 → 圧縮関数・展開関数
+COMPRESSORS = {'gz': lambda payload: gzip.compress(payload, compresslevel=9, mtime=0)}
+DECOMPRESSORS = {'gz': gzip.decompress}
+if brotli is not None:
+    COMPRESSORS['br'] = lambda payload: brotli.compress(payload, quality=11)
+    DECOMPRESSORS['br'] = brotli.decompress
+
+
+def serialize_section(value):
+    """セクションをコンパクトなJSON（UTF-8）にする"""
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def content_hash(payload):
+    """内容のハッシュ（SHA-256 の先頭16文字）"""
+    return hashlib.sha256(payload).hexdigest()[:16]
+
+
+def _write_atomic(path, payload):
+    """一時ファイルに書いてから置き換える"""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(temp_path, path)
+
+
+def _section_files(output_dir, file_name):
+    """セクションの JSON と事前圧縮ファイルのパス"""
+    path = os.path.join(output_dir, file_name)
+    return [path] + [f"{path}.{extension}" for extension in COMPRESSORS]
+
+
+def load_manifest(output_dir=SECTIONS_DIR):
+    """前回のマニフェスト（無い・形式が合わない場合は None）"""
+    manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        return None
+
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+
+def _compressed_matches(path, extension, payload):
+    """事前圧縮ファイルがあり、展開すると payload になるか"""
+    if not os.path.exists(path):
+        return False
+    with open(path, 'rb') as f:
+        compressed = f.read()
+    try:
+        return DECOMPRESSORS[extension](compressed) == payload
+    except Exception:  # 壊れたファイルは作り直す
+        return False
+
+
+def _write_if_changed(output_dir, entry, payload, previous_entry):
+    """
+    entry のファイル（と事前圧縮ファイル）を書く。JSON が前回と同じ内容で残っていれば書かずに False
+
+    事前圧縮ファイルは git に含めず CI のキャッシュから戻す（無い・古いこともある）ため、JSON に変更が無くても
+    無いもの・内容が合わないものは作り直す（変更には数えない）。
+    """
+    paths = _section_files(output_dir, entry['file'])
+    changed = previous_entry != entry or not os.path.exists(paths[0])
+
+    if changed:
+        _write_atomic(paths[0], payload)
+    for path, (extension, compress) in zip(paths[1:], COMPRESSORS.items()):
+        if changed or not _compressed_matches(path, extension, payload):
+            _write_atomic(path, compress(payload))
+    return changed
+
+
+def _remove_files(output_dir, file_name):
+    """entry のファイル（と事前圧縮ファイル）を削除"""
+    for path in _section_files(output_dir, file_name):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def write_sections(dashboard_data, output_dir=SECTIONS_DIR):
+    """
+    lastUpdated 以外の各キーをセクションとして書き出し、マニフェストを更新する
+
+    戻り値は (書き直したセクション名のリスト, 変更のなかったセクション名のリスト)。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    previous = load_manifest(output_dir) or {'sections': {}}
+    sections = {}
+    written = []
+    unchanged = []
+
+    for name, value in dashboard_data.items():
+        if name == 'lastUpdated':
+            continue
+
+        payload = serialize_section(value)
+        entry = {'file': f"{name}.json", 'hash': content_hash(payload), 'bytes': len(payload)}
+        sections[name] = entry
+
+        if _write_if_changed(output_dir, entry, payload, previous['sections'].get(name)):
+            written.append(name)
+        else:
+            unchanged.append(name)
+
+    # 無くなったセクションのファイルを削除
+    for name, entry in previous['sections'].items():
+        if name not in sections:
+            _remove_files(output_dir, entry['file'])
+
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'lastUpdated': dashboard_data.get('lastUpdated'),
+        'sections': sections,
+    }
+    _write_atomic(os.path.join(output_dir, MANIFEST_NAME),
+                  json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    return written, unchanged
+
+
+def read_sections(output_dir=SECTIONS_DIR):
+    """マニフェストとセクションファイルから、元のダッシュボード用データを組み立てる"""
+    manifest = load_manifest(output_dir)
+    if manifest is None:
+        return None
+
+    dashboard_data = {'lastUpdated': manifest['lastUpdated']}
+    for name, entry in manifest['sections'].items():
+        with open(os.path.join(output_dir, entry['file']), 'r', encoding='utf-8') as f:
+            dashboard_data[name] = json.load(f)
+
+    return dashboard_data
+
+
+def _load_archive_index(output_dir):
+    """前回のアーカイブのインデックス（無い・形式が合わない場合は None）"""
+    index_path = os.path.join(output_dir, ARCHIVE_INDEX_NAME)
+    if not os.path.exists(index_path):
+        return None
+
+    with open(index_path, 'r', encoding='utf-8') as f:
+        index = json.load(f)
+
+    return index if index.get('version') == MANIFEST_VERSION else None
+
+
+def _boundary_hash(boundary):
+    """recentPlays の境界（最も古いプレイ、ユーザーIDを含む）をインデックスに載せるためのハッシュ"""
+    return content_hash(serialize_section(boundary))
+
+
+def _write_shard_files(plays, output_dir, shard_size, first_number, previous_shards):
+    """
+    古い順のプレイ記録を first_number 番目からのシャードに書き出す
+
+    戻り値は (シャードのエントリのリスト, 書き直したファイル名のリスト, 変更のなかったファイル名のリスト)。
+    """
+    shards = []
+    written = []
+    unchanged = []
+
+    for start in range(0, len(plays), shard_size):
+        shard = plays[start:start + shard_size]
+        payload = serialize_section(shard)
+        entry = {
+            'file': f"{first_number + start // shard_size:05d}.json",
+            'hash': content_hash(payload),
+            'count': len(shard),
+            'from': shard[0]['timestamp'],
+            'to': shard[-1]['timestamp'],
+        }
+        shards.append(entry)
+
+        if _write_if_changed(output_dir, entry, payload, previous_shards.get(entry['file'])):
+            written.append(entry['file'])
+        else:
+            unchanged.append(entry['file'])
+
+    return shards, written, unchanged
+
+
+def _save_archive_index(output_dir, shard_size, shards, boundary, previous_shards):
+    """インデックスを書き、無くなったシャードのファイルを削除"""
+    index = {
+        'version': MANIFEST_VERSION,
+        'shardSize': shard_size,
+        'totalPlays': sum(entry['count'] for entry in shards),
+        'boundary': _boundary_hash(boundary),
+        'shards': shards,
+    }
+    _write_atomic(os.path.join(output_dir, ARCHIVE_INDEX_NAME),
+                  json.dumps(index, ensure_ascii=False, indent=2).encode('utf-8'))
+
+    shard_files = {entry['file'] for entry in shards}
+    for file_name in previous_shards:
+        if file_name not in shard_files:
+            _remove_files(output_dir, file_name)
+
+
+def write_archive_shards(plays, output_dir, boundary=None, shard_size=ARCHIVE_SHARD_SIZE):
+    """
+    古い順のプレイ記録を shard_size 件ずつのシャードとインデックスに書き出す
+
+    boundary は plays の直後に続く recentPlays の最も古いプレイ（append_archive_shards で同じ続きか確かめる）。
+    古い順に区切るので、新しいプレイが増えても変わるのは末尾のシャードだけになる。
+    戻り値は (書き直したシャードのファイル名のリスト, 変更のなかったシャードのファイル名のリスト)。
+    """
+    os.makedirs(output_dir, exist_ok=True)
+
+    previous = _load_archive_index(output_dir)
+    previous_shards = {entry['file']: entry for entry in previous['shards']} if previous else {}
+
+    shards, written, unchanged = _write_shard_files(plays, output_dir, shard_size, 0, previous_shards)
+    _save_archive_index(output_dir, shard_size, shards, boundary, previous_shards)
+
+    return written, unchanged
+
+
+def append_archive_shards(plays, output_dir, previous_boundary, boundary, shard_size=ARCHIVE_SHARD_SIZE):
+    """
+    古い順のプレイ記録（増分集計で recentPlays から外れたプレイ）を既存のアーカイブに加える
+
+    既存のアーカイブが previous_boundary に続くもの（その時点の recentPlays より古いプレイを全て含むもの）で
+    なければ何もせずに None を返す（呼び出し側で全プレイから作り直す）。
+    plays の最も古いプレイより新しいプレイを含むシャード以降だけを読み直して書き直す
+    （同じタイムスタンプのプレイは既存のプレイの後ろに並べる）。戻り値は write_archive_shards と同じ。
+    """
+    previous = _load_archive_index(output_dir)
+    if (previous is None or previous['shardSize'] != shard_size
+            or previous.get('boundary') != _boundary_hash(previous_boundary)):
+        return None
+
+    shards = previous['shards']
+    first = len(shards)
+    if plays:
+        while first > 0 and shards[first - 1]['to'] > plays[0]['timestamp']:
+            first -= 1
+    # 末尾のシャードが埋まっていなければ、そこから続けて書く
+    if first == len(shards) and shards and shards[-1]['count'] < shard_size:
+        first -= 1
+
+    existing = []
+    for entry in shards[first:]:
+        with open(os.path.join(output_dir, entry['file']), 'r', encoding='utf-8') as f:
+            existing.extend(json.load(f))
+    merged = list(heapq.merge(existing, plays, key=lambda play: play['timestamp']))
+
+    previous_shards = {entry['file']: entry for entry in shards}
+    new_shards, written, unchanged = _write_shard_files(merged, output_dir, shard_size, first, previous_shards)
+    _save_archive_index(output_dir, shard_size, shards[:first] + new_shards, boundary, previous_shards)
+
+    return written, [entry['file'] for entry in shards[:first]] + unchanged
@@ -4,43 +4,80 @@ Data Aggregator
 Firebaseから取得した生データを集計してダッシュボード用JSONを生成
 """
 
+import argparse
+import gzip
+import heapq
 import json
 import os
-from datetime import datetime, date
+import re
+from datetime import datetime
+from bisect import bisect_right
 from collections import defaultdict, Counter
+from functools import lru_cache, partial
+
+import results_table
+from quantiles import IntegerHistogram, ValueHistogram
+from hyperloglog import DEFAULT_ERROR as DEFAULT_SKETCH_ERROR, HyperLogLog, precision_for_error, relative_error
+from dashboard_sections import SECTIONS_DIR, append_archive_shards, write_archive_shards, write_sections
+from pipeline_report import (
+    PIPELINE_REPORT_PATH, add_report_arguments, load_pipeline_report, pipeline_summary, report_from_args
+)
+from funnels import Funnel, FunnelTracker
+from raw_data_reader import RawDataReader
+from retention import ActivityBitmaps, retention_summary, rolling_active_users
+from sessions import DEFAULT_SESSION_GAP, Sessionizer
+from rollup_cube import RESULT_DIMENSIONS, ROLLUP_CUBE_PATH, RollupCube, save_rollup_cube
+from raw_snapshot import is_snapshot, load_snapshot
+from aggregation_engine import (
+    Accumulator, RebuildRequired, get_states, run_accumulators, run_accumulators_parallel, set_states
+)
+# 仏暦変換は timestamp_normalizer へ移動（互換のため再エクスポート）
+from timestamp_normalizer import VALID_YEAR, convert_buddhist_era_to_christian_era, timestamp_seconds
+
+# 増分集計の状態ファイルの形式バージョン（アキュムレータの状態の形式を変えたら上げる）
+STATE_VERSION = 4
+
+
+RAW_DATA_PATH = 'public/data/raw_data.snap'
+# 以前の形式（raw snapshot が無い場合に読む）
+LEGACY_RAW_DATA_PATH = 'public/data/raw_data.json'
+
+
+def _raw_data_path(input_path):
+    """読み込む生データのパス（省略時は raw snapshot、無ければ以前の raw_data.json）"""
+    if input_path is not None:
+        return input_path
+    if not os.path.exists(RAW_DATA_PATH) and os.path.exists(LEGACY_RAW_DATA_PATH):
+        return LEGACY_RAW_DATA_PATH
+    return RAW_DATA_PATH
+
+
+def load_raw_data(input_path=None):
+    """生データを読み込み（raw snapshot / JSON のどちらでも読める）"""
+    input_path = _raw_data_path(input_path)
+    if not os.path.exists(input_path):
+        print(f"Error: {input_path} not found")
+        return None
 
+    if is_snapshot(input_path):
+        data = load_snapshot(input_path)
+    else:
+        with open(input_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
 
-def convert_buddhist_era_to_christian_era(date_string):
-    """
-    タイ仏暦（Buddhist Era）を西暦（Christian Era）に変換
-    2568年 → 2025年 (2568 - 543 = 2025)
-    """
-    try:
-        parts = date_string.split('-')
-        year = int(parts[0])
-
-        # 2500年以上の年は仏暦と判断して変換
-        if year >= 2500:
-            year = year - 543
-            parts[0] = str(year)
-            return '-'.join(parts)
-
-        return date_string
-    except:
-        return date_string
+    print(f"✅ Loaded raw data from {input_path}")
+    return data
 
 
-def load_raw_data(input_path='public/data/raw_data.json'):
-    """生データを読み込み"""
+def open_raw_data(input_path=None):
+    """生データを1ユーザーずつ読み込むリーダーを返す（ファイル全体は読み込まない）"""
+    input_path = _raw_data_path(input_path)
     if not os.path.exists(input_path):
         print(f"Error: {input_path} not found")
         return None
 
-    with open(input_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-
-    print(f"✅ Loaded raw data from {input_path}")
-    return data
+    print(f"✅ Streaming raw data from {input_path}")
+    return RawDataReader(input_path)
 
 
 def load_ga4_data(input_path='public/data/ga4_data.json'):
@@ -56,185 +93,266 @@ def load_ga4_data(input_path='public/data/ga4_data.json'):
     return data
 
 
-def calculate_excluded_data_stats(users_data):
-    """除外データ（異常年、未来日付）の統計を計算"""
-    total_count = 0
-    excluded_count = 0
-    today = date.today()
-
-    for user_id, user_data in users_data.items():
-        # timestampから集計
-        timestamps = user_data.get('timeStamp', {})
-        for timestamp_key in timestamps.keys():
-            total_count += 1
-            try:
-                year = int(timestamp_key.split('-')[0])
-                date_part = '-'.join(timestamp_key.split('-')[:3])
-
-                # 2025年でない、または未来の日付の場合は除外
-                if year != 2025:
-                    excluded_count += 1
-                else:
-                    date_obj = datetime.strptime(date_part, '%Y-%m-%d').date()
-                    if date_obj > today:
-                        excluded_count += 1
-            except:
-                excluded_count += 1
-
-        # resultsから集計
-        results = user_data.get('results', {})
-        if isinstance(results, dict):
-            for result_id in results.keys():
-                total_count += 1
-                try:
-                    year = int(result_id.split('-')[0])
-                    date_part = '-'.join(result_id.split('-')[:3])
+CLEAR_RATE_BRACKETS = ['0%', '1-19%', '20-39%', '40-59%', '60-79%', '80-99%', '100%']
+# '1-19%' 以降の各区分の下限（0 より大きい値を bisect_right で区分に振り分ける）
+CLEAR_RATE_BRACKET_BOUNDS = [0, 20, 40, 60, 80, 100]
+
+# Clear, FullCombo, Perfect をクリアとしてカウント
+CLEAR_TYPES = ['Clear', 'FullCombo', 'Perfect']
+
+
+def _clear_rate_bracket(rate):
+    """クリアレートの7区分のラベル（0 は '0%'、それ以外は区分の下限で二分探索）"""
+    if rate == 0:
+        return CLEAR_RATE_BRACKETS[0]
+    return CLEAR_RATE_BRACKETS[bisect_right(CLEAR_RATE_BRACKET_BOUNDS, rate)]
 
-                    if year != 2025:
-                        excluded_count += 1
-                    else:
-                        date_obj = datetime.strptime(date_part, '%Y-%m-%d').date()
-                        if date_obj > today:
-                            excluded_count += 1
-                except:
-                    excluded_count += 1
 
-    excluded_rate = (excluded_count / total_count * 100) if total_count > 0 else 0
+def _count_clear_rate_brackets(histogram):
+    """クリアレートのヒストグラム（quantiles のヒストグラム）を7区分で集計"""
+    brackets = {bracket: 0 for bracket in CLEAR_RATE_BRACKETS}
+
+    for rate, count in histogram.items():
+        brackets[_clear_rate_bracket(rate)] += count
+
+    return brackets
+
+
+def _clear_rate_summary(histogram, count_key):
+    """クリアレートの分布・統計（平均値・中央値・件数）・パーセンタイル"""
+    total = histogram.total()
+
+    # 統計情報を計算
+    stats = {
+        'mean': round(histogram.mean(), 2) if total else 0,
+        'median': round(histogram.median(), 2) if total else 0,
+        count_key: total
+    }
 
     return {
-        'totalCount': total_count,
-        'excludedCount': excluded_count,
-        'excludedRate': round(excluded_rate, 2)
+        'distribution': _count_clear_rate_brackets(histogram),
+        'stats': stats,
+        'percentiles': histogram.percentiles()
     }
 
 
-def calculate_kpi(users_data):
-    """KPI（総ユーザー数、総起動回数、総プレイ回数、平均スコア）を計算"""
-    total_users = len(users_data)
-    total_launches = 0
-    total_plays = 0
-    all_scores = []
+class ExcludedDataStatsAccumulator(Accumulator):
+    """除外データ（異常年、未来日付）の統計"""
+
+    def __init__(self):
+        self.total_count = 0
+        self.excluded_count = 0
+
+    def _count_key(self, day):
+        self.total_count += 1
+        # 2025年でない、または未来の日付の場合は除外
+        if day is None:
+            self.excluded_count += 1
+
+    def add_result(self, user_id, result_id, result_data, day):
+        self._count_key(day)
+
+    def add_event(self, user_id, timestamp_key, event_type, day):
+        self._count_key(day)
+
+    def get_state(self):
+        return {'totalCount': self.total_count, 'excludedCount': self.excluded_count}
+
+    def set_state(self, state):
+        self.total_count = state['totalCount']
+        self.excluded_count = state['excludedCount']
+
+    def merge_partial(self, partial):
+        self.total_count += partial['totalCount']
+        self.excluded_count += partial['excludedCount']
+
+    def result(self):
+        excluded_rate = (self.excluded_count / self.total_count * 100) if self.total_count > 0 else 0
+
+        return {
+            'totalCount': self.total_count,
+            'excludedCount': self.excluded_count,
+            'excludedRate': round(excluded_rate, 2)
+        }
+
 
-    for user_id, user_data in users_data.items():
+class KPIAccumulator(Accumulator):
+    """KPI（総ユーザー数、総起動回数、総プレイ回数、平均スコア）"""
+
+    def __init__(self):
+        self.total_users = 0
+        self.total_launches = 0
+        self.total_plays = 0
+        self.score_sum = 0.0
+        self.score_count = 0
+
+    def start_user(self, user_id, user_data):
+        self.total_users += 1
         # 起動回数
-        launch_count = user_data.get('launch_count', 0)
-        total_launches += launch_count
+        self.total_launches += user_data.get('launch_count', 0)
 
+    def add_result(self, user_id, result_id, result_data, day):
         # プレイ回数とスコア
-        results = user_data.get('results', {})
-        if isinstance(results, dict):
-            total_plays += len(results)
-
-            for result_id, result_data in results.items():
-                # result_dataが辞書であることを確認
-                if isinstance(result_data, dict):
-                    score = result_data.get('score')
-                    if score is not None:
-                        try:
-                            # スコアを数値に変換
-                            all_scores.append(float(score))
-                        except (ValueError, TypeError):
-                            pass  # 変換できない場合はスキップ
-
-    average_score = sum(all_scores) / len(all_scores) if all_scores else 0
+        self.total_plays += 1
 
-    return {
-        'totalUsers': total_users,
-        'totalLaunches': total_launches,
-        'totalPlays': total_plays,
-        'averageScore': round(average_score, 2)
-    }
+        # result_dataが辞書であることを確認
+        if isinstance(result_data, dict):
+            score = result_data.get('score')
+            if score is not None:
+                try:
+                    # スコアを数値に変換
+                    self.score_sum += float(score)
+                    self.score_count += 1
+                except (ValueError, TypeError):
+                    pass  # 変換できない場合はスキップ
+
+    def get_state(self):
+        return {'totalPlays': self.total_plays, 'scoreSum': self.score_sum, 'scoreCount': self.score_count}
+
+    def set_state(self, state):
+        self.total_plays = state['totalPlays']
+        self.score_sum = state['scoreSum']
+        self.score_count = state['scoreCount']
+
+    def get_partial(self):
+        return {**self.get_state(), 'totalUsers': self.total_users, 'totalLaunches': self.total_launches}
+
+    def merge_partial(self, partial):
+        self.total_users += partial['totalUsers']
+        self.total_launches += partial['totalLaunches']
+        self.total_plays += partial['totalPlays']
+        self.score_sum += partial['scoreSum']
+        self.score_count += partial['scoreCount']
+
+    def result(self):
+        average_score = self.score_sum / self.score_count if self.score_count else 0
+
+        return {
+            'totalUsers': self.total_users,
+            'totalLaunches': self.total_launches,
+            'totalPlays': self.total_plays,
+            'averageScore': round(average_score, 2)
+        }
 
 
-def calculate_daily_active_users(users_data):
-    """日別アクティブユーザー数を計算"""
-    daily_activity = defaultdict(set)
-    today = date.today()
-
-    for user_id, user_data in users_data.items():
-        timestamps = user_data.get('timeStamp', {})
-        for timestamp_key, event_type in timestamps.items():
-            if event_type == 'launch':
-                # タイムスタンプから日付を抽出（YYYY-MM-DD-HH-MM-SS-MS形式）
-                try:
-                    date_part = '-'.join(timestamp_key.split('-')[:3])  # YYYY-MM-DD
-                    year = int(timestamp_key.split('-')[0])
-
-                    # 異常な年を除外（2025年のみ許可）
-                    if year != 2025:
-                        continue
-
-                    # 未来の日付を除外
-                    date_obj = datetime.strptime(date_part, '%Y-%m-%d').date()
-                    if date_obj > today:
-                        continue
-
-                    daily_activity[date_part].add(user_id)
-                except:
-                    continue
-
-    # 日付順にソート
-    sorted_daily = sorted(
-        [{'date': date, 'users': len(users)} for date, users in daily_activity.items()],
-        key=lambda x: x['date']
-    )
+class DailyActiveUsersAccumulator(Accumulator):
+    """日別アクティブユーザー数"""
 
-    return sorted_daily
+    def __init__(self):
+        self.daily_activity = defaultdict(set)
 
+    def add_event(self, user_id, timestamp_key, event_type, day):
+        # 異常な年・未来の日付は day が None
+        if event_type == 'launch' and day is not None:
+            self.daily_activity[day].add(user_id)
 
-def calculate_character_distribution(users_data):
-    """キャラクター別プレイ回数を集計"""
-    character_counter = Counter()
+    def get_state(self):
+        return {day: list(users) for day, users in self.daily_activity.items()}
 
-    for user_id, user_data in users_data.items():
-        results = user_data.get('results', {})
-        if isinstance(results, dict):
-            for result_id, result_data in results.items():
-                if isinstance(result_data, dict):
-                    character = result_data.get('character')
-                    if character:
-                        character_counter[character] += 1
+    def set_state(self, state):
+        self.daily_activity = defaultdict(set, {day: set(users) for day, users in state.items()})
 
-    return dict(character_counter)
+    def merge_partial(self, partial):
+        for day, users in partial.items():
+            self.daily_activity[day].update(users)
 
+    def result(self):
+        # 日付順にソート
+        return sorted(
+            [{'date': date, 'users': len(users)} for date, users in self.daily_activity.items()],
+            key=lambda x: x['date']
+        )
 
-def calculate_difficulty_distribution(users_data):
-    """難易度別プレイ回数を集計"""
-    difficulty_counter = Counter()
 
-    for user_id, user_data in users_data.items():
-        results = user_data.get('results', {})
-        if isinstance(results, dict):
-            for result_id, result_data in results.items():
-                if isinstance(result_data, dict):
-                    difficulty = result_data.get('difficulty')
-                    if difficulty:
-                        difficulty_counter[difficulty] += 1
+class SketchDailyActiveUsersAccumulator(DailyActiveUsersAccumulator):
+    """日別アクティブユーザー数（HyperLogLog による推定、relativeError は相対標準誤差）"""
 
-    return dict(difficulty_counter)
+    def __init__(self, precision):
+        self.precision = precision
+        self.daily_activity = defaultdict(lambda: HyperLogLog(precision))
 
+    def get_state(self):
+        return {day: sketch.to_state() for day, sketch in self.daily_activity.items()}
 
-def calculate_clear_rank_distribution(users_data):
-    """クリアランク分布を集計"""
-    rank_counter = Counter()
+    def set_state(self, state):
+        self.daily_activity = defaultdict(lambda: HyperLogLog(self.precision), {
+            day: HyperLogLog.from_state(sketch) for day, sketch in state.items()
+        })
 
-    for user_id, user_data in users_data.items():
-        results = user_data.get('results', {})
-        if isinstance(results, dict):
-            for result_id, result_data in results.items():
-                if isinstance(result_data, dict):
-                    rank = result_data.get('clearRank')
-                    if rank:
-                        rank_counter[rank] += 1
+    def merge_partial(self, partial):
+        for day, sketch in partial.items():
+            self.daily_activity[day].merge(HyperLogLog.from_state(sketch))
 
-    return dict(rank_counter)
+    def result(self):
+        error = round(relative_error(self.precision), 4)
+        # 日付順にソート
+        return sorted(
+            [{'date': date, 'users': sketch.count(), 'relativeError': error}
+             for date, sketch in self.daily_activity.items()],
+            key=lambda x: x['date']
+        )
 
 
-def calculate_language_distribution(users_data):
-    """言語分布を集計（最新の設定言語を使用）"""
-    language_counter = Counter()
+class RetentionAccumulator(Accumulator):
+    """D1/D7/D30 リテンションと週別コホート（日別のアクティブユーザーのビットマップから求める）"""
+
+    def __init__(self):
+        self.activity = ActivityBitmaps()
+        self._position = None
+
+    def start_user(self, user_id, user_data):
+        # 連番は起動があったユーザーにだけ振る
+        self._position = None
+
+    def add_event(self, user_id, timestamp_key, event_type, day):
+        # dailyActiveUsers と同じく集計対象の日付の起動だけ
+        if event_type == 'launch' and day is not None:
+            if self._position is None:
+                self._position = self.activity.position(user_id)
+            self.activity.add(self._position, day)
+
+    def get_state(self):
+        return self.activity.to_state()
+
+    def set_state(self, state):
+        self.activity = ActivityBitmaps.from_state(state)
+
+    def merge_partial(self, partial):
+        self.activity.merge(ActivityBitmaps.from_state(partial))
+
+    def result(self):
+        return retention_summary(self.activity)
+
 
-    for user_id, user_data in users_data.items():
+class RollingActiveUsersAccumulator(Accumulator):
+    """
+    ローリングアクティブユーザー数（WAU / MAU）と stickiness
+
+    retention の日別のビットマップから求めるため、このアキュムレータ自体は状態を持たない。
+    retention のアキュムレータは build_dashboard_accumulators が bind で渡す。
+    """
+
+    def __init__(self):
+        self.retention_accumulator = None
+
+    def bind(self, retention_accumulator):
+        self.retention_accumulator = retention_accumulator
+        self.dependencies = (retention_accumulator,)
+
+    def merge_partial(self, partial):
+        pass  # retention 側で結合する
+
+    def result(self):
+        return rolling_active_users(self.retention_accumulator.activity)
+
+
+class LanguageDistributionAccumulator(Accumulator):
+    """言語分布（最新の設定言語を使用）"""
+
+    def __init__(self):
+        self.language_counter = Counter()
+
+    def start_user(self, user_id, user_data):
         options = user_data.get('option', {})
         if options:
             # 最新のオプション設定を取得
@@ -243,161 +361,415 @@ def calculate_language_distribution(users_data):
                 latest_option = options[latest_option_key]
                 language = latest_option.get('settingLanguage')
                 if language:
-                    language_counter[language] += 1
+                    self.language_counter[language] += 1
 
-    return dict(language_counter)
+    def get_partial(self):
+        return dict(self.language_counter)
 
+    def merge_partial(self, partial):
+        self.language_counter.update(partial)
 
-def calculate_cutscene_skip_rate(users_data):
-    """カットシーンスキップ率を計算（セッションベース）"""
-    total_sessions = 0  # カットシーン開始回数
-    skipped_sessions = 0  # スキップされたセッション数
-    total_skip_button_presses = 0  # スキップボタン押下回数（参考値）
-
-    for user_id, user_data in users_data.items():
-        timestamps = user_data.get('timeStamp', {})
-
-        # タイムスタンプでソートしてカットシーンセッションを追跡
-        sorted_events = sorted([(k, v) for k, v in timestamps.items() if 'CutScene_Op' in str(v)])
-
-        in_cutscene = False
-        current_session_has_skip = False
-
-        for timestamp, event in sorted_events:
-            if 'Start' in str(event):
-                # 前のセッションを終了
-                if in_cutscene and current_session_has_skip:
-                    skipped_sessions += 1
-                # 新しいカットシーン開始
-                total_sessions += 1
-                in_cutscene = True
-                current_session_has_skip = False
-
-            elif 'Skip' in str(event):
-                current_session_has_skip = True
-                total_skip_button_presses += 1
-
-            elif 'End' in str(event):
-                if in_cutscene and current_session_has_skip:
-                    skipped_sessions += 1
-                in_cutscene = False
-                current_session_has_skip = False
-
-        # 最後のセッションが終了していない場合
-        if in_cutscene and current_session_has_skip:
-            skipped_sessions += 1
+    def result(self):
+        return dict(self.language_counter)
 
-    skip_rate = (skipped_sessions / total_sessions * 100) if total_sessions > 0 else 0
 
+# カットシーンイベント: CutScene_{名前}_{Start|Skip|End}（新形式）と CutScene{Start|Skip|End}_{名前}（旧形式）
+_CUTSCENE_EVENT = re.compile(
+    r'CutScene_(?P<name>.+)_(?P<action>Start|Skip|End)|CutScene(?P<legacy_action>Start|Skip|End)_(?P<legacy_name>.+)'
+)
+# キャラクターのカットシーンの名前: {キャラクター}_{番号}
+_CHARACTER_CUTSCENE = re.compile(r'(?P<character>[A-Za-z]+)_\d+')
+# イベント名の表記ゆれ → results の character と同じ表記
+CUTSCENE_CHARACTER_ALIASES = {'Hiakru': 'Hikaru'}
+
+# 全体のスキップ率（totalStart / totalSkip / skipRate）の対象にするカットシーン
+OPENING_CUTSCENE = 'Op'
+
+
+@lru_cache(maxsize=1024)
+def parse_cutscene_event(event):
+    """
+    カットシーンイベントを (カットシーン名, キャラクター, 'Start' | 'Skip' | 'End') に分解
+    （カットシーンイベントでなければ None、Op / Ed1 などキャラクターの無いものはキャラクターが None）
+
+    新形式と旧形式は同じカットシーン名になり、キャラクター名の表記ゆれも揃える（Hiakru_1 → Hikaru_1）。
+    """
+    match = _CUTSCENE_EVENT.fullmatch(event)
+    if match is None:
+        return None
+
+    name = match.group('name') or match.group('legacy_name')
+    action = match.group('action') or match.group('legacy_action')
+
+    character = None
+    character_match = _CHARACTER_CUTSCENE.fullmatch(name)
+    if character_match:
+        character = character_match.group('character')
+        alias = CUTSCENE_CHARACTER_ALIASES.get(character)
+        if alias:
+            character = alias
+            name = alias + name[len(character_match.group('character')):]
+
+    return name, character, action
+
+
+def _skip_rate_row(total_sessions, skipped_sessions, skip_button_presses):
+    skip_rate = (skipped_sessions / total_sessions * 100) if total_sessions > 0 else 0
     return {
         'totalStart': total_sessions,
         'totalSkip': skipped_sessions,
         'skipRate': round(skip_rate, 2),
-        'totalSkipButtonPresses': total_skip_button_presses  # デバッグ用
+        'totalSkipButtonPresses': skip_button_presses  # デバッグ用
     }
 
 
-def get_recent_plays(users_data, limit=500):
-    """最近のプレイ記録を取得（最大500件）"""
-    all_plays = []
-    today = date.today()
-
-    for user_id, user_data in users_data.items():
-        results = user_data.get('results', {})
-        if isinstance(results, dict):
-            for result_id, result_data in results.items():
-                if isinstance(result_data, dict):
-                    # タイムスタンプを抽出（result_idの最初の部分）
-                    timestamp_part = result_id.split('_')[0]
-
-                    # 異常な年を除外（2025年のみ許可）
-                    try:
-                        year = int(timestamp_part.split('-')[0])
-                        if year != 2025:
-                            continue
-
-                        # 未来の日付を除外
-                        date_part = '-'.join(timestamp_part.split('-')[:3])
-                        date_obj = datetime.strptime(date_part, '%Y-%m-%d').date()
-                        if date_obj > today:
-                            continue
-                    except:
-                        continue
-
-                    all_plays.append({
-                        'timestamp': timestamp_part,
-                        'character': result_data.get('character', 'Unknown'),
-                        'difficulty': result_data.get('difficulty', 'Unknown'),
-                        'score': result_data.get('score', 0),
-                        'clearRank': result_data.get('clearRank', '-'),
-                        'clearType': result_data.get('clearType', 'Unknown')
-                    })
+class CutsceneSkipRateAccumulator(Accumulator):
+    """
+    カットシーンスキップ率（セッションベース）
+
+    ユーザーごとにタイムスタンプ順に渡されるイベントを1回走査し、全カットシーンのセッションを同時に追跡する。
+    Start で始まり End で終わるまでを1セッションとし、その間に Skip があればスキップされたセッションとする
+    （End の前に次の Start が来た場合は前のセッションを終了として扱う）。
+    """
+
+    def __init__(self):
+        # カットシーン名 → [開始回数, スキップされたセッション数, スキップボタン押下回数]
+        self.tallies = {}
+        # キャラクターのカットシーン名 → キャラクター
+        self.characters = {}
+        # 再生中（End 未到達）のセッション: ユーザーID → {カットシーン名: スキップ済みか}
+        self.open_sessions = {}
+
+    def add_event(self, user_id, timestamp_key, event_type, day):
+        parsed = parse_cutscene_event(str(event_type))
+        if parsed is None:
+            return
+
+        name, character, action = parsed
+        tally = self.tallies.get(name)
+        if tally is None:
+            tally = self.tallies[name] = [0, 0, 0]
+            if character:
+                self.characters[name] = character
+        user_sessions = self.open_sessions.get(user_id)
+
+        if action == 'Start':
+            if user_sessions is None:
+                user_sessions = self.open_sessions[user_id] = {}
+            # 前のセッションを終了
+            if user_sessions.get(name):
+                tally[1] += 1
+            # 新しいカットシーン開始
+            tally[0] += 1
+            user_sessions[name] = False
+
+        elif action == 'Skip':
+            if user_sessions is not None and name in user_sessions:
+                user_sessions[name] = True
+            tally[2] += 1
+
+        elif user_sessions is not None and name in user_sessions:
+            if user_sessions.pop(name):
+                tally[1] += 1
+            if not user_sessions:
+                del self.open_sessions[user_id]
+
+    def get_state(self):
+        return {
+            'tallies': {name: list(tally) for name, tally in self.tallies.items()},
+            'characters': dict(self.characters),
+            'openSessions': {user_id: dict(sessions) for user_id, sessions in self.open_sessions.items()}
+        }
+
+    def set_state(self, state):
+        self.tallies = {name: list(tally) for name, tally in state['tallies'].items()}
+        self.characters = dict(state['characters'])
+        self.open_sessions = {user_id: dict(sessions) for user_id, sessions in state['openSessions'].items()}
+
+    def merge_partial(self, partial):
+        for name, tally in partial['tallies'].items():
+            merged = self.tallies.setdefault(name, [0, 0, 0])
+            for i, value in enumerate(tally):
+                merged[i] += value
+        self.characters.update(partial['characters'])
+        # シャード間でユーザーは重複しない
+        self.open_sessions.update(partial['openSessions'])
+
+    def result(self):
+        # 最後のセッションが終了していない場合もスキップ済みならカウント
+        tallies = {name: list(tally) for name, tally in self.tallies.items()}
+        for sessions in self.open_sessions.values():
+            for name, skipped in sessions.items():
+                if skipped:
+                    tallies[name][1] += 1
+
+        by_cutscene = []
+        character_tallies = defaultdict(lambda: [0, 0, 0])
+        for name in sorted(tallies):
+            tally = tallies[name]
+            character = self.characters.get(name)
+            by_cutscene.append({'cutscene': name, 'character': character, **_skip_rate_row(*tally)})
+            if character:
+                for i, value in enumerate(tally):
+                    character_tallies[character][i] += value
+
+        return {
+            # 全体の値はオープニング（従来の集計対象）
+            **_skip_rate_row(*tallies.get(OPENING_CUTSCENE, [0, 0, 0])),
+            'byCutscene': by_cutscene,
+            'byCharacter': [
+                {'character': character, **_skip_rate_row(*character_tallies[character])}
+                for character in sorted(character_tallies)
+            ]
+        }
+
+
+# ダッシュボードに出力するファネル（イベント名のパターンは新旧両方のカットシーンの形式に当てる）
+DASHBOARD_FUNNELS = [
+    Funnel('songAfterCutscene', [
+        ('launch', 'launch'),
+        ('firstSong', 'GameEnd_*'),
+        ('cutscene', ('CutScene_*_Start', 'CutSceneStart_*')),
+        ('nextSong', 'GameEnd_*'),
+    ]),
+    Funnel('launchToPlay', [
+        ('launch', 'launch'),
+        ('firstSong', 'GameEnd_*'),
+    ], window=30 * 60),
+]
+
+
+class FunnelAccumulator(Accumulator):
+    """
+    イベントのファネル（ステップごとの試行数・離脱率・ステップ間の所要時間）
 
+    全てのファネルを1回の走査で集計する。途中の試行は増分集計の状態に含め、次回の新しいイベントで続きを進める。
+    """
+
+    def __init__(self, funnels=DASHBOARD_FUNNELS):
+        self.funnels = funnels
+        self.tracker = FunnelTracker(funnels)
+
+    def add_event(self, user_id, timestamp_key, event_type, day):
+        # 異常な年・未来の日付のイベントは時刻順に並ばないため使わない
+        if day is not None:
+            self.tracker.add(user_id, str(event_type), timestamp_key)
+
+    def get_state(self):
+        return self.tracker.to_state()
+
+    def set_state(self, state):
+        self.tracker = FunnelTracker.from_state(self.funnels, state)
+
+    def merge_partial(self, partial):
+        self.tracker.merge(FunnelTracker.from_state(self.funnels, partial))
+
+    def result(self):
+        return self.tracker.summary()
+
+
+class SessionAccumulator(Accumulator):
+    """
+    プレイセッション（長さ・曲数・ユーザーごとの数・日別の数）
+
+    timeStamp のイベントを無操作の時間と launch / AppStart で区切り、results のプレイを時刻でマージ結合する。
+    各ユーザーの最後のセッションは増分集計の状態に含め、次回の新しいイベントが続きになる場合に備える。
+    """
+
+    def __init__(self, gap=DEFAULT_SESSION_GAP):
+        self.gap = gap
+        self.sessionizer = Sessionizer(gap)
+
+    def start_user(self, user_id, user_data):
+        self.sessionizer.start_user(user_id)
+
+    def add_result(self, user_id, result_id, result_data, day):
+        # 異常な年・未来の日付は時刻順に並ばないため使わない
+        if day is not None:
+            seconds = timestamp_seconds(result_id)
+            if seconds is not None:
+                self.sessionizer.add_play(seconds, day)
+
+    def add_event(self, user_id, timestamp_key, event_type, day):
+        if day is not None:
+            seconds = timestamp_seconds(timestamp_key)
+            if seconds is not None:
+                self.sessionizer.add_event(event_type, seconds, day)
+
+    def end_user(self, user_id, user_data):
+        self.sessionizer.end_user(user_id)
+
+    def get_state(self):
+        return self.sessionizer.to_state()
+
+    def set_state(self, state):
+        self.sessionizer = Sessionizer.from_state(state, self.gap)
+
+    def merge_partial(self, partial):
+        self.sessionizer.merge(Sessionizer.from_state(partial, self.gap))
+
+    def result(self):
+        return self.sessionizer.summary()
+
+
+def _play_record(timestamp_part, result_data):
+    """最近のプレイ記録の1行"""
+    return {
+        'timestamp': timestamp_part,
+        'character': result_data.get('character', 'Unknown'),
+        'difficulty': result_data.get('difficulty', 'Unknown'),
+        'score': result_data.get('score', 0),
+        'clearRank': result_data.get('clearRank', '-'),
+        'clearType': result_data.get('clearType', 'Unknown')
+    }
+
+
+def _is_newer(play, other):
+    """play が other より新しいか（同じタイムスタンプはユーザーID・result ID が小さい方を新しいとみなす）"""
+    if play[0] != other[0]:
+        return play[0] > other[0]
+    return (play[1], play[2]) < (other[1], other[2])
+
+
+class _HeapPlay:
+    """最小ヒープの要素（ヒープの先頭が上位 limit 件の中で最も古いプレイになる）"""
+
+    __slots__ = ('play',)
+
+    def __init__(self, play):
+        self.play = play
+
+    def __lt__(self, other):
+        return _is_newer(other.play, self.play)
+
+
+def _sort_plays_newest_first(plays):
+    """(timestamp, user_id, result_id, ...) のリストを新しい順に並べ替える"""
+    plays.sort(key=lambda play: (play[1], play[2]))
     # タイムスタンプでソート（降順）
-    sorted_plays = sorted(all_plays, key=lambda x: x['timestamp'], reverse=True)
+    plays.sort(key=lambda play: play[0], reverse=True)
+    return plays
 
-    return sorted_plays[:limit]
 
+class RecentPlaysAccumulator(Accumulator):
+    """
+    最近のプレイ記録
 
-def calculate_song_plays_by_difficulty(users_data):
-    """楽曲別・難易度別のユニークプレイヤー数を集計"""
-    # 楽曲ID × 難易度 → ユニークユーザーIDのセット
-    song_difficulty_users = defaultdict(lambda: defaultdict(set))
+    上位 limit 件だけを最小ヒープで保持する（メモリ・時間は総プレイ数ではなく limit で決まる）。
+    並び順はタイムスタンプの降順で、同じタイムスタンプ同士はユーザーID・result ID の昇順。
+    track_evictions() の後は、上位 limit 件から外れたプレイ（最初から入らなかったプレイを含む）を記録する
+    （増分集計でアーカイブに追記する）。
+    """
 
-    for user_id, user_data in users_data.items():
-        results = user_data.get('results', {})
-        if isinstance(results, dict):
-            for result_id, result_data in results.items():
-                if isinstance(result_data, dict):
-                    game_type = result_data.get('gameType')
-                    difficulty = result_data.get('difficulty')
+    def __init__(self, limit=500):
+        self.limit = limit
+        # (timestamp, user_id, result_id, プレイ記録) の _HeapPlay の最小ヒープ
+        self.heap = []
+        # 上位 limit 件から外れたプレイ（None なら記録しない）
+        self.evicted = None
+
+    def track_evictions(self):
+        """以降に上位 limit 件から外れたプレイを記録する"""
+        self.evicted = []
+
+    def add_result(self, user_id, result_id, result_data, day):
+        # 異常な年・未来の日付は day が None
+        if day is None or not isinstance(result_data, dict):
+            return
+
+        # タイムスタンプを抽出（result_idの最初の部分）
+        timestamp_part = result_id.split('_')[0]
+        self._offer((timestamp_part, user_id, result_id, None), result_data)
+
+    def _offer(self, play, result_data=None):
+        """上位 limit 件に入るならヒープに加える（result_data があればプレイ記録は入る場合と記録する場合だけ作る）"""
+        full = len(self.heap) >= self.limit
+        if full and not _is_newer(play, self.heap[0].play):
+            if self.evicted is not None:
+                self.evicted.append(play if result_data is None else (*play[:3], _play_record(play[0], result_data)))
+            return
+
+        if result_data is not None:
+            play = (*play[:3], _play_record(play[0], result_data))
+        if full:
+            evicted = heapq.heapreplace(self.heap, _HeapPlay(play))
+            if self.evicted is not None:
+                self.evicted.append(evicted.play)
+        else:
+            heapq.heappush(self.heap, _HeapPlay(play))
 
-                    if game_type and difficulty:
-                        song_difficulty_users[game_type][difficulty].add(user_id)
+    def boundary(self):
+        """上位 limit 件の中で最も古いプレイの [timestamp, user_id, result_id]（limit 件に満たなければ None）"""
+        return list(self.heap[0].play[:3]) if len(self.heap) >= self.limit else None
 
-    # データを整形してリスト化
-    song_stats = []
-    for game_type, difficulties in song_difficulty_users.items():
-        easy_count = len(difficulties.get('Easy', set()))
-        normal_count = len(difficulties.get('Normal', set()))
-        hard_count = len(difficulties.get('Hard', set()))
-        total_count = easy_count + normal_count + hard_count
+    def evicted_plays(self):
+        """track_evictions() 以降に上位 limit 件から外れたプレイの記録（古い順）"""
+        plays = _sort_plays_newest_first(list(self.evicted or []))
+        return [play[3] for play in reversed(plays)]
 
-        song_stats.append({
-            'songId': game_type,
-            'easy': easy_count,
-            'normal': normal_count,
-            'hard': hard_count,
-            'total': total_count
-        })
+    def _sorted_plays(self):
+        return _sort_plays_newest_first([item.play for item in self.heap])
 
-    # 合計プレイ人数でソート（降順）
-    sorted_stats = sorted(song_stats, key=lambda x: x['total'], reverse=True)
+    def get_state(self):
+        return [list(play) for play in self._sorted_plays()]
 
-    return sorted_stats
+    def set_state(self, state):
+        self.heap = []
+        for play in state:
+            self._offer(tuple(play))
 
+    def merge_partial(self, partial):
+        for play in partial:
+            self._offer(tuple(play))
 
-def calculate_song_play_counts_by_difficulty(users_data):
-    """楽曲別・難易度別のプレイ累計回数を集計"""
-    song_difficulty_counts = defaultdict(lambda: defaultdict(int))
+    def result(self):
+        return [play[3] for play in self._sorted_plays()]
+
+
+class RecentPlaysArchiveAccumulator(Accumulator):
+    """
+    最近のプレイ記録（recentPlays）に入らない古いプレイのアーカイブ
+
+    全プレイを保持し、新しい方から limit 件（recentPlays と同じもの）を除いた古い順のプレイ（plays）と、
+    recentPlays の最も古いプレイ（boundary、RecentPlaysAccumulator.boundary と同じ形式）を返す。
+    plays を逆順にすると recentPlays の続きになる。
+    """
 
-    for user_id, user_data in users_data.items():
-        results = user_data.get('results', {})
-        if isinstance(results, dict):
-            for result_id, result_data in results.items():
-                if isinstance(result_data, dict):
-                    game_type = result_data.get('gameType')
-                    difficulty = result_data.get('difficulty')
+    def __init__(self, limit=500):
+        self.limit = limit
+        # (timestamp, user_id, result_id, プレイ記録) のリスト
+        self.plays = []
 
-                    if game_type and difficulty:
-                        song_difficulty_counts[game_type][difficulty] += 1
+    def add_result(self, user_id, result_id, result_data, day):
+        # 異常な年・未来の日付は day が None
+        if day is None or not isinstance(result_data, dict):
+            return
 
-    # データを整形してリスト化
+        timestamp_part = result_id.split('_')[0]
+        self.plays.append((timestamp_part, user_id, result_id, _play_record(timestamp_part, result_data)))
+
+    def get_state(self):
+        return [list(play) for play in self.plays]
+
+    def set_state(self, state):
+        self.plays = [tuple(play) for play in state]
+
+    def merge_partial(self, partial):
+        self.plays.extend(tuple(play) for play in partial)
+
+    def result(self):
+        plays = _sort_plays_newest_first(list(self.plays))
+        boundary = list(plays[self.limit - 1][:3]) if len(plays) >= self.limit else None
+        return {'boundary': boundary, 'plays': [play[3] for play in reversed(plays[self.limit:])]}
+
+
+def _song_difficulty_table(song_difficulty_values, size):
+    """楽曲 × 難易度の集計を合計降順のテーブルに整形"""
     song_stats = []
-    for game_type, difficulties in song_difficulty_counts.items():
-        easy_count = difficulties.get('Easy', 0)
-        normal_count = difficulties.get('Normal', 0)
-        hard_count = difficulties.get('Hard', 0)
+    for game_type, difficulties in song_difficulty_values.items():
+        easy_count = size(difficulties.get('Easy'))
+        normal_count = size(difficulties.get('Normal'))
+        hard_count = size(difficulties.get('Hard'))
         total_count = easy_count + normal_count + hard_count
 
         song_stats.append({
@@ -408,226 +780,333 @@ def calculate_song_play_counts_by_difficulty(users_data):
             'total': total_count
         })
 
-    # 合計プレイ回数でソート（降順）
-    sorted_stats = sorted(song_stats, key=lambda x: x['total'], reverse=True)
+    # 合計でソート（降順）
+    return sorted(song_stats, key=lambda x: x['total'], reverse=True)
 
-    return sorted_stats
 
+class SongPlaysByDifficultyAccumulator(Accumulator):
+    """楽曲別・難易度別のユニークプレイヤー数"""
 
-def calculate_player_clear_rate_distribution(users_data):
-    """プレイヤー別クリアレート分布を計算（clearTypeベース）"""
-    import statistics
-
-    user_clear_rates = []
-
-    for user_id, user_data in users_data.items():
-        results = user_data.get('results', {})
-        if isinstance(results, dict) and len(results) > 0:
-            user_total = 0
-            user_clears = 0
-
-            for result_id, result_data in results.items():
-                if isinstance(result_data, dict):
-                    user_total += 1
-                    clear_type = result_data.get('clearType', 'Unknown')
-                    # Clear, FullCombo, Perfect をクリアとしてカウント
-                    if clear_type in ['Clear', 'FullCombo', 'Perfect']:
-                        user_clears += 1
-
-            if user_total > 0:
-                user_clear_rate = (user_clears / user_total) * 100
-                user_clear_rates.append(user_clear_rate)
-
-    # 7区分で集計
-    brackets = {
-        '0%': 0,
-        '1-19%': 0,
-        '20-39%': 0,
-        '40-59%': 0,
-        '60-79%': 0,
-        '80-99%': 0,
-        '100%': 0
-    }
+    def __init__(self):
+        # 楽曲ID × 難易度 → ユニークユーザーIDのセット
+        self.song_difficulty_users = defaultdict(lambda: defaultdict(set))
 
-    for rate in user_clear_rates:
-        if rate == 0:
-            brackets['0%'] += 1
-        elif rate < 20:
-            brackets['1-19%'] += 1
-        elif rate < 40:
-            brackets['20-39%'] += 1
-        elif rate < 60:
-            brackets['40-59%'] += 1
-        elif rate < 80:
-            brackets['60-79%'] += 1
-        elif rate < 100:
-            brackets['80-99%'] += 1
-        else:
-            brackets['100%'] += 1
+    def add_result(self, user_id, result_id, result_data, day):
+        if isinstance(result_data, dict):
+            game_type = result_data.get('gameType')
+            difficulty = result_data.get('difficulty')
 
-    # 統計情報を計算
-    stats = {
-        'mean': round(statistics.mean(user_clear_rates), 2) if user_clear_rates else 0,
-        'median': round(statistics.median(user_clear_rates), 2) if user_clear_rates else 0,
-        'totalPlayers': len(user_clear_rates)
-    }
+            if game_type and difficulty:
+                self.song_difficulty_users[game_type][difficulty].add(user_id)
 
-    return {
-        'distribution': brackets,
-        'stats': stats
-    }
+    def get_state(self):
+        return {
+            game_type: {difficulty: list(users) for difficulty, users in difficulties.items()}
+            for game_type, difficulties in self.song_difficulty_users.items()
+        }
 
+    def set_state(self, state):
+        for game_type, difficulties in state.items():
+            for difficulty, users in difficulties.items():
+                self.song_difficulty_users[game_type][difficulty] = set(users)
 
-def calculate_play_clear_rate_distribution(users_data):
-    """プレイ別クリアレート分布を計算（clearRateフィールドベース）"""
-    import statistics
-
-    all_clear_rates = []
-
-    for user_id, user_data in users_data.items():
-        results = user_data.get('results', {})
-        if isinstance(results, dict):
-            for result_id, result_data in results.items():
-                if isinstance(result_data, dict):
-                    clear_rate = result_data.get('clearRate')
-                    # clearRateフィールドが存在する場合のみ集計
-                    if clear_rate is not None:
-                        try:
-                            rate_value = int(clear_rate)
-                            # 0-100の範囲内のみ有効
-                            if 0 <= rate_value <= 100:
-                                all_clear_rates.append(rate_value)
-                        except (ValueError, TypeError):
-                            pass  # 数値に変換できない場合はスキップ
-
-    # 7区分で集計
-    brackets = {
-        '0%': 0,
-        '1-19%': 0,
-        '20-39%': 0,
-        '40-59%': 0,
-        '60-79%': 0,
-        '80-99%': 0,
-        '100%': 0
-    }
+    def merge_partial(self, partial):
+        for game_type, difficulties in partial.items():
+            for difficulty, users in difficulties.items():
+                self.song_difficulty_users[game_type][difficulty].update(users)
 
-    for rate in all_clear_rates:
-        if rate == 0:
-            brackets['0%'] += 1
-        elif rate < 20:
-            brackets['1-19%'] += 1
-        elif rate < 40:
-            brackets['20-39%'] += 1
-        elif rate < 60:
-            brackets['40-59%'] += 1
-        elif rate < 80:
-            brackets['60-79%'] += 1
-        elif rate < 100:
-            brackets['80-99%'] += 1
-        else:
-            brackets['100%'] += 1
+    def result(self):
+        return _song_difficulty_table(
+            self.song_difficulty_users,
+            lambda users: len(users) if users else 0
+        )
 
-    # 統計情報を計算
-    stats = {
-        'mean': round(statistics.mean(all_clear_rates), 2) if all_clear_rates else 0,
-        'median': round(statistics.median(all_clear_rates), 2) if all_clear_rates else 0,
-        'totalPlays': len(all_clear_rates)
-    }
 
-    return {
-        'distribution': brackets,
-        'stats': stats
-    }
+class SketchSongPlaysByDifficultyAccumulator(SongPlaysByDifficultyAccumulator):
+    """楽曲別・難易度別のユニークプレイヤー数（HyperLogLog による推定、relativeError は相対標準誤差）"""
 
+    def __init__(self, precision):
+        self.precision = precision
+        self.song_difficulty_users = defaultdict(lambda: defaultdict(lambda: HyperLogLog(precision)))
 
-def calculate_platform_distribution(users_data):
-    """Platform別の統計を計算"""
-    platform_plays = Counter()
-    platform_users = defaultdict(set)
-
-    for user_id, user_data in users_data.items():
-        results = user_data.get('results', {})
-        if not isinstance(results, dict):
-            continue
-
-        for result_id, result_data in results.items():
-            if not isinstance(result_data, dict):
-                continue
-
-            platform = result_data.get('platform')
-            if platform:
-                platform_plays[platform] += 1
-                platform_users[platform].add(user_id)
-
-    # 分布データを作成
-    distribution = []
-    for platform, plays in platform_plays.most_common():
-        distribution.append({
-            'platform': platform,
-            'plays': plays,
-            'users': len(platform_users[platform])
+    def get_state(self):
+        return {
+            game_type: {difficulty: sketch.to_state() for difficulty, sketch in difficulties.items()}
+            for game_type, difficulties in self.song_difficulty_users.items()
+        }
+
+    def set_state(self, state):
+        for game_type, difficulties in state.items():
+            for difficulty, sketch in difficulties.items():
+                self.song_difficulty_users[game_type][difficulty] = HyperLogLog.from_state(sketch)
+
+    def merge_partial(self, partial):
+        for game_type, difficulties in partial.items():
+            for difficulty, sketch in difficulties.items():
+                self.song_difficulty_users[game_type][difficulty].merge(HyperLogLog.from_state(sketch))
+
+    def result(self):
+        error = round(relative_error(self.precision), 4)
+        song_stats = _song_difficulty_table(
+            self.song_difficulty_users,
+            lambda sketch: sketch.count() if sketch else 0
+        )
+        return [{**song, 'relativeError': error} for song in song_stats]
+
+
+class PlayerClearRateAccumulator(Accumulator):
+    """プレイヤー別クリアレート分布（clearTypeベース）"""
+
+    def __init__(self):
+        # ユーザーID → [プレイ数, クリア数]
+        self.user_tallies = {}
+
+    def add_result(self, user_id, result_id, result_data, day):
+        if isinstance(result_data, dict):
+            tally = self.user_tallies.get(user_id)
+            if tally is None:
+                tally = self.user_tallies[user_id] = [0, 0]
+            tally[0] += 1
+            clear_type = result_data.get('clearType', 'Unknown')
+            if clear_type in CLEAR_TYPES:
+                tally[1] += 1
+
+    def get_state(self):
+        return {user_id: list(tally) for user_id, tally in self.user_tallies.items()}
+
+    def set_state(self, state):
+        self.user_tallies = {user_id: list(tally) for user_id, tally in state.items()}
+
+    def merge_partial(self, partial):
+        # シャード間でユーザーは重複しない
+        self.user_tallies.update((user_id, list(tally)) for user_id, tally in partial.items())
+
+    def result(self):
+        # プレイヤーごとのクリアレートを値ごとの人数にまとめる（リストは作らない）
+        histogram = ValueHistogram()
+        for user_total, user_clears in self.user_tallies.values():
+            histogram.add((user_clears / user_total) * 100)
+
+        return _clear_rate_summary(histogram, 'totalPlayers')
+
+
+class PlayClearRateAccumulator(Accumulator):
+    """プレイ別クリアレート分布（clearRateフィールドベース）"""
+
+    def __init__(self):
+        # clearRate（0-100）ごとのプレイ数
+        self.histogram = IntegerHistogram(101)
+
+    def add_result(self, user_id, result_id, result_data, day):
+        if isinstance(result_data, dict):
+            clear_rate = result_data.get('clearRate')
+            # clearRateフィールドが存在する場合のみ集計
+            if clear_rate is not None:
+                try:
+                    rate_value = int(clear_rate)
+                    # 0-100の範囲内のみ有効
+                    if 0 <= rate_value <= 100:
+                        self.histogram.add(rate_value)
+                except (ValueError, TypeError):
+                    pass  # 数値に変換できない場合はスキップ
+
+    def get_state(self):
+        return self.histogram.to_state()
+
+    def set_state(self, state):
+        self.histogram = IntegerHistogram(101, state)
+
+    def merge_partial(self, partial):
+        self.histogram.merge(IntegerHistogram(101, partial))
+
+    def result(self):
+        return _clear_rate_summary(self.histogram, 'totalPlays')
+
+
+class PlatformDistributionAccumulator(Accumulator):
+    """Platform別の統計"""
+
+    def __init__(self):
+        self.platform_plays = Counter()
+        self.platform_users = defaultdict(set)
+
+    def add_result(self, user_id, result_id, result_data, day):
+        if not isinstance(result_data, dict):
+            return
+
+        platform = result_data.get('platform')
+        if platform:
+            self.platform_plays[platform] += 1
+            self.platform_users[platform].add(user_id)
+
+    def get_state(self):
+        return {
+            'plays': dict(self.platform_plays),
+            'users': {platform: list(users) for platform, users in self.platform_users.items()}
+        }
+
+    def set_state(self, state):
+        self.platform_plays = Counter(state['plays'])
+        self.platform_users = defaultdict(set, {
+            platform: set(users) for platform, users in state['users'].items()
         })
 
-    return distribution
+    def merge_partial(self, partial):
+        self.platform_plays.update(partial['plays'])
+        for platform, users in partial['users'].items():
+            self.platform_users[platform].update(users)
 
+    def result(self):
+        # 分布データを作成
+        distribution = []
+        for platform, plays in self.platform_plays.most_common():
+            distribution.append({
+                'platform': platform,
+                'plays': plays,
+                'users': len(self.platform_users[platform])
+            })
 
-def calculate_costume_distribution(users_data):
-    """Costume別の統計を計算"""
-    costume_plays = Counter()
-
-    for user_id, user_data in users_data.items():
-        results = user_data.get('results', {})
-        if not isinstance(results, dict):
-            continue
-
-        for result_id, result_data in results.items():
-            if not isinstance(result_data, dict):
-                continue
-
-            costume = result_data.get('costume')
-            if costume:
-                costume_plays[costume] += 1
-
-    # 分布データを作成（Top 20）
-    distribution = []
-    for costume, plays in costume_plays.most_common(20):
-        distribution.append({
-            'costume': costume,
-            'plays': plays
+        return distribution
+
+
+class SketchPlatformDistributionAccumulator(PlatformDistributionAccumulator):
+    """Platform別の統計（ユーザー数は HyperLogLog による推定、usersRelativeError は相対標準誤差）"""
+
+    def __init__(self, precision):
+        super().__init__()
+        self.precision = precision
+        self.platform_users = defaultdict(lambda: HyperLogLog(precision))
+
+    def get_state(self):
+        return {
+            'plays': dict(self.platform_plays),
+            'users': {platform: sketch.to_state() for platform, sketch in self.platform_users.items()}
+        }
+
+    def set_state(self, state):
+        self.platform_plays = Counter(state['plays'])
+        self.platform_users = defaultdict(lambda: HyperLogLog(self.precision), {
+            platform: HyperLogLog.from_state(sketch) for platform, sketch in state['users'].items()
         })
 
-    return distribution
+    def merge_partial(self, partial):
+        self.platform_plays.update(partial['plays'])
+        for platform, sketch in partial['users'].items():
+            self.platform_users[platform].merge(HyperLogLog.from_state(sketch))
+
+    def result(self):
+        error = round(relative_error(self.precision), 4)
+        distribution = []
+        for platform, plays in self.platform_plays.most_common():
+            distribution.append({
+                'platform': platform,
+                'plays': plays,
+                'users': self.platform_users[platform].count(),
+                'usersRelativeError': error
+            })
+
+        return distribution
+
+
+def _score_value(result_data):
+    """スコアを数値に変換（無い・変換できない場合は None）"""
+    score = result_data.get('score')
+    if score is None:
+        return None
+    try:
+        return float(score)
+    except (ValueError, TypeError):
+        return None
 
 
-def calculate_platform_costume_cross(users_data):
-    """Platform × Costume のクロス集計"""
-    cross_data = defaultdict(lambda: defaultdict(int))
+class RollupCubeAccumulator(Accumulator):
+    """
+    プレイ記録のロールアップキューブ（rollup_cube.RollupCube）
+
+    日付 × 楽曲 × 難易度 × キャラクター × Platform × Costume × クリアランクごとの
+    プレイ数・スコアの合計と件数・クリア数（clearTypeベース）。件数のセクションはここから求める。
+    """
+
+    def __init__(self):
+        self.cube = RollupCube()
+
+    def add_result(self, user_id, result_id, result_data, day):
+        if not isinstance(result_data, dict):
+            return
+
+        key = (day, *[result_data.get(field) or None for field in RESULT_DIMENSIONS])
+        score = _score_value(result_data)
+        cleared = result_data.get('clearType', 'Unknown') in CLEAR_TYPES
+        self.cube.add(key, 1, score or 0.0, score is not None, int(cleared))
+
+    def get_state(self):
+        return self.cube.to_dict()
+
+    def set_state(self, state):
+        self.cube = RollupCube.from_dict(state)
+
+    def merge_partial(self, partial):
+        self.cube.merge(RollupCube.from_dict(partial))
+
+    def result(self):
+        return self.cube.to_dict()
+
+
+class CubeSectionAccumulator(Accumulator):
+    """
+    ロールアップキューブを dimensions 以外の次元について合計して求めるセクション
+
+    format_counts は {dimensions の値のタプル: プレイ数}（初出順）からセクションの値を作る関数。
+    集計状態はキューブが持つため、このアキュムレータ自体は状態を持たない。
+    キューブは build_dashboard_accumulators が bind で渡す。
+    """
+
+    def __init__(self, dimensions, format_counts):
+        self.dimensions = dimensions
+        self.format_counts = format_counts
+        self.cube_accumulator = None
+
+    def bind(self, cube_accumulator):
+        self.cube_accumulator = cube_accumulator
+        self.dependencies = (cube_accumulator,)
+
+    def merge_partial(self, partial):
+        pass  # キューブ側で結合する
+
+    def result(self):
+        projected = self.cube_accumulator.cube.rollup(self.dimensions)
+        return self.format_counts({group: cell[0] for group, cell in projected.items()})
+
+
+def _field_counts(counts):
+    """値ごとのプレイ回数（キャラクター別・難易度別・クリアランク別）"""
+    return {value: plays for (value,), plays in counts.items()}
 
-    for user_id, user_data in users_data.items():
-        results = user_data.get('results', {})
-        if not isinstance(results, dict):
-            continue
 
-        for result_id, result_data in results.items():
-            if not isinstance(result_data, dict):
-                continue
+def _song_play_counts_table(counts):
+    """楽曲別・難易度別のプレイ累計回数"""
+    song_difficulty_counts = defaultdict(dict)
+    for (game_type, difficulty), plays in counts.items():
+        song_difficulty_counts[game_type][difficulty] = plays
+    return _song_difficulty_table(song_difficulty_counts, lambda count: count or 0)
 
-            platform = result_data.get('platform')
-            costume = result_data.get('costume')
 
-            if platform and costume:
-                cross_data[platform][costume] += 1
+def _costume_distribution(counts):
+    """Costume別の統計（Top 20）"""
+    counter = Counter({costume: plays for (costume,), plays in counts.items()})
+    return [{'costume': costume, 'plays': plays} for costume, plays in counter.most_common(20)]
+
+
+def _platform_costume_table(counts):
+    """Platform × Costume のクロス集計"""
+    cross_data = defaultdict(dict)
+    for (platform, costume), plays in counts.items():
+        cross_data[platform][costume] = plays
 
     # テーブル形式に変換
     table = []
     for platform, costumes in cross_data.items():
-        row = {'platform': platform}
-        total = 0
-        for costume, count in costumes.items():
-            row[costume] = count
-            total += count
-        row['total'] = total
-        table.append(row)
+        table.append({'platform': platform, **costumes, 'total': sum(costumes.values())})
 
     # 合計でソート
     table.sort(key=lambda x: x['total'], reverse=True)
@@ -635,31 +1114,486 @@ def calculate_platform_costume_cross(users_data):
     return table
 
 
-def aggregate_dashboard_data(users_data, ga4_data=None):
-    """全ての集計を実行してダッシュボード用データを生成"""
+class ColumnarMixin:
+    """
+    列指向テーブル（results_table.ResultsTable）でまとめて集計する版のアキュムレータ
+
+    results は共有の ResultsTableBuilder が列に追記し、get_state / result の前に
+    未反映の行をベクトル演算で集計して、通常版と同じ集計状態へ反映する。
+    """
+
+    # results は ResultsTableBuilder が受け取る（通常版の add_result を無効化）
+    add_result = Accumulator.add_result
+
+    def __init__(self, builder, *args):
+        super().__init__(*args)
+        self.builder = builder
+        self.dependencies = (builder,)
+        self._folded_batch = None
+
+    def _flush(self):
+        table = self.builder.table()
+        if table.batch != self._folded_batch:
+            self._folded_batch = table.batch
+            self.fold_table(table)
+
+    def fold_table(self, table):
+        raise NotImplementedError
+
+    def get_state(self):
+        self._flush()
+        return super().get_state()
+
+    def get_partial(self):
+        self._flush()
+        return super().get_partial()
+
+    def result(self):
+        self._flush()
+        return super().result()
+
+
+class ColumnarKPIAccumulator(ColumnarMixin, KPIAccumulator):
+    """KPI（列指向版）"""
+
+    def fold_table(self, table):
+        self.total_plays += table.row_count + table.non_dict_count
+        # 合計は従来どおり行順に加算（浮動小数点の丸めを一致させるため）
+        scores = table.valid_scores().tolist()
+        self.score_sum += sum(scores)
+        self.score_count += len(scores)
+
+
+class ColumnarSongPlaysByDifficultyAccumulator(ColumnarMixin, SongPlaysByDifficultyAccumulator):
+    """楽曲別・難易度別のユニークプレイヤー数（列指向版）"""
+
+    def fold_table(self, table):
+        for (game_type, difficulty), users in table.group_users(('gameType', 'difficulty')):
+            self.song_difficulty_users[game_type][difficulty].update(users)
+
+
+class ColumnarRollupCubeAccumulator(ColumnarMixin, RollupCubeAccumulator):
+    """プレイ記録のロールアップキューブ（列指向版）"""
+
+    def fold_table(self, table):
+        for key, plays, score_sum, score_count, clears in table.cube_cells(RESULT_DIMENSIONS, CLEAR_TYPES):
+            self.cube.add(key, plays, score_sum, score_count, clears)
+
+
+class ColumnarPlayerClearRateAccumulator(ColumnarMixin, PlayerClearRateAccumulator):
+    """プレイヤー別クリアレート分布（列指向版）"""
+
+    def fold_table(self, table):
+        for user_id, total, clears in table.user_tallies(CLEAR_TYPES):
+            tally = self.user_tallies.get(user_id)
+            if tally is None:
+                tally = self.user_tallies[user_id] = [0, 0]
+            tally[0] += total
+            tally[1] += clears
+
+
+class ColumnarPlayClearRateAccumulator(ColumnarMixin, PlayClearRateAccumulator):
+    """プレイ別クリアレート分布（列指向版）"""
+
+    def fold_table(self, table):
+        self.histogram.merge(IntegerHistogram(101, table.clear_rate_histogram()))
+
+
+class ColumnarPlatformDistributionAccumulator(ColumnarMixin, PlatformDistributionAccumulator):
+    """Platform別の統計（列指向版）"""
+
+    def fold_table(self, table):
+        for (platform,), plays in table.group_counts(('platform',)):
+            self.platform_plays[platform] += plays
+        for (platform,), users in table.group_users(('platform',)):
+            self.platform_users[platform].update(users)
+
+
+class ColumnarSketchSongPlaysByDifficultyAccumulator(ColumnarSongPlaysByDifficultyAccumulator,
+                                                     SketchSongPlaysByDifficultyAccumulator):
+    """楽曲別・難易度別のユニークプレイヤー数（列指向版、HyperLogLog による推定）"""
+
+
+class ColumnarSketchPlatformDistributionAccumulator(ColumnarPlatformDistributionAccumulator,
+                                                    SketchPlatformDistributionAccumulator):
+    """Platform別の統計（列指向版、ユーザー数は HyperLogLog による推定）"""
+
+
+# ロールアップキューブ（ダッシュボードのセクションではなく、rollup_cube.json.gz に別に保存する）
+CUBE_SECTION = 'rollupCube'
+
+# ダッシュボードのセクション名 → アキュムレータの生成関数（出力順）
+# 新しい指標は、ここにアキュムレータを登録するだけで1パス集計に組み込まれる
+# （results の件数の指標は CubeSectionAccumulator でロールアップキューブから求められる）
+DASHBOARD_ACCUMULATORS = [
+    (CUBE_SECTION, RollupCubeAccumulator),
+    ('kpi', KPIAccumulator),
+    ('dailyActiveUsers', DailyActiveUsersAccumulator),
+    ('retention', RetentionAccumulator),
+    ('rollingActiveUsers', RollingActiveUsersAccumulator),
+    ('characterDistribution', partial(CubeSectionAccumulator, ('character',), _field_counts)),
+    ('difficultyDistribution', partial(CubeSectionAccumulator, ('difficulty',), _field_counts)),
+    ('clearRankDistribution', partial(CubeSectionAccumulator, ('clearRank',), _field_counts)),
+    ('languageDistribution', LanguageDistributionAccumulator),
+    ('cutsceneSkipRate', CutsceneSkipRateAccumulator),
+    ('funnels', FunnelAccumulator),
+    ('sessions', SessionAccumulator),
+    ('excludedDataStats', ExcludedDataStatsAccumulator),
+    ('recentPlays', RecentPlaysAccumulator),
+    ('songPlaysByDifficulty', SongPlaysByDifficultyAccumulator),
+    ('songPlayCountsByDifficulty', partial(CubeSectionAccumulator, ('gameType', 'difficulty'),
+                                           _song_play_counts_table)),
+    ('playerClearRateDistribution', PlayerClearRateAccumulator),
+    ('playClearRateDistribution', PlayClearRateAccumulator),
+    ('platformDistribution', PlatformDistributionAccumulator),
+    ('costumeDistribution', partial(CubeSectionAccumulator, ('costume',), _costume_distribution)),
+    ('platformCostumeCross', partial(CubeSectionAccumulator, ('platform', 'costume'), _platform_costume_table)),
+]
+
+
+# 最近のプレイ記録のアーカイブ（ダッシュボードのセクションではなく、シャードに分けて別に保存する）
+ARCHIVE_SECTION = 'recentPlaysArchive'
+ARCHIVE_DIR = os.path.join(SECTIONS_DIR, ARCHIVE_SECTION)
+
+
+def _columnar_accumulators():
+    """NumPy が使える場合に results 由来のセクションを置き換える列指向版アキュムレータ"""
+    builder = results_table.ResultsTableBuilder()
+    return {
+        CUBE_SECTION: ColumnarRollupCubeAccumulator(builder),
+        'kpi': ColumnarKPIAccumulator(builder),
+        'songPlaysByDifficulty': ColumnarSongPlaysByDifficultyAccumulator(builder),
+        'playerClearRateDistribution': ColumnarPlayerClearRateAccumulator(builder),
+        'playClearRateDistribution': ColumnarPlayClearRateAccumulator(builder),
+        'platformDistribution': ColumnarPlatformDistributionAccumulator(builder),
+    }
+
+
+def _sketch_accumulators(precision, builder=None):
+    """
+    ユニークユーザー数を HyperLogLog で推定するアキュムレータ（ユーザーIDのセットの代わり）
+
+    builder を渡すと列指向版を使う（他の列指向版と同じ ResultsTableBuilder を共有する）。
+    """
+    if builder is not None:
+        song_plays = ColumnarSketchSongPlaysByDifficultyAccumulator(builder, precision)
+        platforms = ColumnarSketchPlatformDistributionAccumulator(builder, precision)
+    else:
+        song_plays = SketchSongPlaysByDifficultyAccumulator(precision)
+        platforms = SketchPlatformDistributionAccumulator(precision)
+
+    return {
+        'dailyActiveUsers': SketchDailyActiveUsersAccumulator(precision),
+        'songPlaysByDifficulty': song_plays,
+        'platformDistribution': platforms,
+    }
+
+
+def build_dashboard_accumulators(columnar=None, sketch_precision=None):
+    """
+    ダッシュボード用のアキュムレータ一式を生成
+
+    columnar が None の場合、NumPy が使えれば列指向版を使う。
+    どちらの版も集計状態（get_state）の形式は同じ。
+    sketch_precision を指定すると、日別・楽曲×難易度別・Platform別のユニークユーザー数を
+    その precision の HyperLogLog で推定する（None なら従来どおりユーザーIDのセットで正確に数える）。
+    """
+    accumulators = {name: factory() for name, factory in DASHBOARD_ACCUMULATORS}
+
+    if columnar is None:
+        columnar = results_table.NUMPY_AVAILABLE
+    if columnar:
+        # 既存キーの更新なのでセクションの出力順は変わらない
+        accumulators.update(_columnar_accumulators())
+
+    if sketch_precision is not None:
+        builder = accumulators['kpi'].builder if columnar else None
+        accumulators.update(_sketch_accumulators(sketch_precision, builder))
+
+    # 件数のセクションはロールアップキューブ（列指向版なら列指向版のキューブ）から求める
+    for accumulator in accumulators.values():
+        if isinstance(accumulator, CubeSectionAccumulator):
+            accumulator.bind(accumulators[CUBE_SECTION])
+    accumulators['rollingActiveUsers'].bind(accumulators['retention'])
+
+    return accumulators
+
+
+def _run_single(users_data, accumulator):
+    """アキュムレータ1つだけで users_data を集計"""
+    return run_accumulators(users_data, {'result': accumulator})['result']
+
+
+def _run_cube_section(users_data, name):
+    """ロールアップキューブから求めるセクションを1つだけ集計"""
+    section = dict(DASHBOARD_ACCUMULATORS)[name]()
+    section.bind(RollupCubeAccumulator())
+    return _run_single(users_data, section)
+
+
+def calculate_recent_plays_archive(users_data):
+    """
+    recentPlays より古いプレイ（古い順の plays）と recentPlays の最も古いプレイ（boundary）を集計
+    （全プレイを保持するため、増分集計の状態には含めない）
+    """
+    return _run_single(users_data, RecentPlaysArchiveAccumulator())
+
+
+def calculate_rollup_cube(users_data):
+    """ロールアップキューブ（RollupCube.to_dict の値）を集計"""
+    return _run_single(users_data, RollupCubeAccumulator())
+
+
+def calculate_excluded_data_stats(users_data):
+    """除外データ（異常年、未来日付）の統計を計算"""
+    return _run_single(users_data, ExcludedDataStatsAccumulator())
+
+
+def calculate_kpi(users_data):
+    """KPI（総ユーザー数、総起動回数、総プレイ回数、平均スコア）を計算"""
+    return _run_single(users_data, KPIAccumulator())
+
+
+def calculate_daily_active_users(users_data):
+    """日別アクティブユーザー数を計算"""
+    return _run_single(users_data, DailyActiveUsersAccumulator())
+
+
+def calculate_retention(users_data):
+    """D1/D7/D30 リテンションと週別コホートを計算"""
+    return _run_single(users_data, RetentionAccumulator())
+
+
+def calculate_rolling_active_users(users_data):
+    """直近7日・28日・30日間のアクティブユーザー数と stickiness を計算"""
+    section = RollingActiveUsersAccumulator()
+    section.bind(RetentionAccumulator())
+    return _run_single(users_data, section)
+
+
+def calculate_character_distribution(users_data):
+    """キャラクター別プレイ回数を集計"""
+    return _run_cube_section(users_data, 'characterDistribution')
+
+
+def calculate_difficulty_distribution(users_data):
+    """難易度別プレイ回数を集計"""
+    return _run_cube_section(users_data, 'difficultyDistribution')
+
+
+def calculate_clear_rank_distribution(users_data):
+    """クリアランク分布を集計"""
+    return _run_cube_section(users_data, 'clearRankDistribution')
+
+
+def calculate_language_distribution(users_data):
+    """言語分布を集計（最新の設定言語を使用）"""
+    return _run_single(users_data, LanguageDistributionAccumulator())
+
+
+def calculate_cutscene_skip_rate(users_data):
+    """カットシーンスキップ率を計算（セッションベース）"""
+    return _run_single(users_data, CutsceneSkipRateAccumulator())
+
+
+def calculate_funnels(users_data):
+    """イベントのファネルを集計"""
+    return _run_single(users_data, FunnelAccumulator())
+
+
+def calculate_sessions(users_data):
+    """プレイセッションの指標を集計"""
+    return _run_single(users_data, SessionAccumulator())
+
+
+def get_recent_plays(users_data, limit=500):
+    """最近のプレイ記録を取得（最大500件）"""
+    return _run_single(users_data, RecentPlaysAccumulator(limit))
+
+
+def calculate_song_plays_by_difficulty(users_data):
+    """楽曲別・難易度別のユニークプレイヤー数を集計"""
+    return _run_single(users_data, SongPlaysByDifficultyAccumulator())
+
+
+def calculate_song_play_counts_by_difficulty(users_data):
+    """楽曲別・難易度別のプレイ累計回数を集計"""
+    return _run_cube_section(users_data, 'songPlayCountsByDifficulty')
+
+
+def calculate_player_clear_rate_distribution(users_data):
+    """プレイヤー別クリアレート分布を計算（clearTypeベース）"""
+    return _run_single(users_data, PlayerClearRateAccumulator())
+
+
+def calculate_play_clear_rate_distribution(users_data):
+    """プレイ別クリアレート分布を計算（clearRateフィールドベース）"""
+    return _run_single(users_data, PlayClearRateAccumulator())
+
+
+def calculate_platform_distribution(users_data):
+    """Platform別の統計を計算"""
+    return _run_single(users_data, PlatformDistributionAccumulator())
+
+
+def calculate_costume_distribution(users_data):
+    """Costume別の統計を計算"""
+    return _run_cube_section(users_data, 'costumeDistribution')
+
+
+def calculate_platform_costume_cross(users_data):
+    """Platform × Costume のクロス集計"""
+    return _run_cube_section(users_data, 'platformCostumeCross')
+
+
+def load_aggregator_state(state_path, sketch_precision=None):
+    """増分集計の状態を読み込み（無い・形式が合わない場合は None）"""
+    if not os.path.exists(state_path):
+        print(f"⚠️  {state_path} not found (full aggregation)")
+        return None
+
+    with gzip.open(state_path, 'rt', encoding='utf-8') as f:
+        state = json.load(f)
+
+    section_names = [name for name, _ in DASHBOARD_ACCUMULATORS]
+    if (state.get('version') != STATE_VERSION
+            or state.get('validYear') != VALID_YEAR
+            or list(state.get('sections', {})) != section_names
+            or state.get('sketchPrecision') != sketch_precision):
+        print(f"⚠️  {state_path} is incompatible with this aggregator (full aggregation)")
+        return None
+
+    print(f"✅ Loaded aggregator state from {state_path}")
+    return state
+
+
+_compact_json = partial(json.dumps, ensure_ascii=False, separators=(',', ':'))
+
+
+def _write_json_object(mapping, f, expand=()):
+    """
+    辞書を JSON で f に書く（値ごとに json.dumps し、expand のキーの値は同じように要素ごとに書く）
+
+    json.dump はファイルへ書く場合に C のエンコーダを使わず遅く、
+    全体を1つの文字列にするとメモリを使いすぎるため、値ごとに文字列にして書く。
+    """
+    f.write('{')
+    for position, (key, value) in enumerate(mapping.items()):
+        f.write(f"{',' if position else ''}{_compact_json(key)}:")
+        if key in expand:
+            _write_json_object(value, f)
+        else:
+            f.write(_compact_json(value))
+    f.write('}')
+
+
+def save_aggregator_state(state, state_path):
+    """増分集計の状態を保存（書き込み途中のファイルが残らないよう一時ファイル経由）"""
+    os.makedirs(os.path.dirname(state_path), exist_ok=True)
+
+    # ロールアップキューブのコードの列は最大圧縮だと時間ばかりかかるため compresslevel=6
+    temp_path = f"{state_path}.tmp"
+    with gzip.open(temp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+        _write_json_object(state, f, expand=('sections',))
+    os.replace(temp_path, state_path)
+
+    print(f"✅ Aggregator state saved to {state_path}")
+
+
+def _run_with_state(users_data, state, workers=1, sketch_precision=None, archive_update=None):
+    """
+    state（None なら空の状態）から集計を続け、(セクションの結果, 次回用の状態) を返す
+
+    状態は未来日付のキーを集計する前の時点で取り出す。
+    全件の集計（state が None）で workers が2以上ならプロセスプールで並列に集計する。
+    state から続ける場合、archive_update（辞書）に recentPlays から外れたプレイと前後の境界を書き込む。
+    """
+    build_accumulators = partial(build_dashboard_accumulators, sketch_precision=sketch_precision)
+    accumulators = build_accumulators()
+    watermarks = {}
+    recent_plays = accumulators['recentPlays']
+    if state is not None:
+        set_states(accumulators, state['sections'])
+        watermarks = state['watermarks']
+        previous_boundary = recent_plays.boundary()
+        recent_plays.track_evictions()
+
+    next_state = {}
+
+    def checkpoint():
+        next_state.update({
+            'version': STATE_VERSION,
+            'validYear': VALID_YEAR,
+            'sketchPrecision': sketch_precision,
+            'sections': get_states(accumulators),
+            'watermarks': watermarks,
+        })
+
+    if state is None and workers > 1:
+        sections = run_accumulators_parallel(
+            users_data, accumulators, build_accumulators, workers,
+            watermarks=watermarks, on_checkpoint=checkpoint
+        )
+    else:
+        sections = run_accumulators(users_data, accumulators, watermarks=watermarks, on_checkpoint=checkpoint)
+
+    if state is not None and archive_update is not None:
+        archive_update.update({
+            'previousBoundary': previous_boundary,
+            'boundary': recent_plays.boundary(),
+            'plays': recent_plays.evicted_plays(),
+        })
+    return sections, next_state
+
+
+def aggregate_sections(users_data, state_path=None, full=False, workers=1, sketch_precision=None,
+                       archive_update=None):
+    """
+    ダッシュボードの各セクションを集計
+
+    users_data は辞書または RawDataReader（全件の再集計に切り替える場合は先頭から読み直す）。
+    state_path を指定すると、前回の集計状態を読み込んで追加されたキーだけを集計し、
+    新しい状態を保存する（full=True なら状態を使わずに全件を再集計）。
+    workers が2以上なら全件の集計をユーザー単位のシャードに分けて並列に行う
+    （増分集計は追加分だけなので1プロセスで行う）。
+    sketch_precision を指定するとユニークユーザー数を HyperLogLog で推定する（build_dashboard_accumulators 参照）。
+    archive_update に辞書を渡すと、増分集計した場合だけ recentPlays から外れたプレイ（古い順の plays）と
+    集計前後の recentPlays の境界（previousBoundary / boundary）を書き込む（全件を再集計した場合は空のまま）。
+    """
+    build_accumulators = partial(build_dashboard_accumulators, sketch_precision=sketch_precision)
+    if state_path is None:
+        if workers > 1:
+            return run_accumulators_parallel(users_data, build_accumulators(), build_accumulators, workers)
+        return run_accumulators(users_data, build_accumulators())
+
+    state = None if full else load_aggregator_state(state_path, sketch_precision)
+    if state is not None:
+        try:
+            sections, next_state = _run_with_state(users_data, state, sketch_precision=sketch_precision,
+                                                   archive_update=archive_update)
+            print(f"✅ Incremental aggregation ({len(next_state['watermarks'])} users)")
+        except RebuildRequired as e:
+            print(f"⚠️  Incremental aggregation not possible ({e}), rebuilding from scratch")
+            state = None
+
+    if state is None:
+        sections, next_state = _run_with_state(users_data, None, workers, sketch_precision)
+        mode = f"{workers} workers" if workers > 1 else "1 process"
+        print(f"✅ Full aggregation ({len(next_state['watermarks'])} users, {mode})")
+
+    save_aggregator_state(next_state, state_path)
+    return sections
+
+
+def aggregate_dashboard_data(users_data, ga4_data=None, state_path=None, full=False, workers=1,
+                             sketch_precision=None, archive_update=None):
+    """全ての集計を実行してダッシュボード用データを生成（archive_update は aggregate_sections と同じ）"""
     print("=" * 60)
     print("Aggregating dashboard data...")
     print("=" * 60)
 
-    dashboard_data = {
-        'lastUpdated': datetime.now().isoformat(),
-        'kpi': calculate_kpi(users_data),
-        'dailyActiveUsers': calculate_daily_active_users(users_data),
-        'characterDistribution': calculate_character_distribution(users_data),
-        'difficultyDistribution': calculate_difficulty_distribution(users_data),
-        'clearRankDistribution': calculate_clear_rank_distribution(users_data),
-        'languageDistribution': calculate_language_distribution(users_data),
-        'cutsceneSkipRate': calculate_cutscene_skip_rate(users_data),
-        'excludedDataStats': calculate_excluded_data_stats(users_data),
-        'recentPlays': get_recent_plays(users_data),
-        'songPlaysByDifficulty': calculate_song_plays_by_difficulty(users_data),
-        'songPlayCountsByDifficulty': calculate_song_play_counts_by_difficulty(users_data),
-        'playerClearRateDistribution': calculate_player_clear_rate_distribution(users_data),
-        'playClearRateDistribution': calculate_play_clear_rate_distribution(users_data),
-        'platformDistribution': calculate_platform_distribution(users_data),
-        'costumeDistribution': calculate_costume_distribution(users_data),
-        'platformCostumeCross': calculate_platform_costume_cross(users_data)
-    }
+    dashboard_data = {'lastUpdated': datetime.now().isoformat()}
+    dashboard_data.update(aggregate_sections(users_data, state_path, full, workers, sketch_precision, archive_update))
 
     # GA4データを統合
     if ga4_data:
@@ -672,58 +1606,164 @@ def aggregate_dashboard_data(users_data, ga4_data=None):
             'dailyMetricsPeriod': len(daily_metrics)  # データの日数を追加
         }
 
-    print("✅ KPI calculated")
-    print("✅ Daily active users calculated")
-    print("✅ Character distribution calculated")
-    print("✅ Difficulty distribution calculated")
-    print("✅ Clear rank distribution calculated")
-    print("✅ Language distribution calculated")
-    print("✅ Cutscene skip rate calculated")
-    print("✅ Excluded data stats calculated")
-    print("✅ Recent plays extracted")
-    print("✅ Song plays by difficulty calculated")
-    print("✅ Song play counts by difficulty calculated")
-    print("✅ Player clear rate distribution calculated")
-    print("✅ Play clear rate distribution calculated")
-    print("✅ Platform distribution calculated")
-    print("✅ Costume distribution calculated")
-    print("✅ Platform × Costume cross calculated")
-    if ga4_data:
-        print("✅ GA4 data integrated")
+    section_names = [name for name in dashboard_data if name != 'lastUpdated']
+    print(f"✅ {len(section_names)} sections aggregated: {', '.join(section_names)}")
 
     return dashboard_data
 
 
-def save_dashboard_data(data, output_path='public/data/dashboard.json'):
-    """ダッシュボード用データをJSONファイルに保存"""
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+def save_dashboard_data(data, output_dir=SECTIONS_DIR):
+    """ダッシュボード用データをセクションごとのJSONファイルとマニフェストに保存（変更のないセクションは書かない）"""
+    written, unchanged = write_sections(data, output_dir)
+
+    print(f"✅ Dashboard data saved to {output_dir} ({len(written)} sections written, {len(unchanged)} unchanged)")
+    return written
+
+
+def save_recent_plays_archive(archive, output_dir=ARCHIVE_DIR):
+    """
+    recentPlays より古いプレイ（calculate_recent_plays_archive の結果）を古い順の固定サイズのシャードに分けて保存
+    （変更のないシャードは書かない）
+    """
+    written, unchanged = write_archive_shards(archive['plays'], output_dir, archive['boundary'])
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    print(f"✅ Recent plays archive saved to {output_dir} "
+          f"({len(archive['plays'])} plays, {len(written)} shards written, {len(unchanged)} unchanged)")
+    return written
 
-    print(f"✅ Dashboard data saved to {output_path}")
+
+def append_recent_plays_archive(archive_update, output_dir=ARCHIVE_DIR):
+    """
+    増分集計で recentPlays から外れたプレイ（aggregate_sections の archive_update）をアーカイブに追記
+
+    アーカイブが前回の recentPlays に続くものでなければ None を返す（全プレイから作り直す）。
+    """
+    plays = archive_update['plays']
+    shards = append_archive_shards(plays, output_dir, archive_update['previousBoundary'], archive_update['boundary'])
+    if shards is None:
+        print(f"⚠️  {output_dir} does not continue the previous recentPlays (rebuilding the archive)")
+        return None
+
+    written, unchanged = shards
+    print(f"✅ Recent plays archive appended to {output_dir} "
+          f"({len(plays)} plays, {len(written)} shards written, {len(unchanged)} unchanged)")
+    return written
+
+
+def pipeline_meta(report, report_path=PIPELINE_REPORT_PATH):
+    """
+    meta セクション: 実行レポートのコレクターの最後の実行と、この集計のここまでのステージの要約
+
+    meta 自体を書き出すステージ（write_sections 以降）は含まれない（実行レポートには含まれる）。
+    """
+    previous = load_pipeline_report(report_path)
+    runs = dict(previous['runs']) if previous else {}
+    runs[report.script] = report.to_dict()
+    return {'pipeline': pipeline_summary(runs)}
+
+
+def aggregate_and_save(users_data, ga4_data, report, state_path=None, full=False, workers=1, archive=False,
+                       sketch_precision=None, report_path=PIPELINE_REPORT_PATH, cube_path=ROLLUP_CUBE_PATH):
+    """
+    集計してセクションファイル（archive=True ならアーカイブのシャードも）とロールアップキューブを保存し、
+    書き直したセクション名を返す
+
+    archive 以外の引数は aggregate_dashboard_data と同じ。各ステージは report（pipeline_report.RunReport）に記録する。
+    アーカイブは全プレイを保持するため増分集計の状態には含めない。増分集計できた場合は recentPlays から外れたプレイを
+    末尾に追記し、全件を再集計した場合（またはアーカイブが前回の recentPlays に続かない場合）は
+    生データをもう1回走査して作り直す。これにより recentPlays とアーカイブの間にプレイの抜けが生じない。
+    """
+    archive_update = {}
+    with report.stage('aggregate') as stage:
+        dashboard_data = aggregate_dashboard_data(
+            users_data, ga4_data, state_path=state_path, full=full, workers=workers,
+            sketch_precision=sketch_precision, archive_update=archive_update
+        )
+        stage.records = dashboard_data['kpi']['totalUsers']
+    cube_data = dashboard_data.pop(CUBE_SECTION)
+    dashboard_data['meta'] = pipeline_meta(report, report_path)
+
+    with report.stage('write_sections') as stage:
+        written = save_dashboard_data(dashboard_data)
+        stage.records = len(written)
+    appended = None
+    if archive and archive_update:
+        with report.stage('append_archive') as stage:
+            appended = append_recent_plays_archive(archive_update)
+            stage.records = len(archive_update['plays'])
+    if archive and appended is None:
+        with report.stage('aggregate_archive') as stage:
+            archive_data = calculate_recent_plays_archive(users_data)
+            stage.records = len(archive_data['plays'])
+        with report.stage('write_archive') as stage:
+            save_recent_plays_archive(archive_data)
+            stage.records = len(archive_data['plays'])
+        del archive_data
+    with report.stage('write_cube') as stage:
+        save_rollup_cube(cube_data, cube_path)
+        stage.records = len(cube_data['totals'][0])
+
+    return written
+
+
+def add_aggregation_arguments(parser):
+    """集計のコマンドライン引数（--full 以外）を追加（pipeline.py と共通）"""
+    parser.add_argument('--state', default='public/data/aggregator_state.json.gz',
+                        help='path of the incremental aggregator state')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes for a full aggregation (0 = number of CPUs)')
+    parser.add_argument('--recent-plays-archive', action='store_true',
+                        help='also write plays older than recentPlays as paginated archive shards '
+                             '(plays leaving recentPlays are appended after an incremental aggregation; '
+                             'a full aggregation rebuilds the archive from the raw data in a separate pass)')
+    parser.add_argument('--unique-users', choices=('exact', 'sketch'), default='exact',
+                        help='count unique users per day, song x difficulty and platform exactly '
+                             'or estimate them with HyperLogLog sketches')
+    parser.add_argument('--sketch-error', type=float, default=DEFAULT_SKETCH_ERROR,
+                        help='relative standard error of the HyperLogLog sketches (--unique-users sketch)')
+
+
+def aggregation_options(args):
+    """add_aggregation_arguments の引数から (workers, sketch_precision)"""
+    workers = args.workers or os.cpu_count() or 1
+    sketch_precision = precision_for_error(args.sketch_error) if args.unique_users == 'sketch' else None
+    return workers, sketch_precision
 
 
 def main():
     """メイン処理"""
+    parser = argparse.ArgumentParser(description='Aggregate raw Firebase data into dashboard section files')
+    parser.add_argument('--full', action='store_true',
+                        help='ignore the saved aggregator state and rebuild everything')
+    add_aggregation_arguments(parser)
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    report = report_from_args('data_aggregator', args)
+    workers, sketch_precision = aggregation_options(args)
+
     print("=" * 60)
     print("Data Aggregator")
     print(f"Started at: {datetime.now().isoformat()}")
     print("=" * 60)
 
-    # 生データ読み込み
-    users_data = load_raw_data()
+    # 生データ読み込み（集計中に1ユーザーずつ読む）
+    with report.stage('open_raw_data'):
+        users_data = open_raw_data()
     if not users_data:
         return
 
     # GA4データ読み込み（オプション）
-    ga4_data = load_ga4_data()
+    with report.stage('load_ga4'):
+        ga4_data = load_ga4_data()
 
-    # データ集計
-    dashboard_data = aggregate_dashboard_data(users_data, ga4_data)
+    # データ集計・保存
+    aggregate_and_save(
+        users_data, ga4_data, report, state_path=args.state, full=args.full, workers=workers,
+        archive=args.recent_plays_archive, sketch_precision=sketch_precision, report_path=args.report
+    )
 
-    # 保存
-    save_dashboard_data(dashboard_data)
+    report.print_summary()
+    report.save(args.report)
 
     print("=" * 60)
     print("✅ Aggregation completed successfully")
@@ -2,18 +2,73 @@
 """
 Firebase Realtime Database Data Collector
 Firebaseからゲームデータを取得してJSONファイルに保存
+
+取得したデータは raw snapshot 形式（raw_data.snap、raw_snapshot.py を参照）で保存する。
+前回のスナップショットがある場合は差分同期（変更のあったユーザーの新しいキーだけを取得してマージ）を行う。
+差分同期はユーザーごとの問い合わせをスレッドプールで並列に実行し、timeStamp に新しいキーがあるユーザーを
+変更ありとみなす（イベントを伴わない results などの書き込みは毎日の全件取得で反映される）。
+
+全件取得では users/ を一度に取得せず、ユーザーIDの一覧を shallow で取得してキー範囲のチャンクに分け、
+チャンクごとに order_by_key().start_at().end_at() の問い合わせ1回でスレッドプールから並列に取得する
+（リクエストごとに指数バックオフで再試行）。チャンクはキー順に届いた分から raw_data.snap に書き出す。
+範囲の問い合わせでは子ノードを選べないため、各ユーザーの全ての子ノード（集計で使わない systemLanguage や
+古い option も含む）をダウンロードし、そのまま保存する（raw_data.snap はバックアップにも使うため削らない）。
 """
 
+import argparse
 import json
 import os
+import random
 import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, db
+
+try:
+    import firebase_admin
+    from firebase_admin import credentials, db
+    from firebase_admin.exceptions import FirebaseError
+except ImportError:  # FIREBASE_LOCAL_DB を使う場合は firebase_admin 無しでも動かせる
+    firebase_admin = None
+    FirebaseError = None
+
+from local_rtdb import LocalDatabase, key_order
+from pipeline_report import add_report_arguments, report_from_args
+from raw_snapshot import is_snapshot, load_snapshot, write_snapshot
+
+RAW_DATA_PATH = 'public/data/raw_data.snap'
+# 以前の形式（初回の差分同期では、スナップショットが無ければこちらを読む）
+LEGACY_RAW_DATA_PATH = 'public/data/raw_data.json'
+CHANGE_LOG_PATH = 'public/data/sync_changes.json'
+
+# これ以上のキーは仏暦（2568-... など）
+# '2500' だけだと整数のキーとして全ての文字列キーより前に並ぶため、'-' を付けて文字列として比較させる
+BUDDHIST_ERA_KEY_START = '2500-'
+
+# 差分同期で変更を検出する子ノード（これ以外の子ノードだけが書き込まれたユーザーは次の全件取得まで反映されない）
+CHANGE_DETECTION_FIELD = 'timeStamp'
+
+# ゲームが users/{ユーザーID} に書き込む子ノード
+USER_FIELDS = ('launch_count', 'option', 'results', 'systemLanguage', 'timeStamp')
+
+# 全件取得の並列数・1チャンクのユーザー数
+FETCH_WORKERS = 8
+FETCH_CHUNK_SIZE = 200
+# 失敗したリクエストの再試行回数と最初の待ち時間（秒、再試行のたびに倍にする）
+FETCH_RETRIES = 4
+RETRY_BACKOFF = 0.5
+
+# 再試行するエラー（接続の失敗・タイムアウトと Firebase のエラー）
+RETRYABLE_ERRORS = (OSError,) if FirebaseError is None else (OSError, FirebaseError)
 
 
 def initialize_firebase():
     """Firebase Admin SDKを初期化"""
+    if firebase_admin is None:
+        print("Error: firebase-admin is not installed")
+        sys.exit(1)
+
     # 環境変数からサービスアカウント情報を取得
     service_account_json = os.environ.get('FIREBASE_SERVICE_ACCOUNT')
     database_url = os.environ.get('FIREBASE_DATABASE_URL')
@@ -38,46 +93,404 @@ def initialize_firebase():
     print(f"✅ Firebase initialized: {database_url}")
 
 
-def fetch_all_users_data():
-    """users/配下の全データを取得"""
-    ref = db.reference('users')
-    data = ref.get()
+def get_users_reference():
+    """users/ の参照を返す（FIREBASE_LOCAL_DB が設定されていればローカルのJSONファイル）"""
+    local_db_path = os.environ.get('FIREBASE_LOCAL_DB')
+    if local_db_path:
+        print(f"✅ Using local database: {local_db_path}")
+        return LocalDatabase(local_db_path).reference('users')
+
+    initialize_firebase()
+    return db.reference('users')
+
+
+def get_with_retry(fetch, description, retries=FETCH_RETRIES, backoff=RETRY_BACKOFF):
+    """
+    fetch() を呼び、RETRYABLE_ERRORS なら指数バックオフ（ジッター付き）で retries 回まで再試行する
+
+    description は再試行時のログに出す取得対象の説明。
+    """
+    for attempt in range(retries + 1):
+        try:
+            return fetch()
+        except RETRYABLE_ERRORS as e:
+            if attempt == retries:
+                raise
+            delay = backoff * (2 ** attempt) * (0.5 + random.random())
+            print(f"⚠️  Failed to fetch {description} ({e}), retrying in {delay:.1f}s "
+                  f"({attempt + 1}/{retries})")
+            time.sleep(delay)
+
+
+def fetch_users_chunk(users_ref, key_range):
+    """
+    キー範囲 (最初のユーザーID, 最後のユーザーID) のユーザーを1回の問い合わせで取得して
+    [(user_id, user_data), ...] を返す（各ユーザーの子ノードは全て含む）
+    """
+    first_id, last_id = key_range
+    query = users_ref.order_by_key().start_at(first_id).end_at(last_id)
+    users = get_with_retry(query.get, f"users {first_id}..{last_id}") or {}
+    return [(user_id, users[user_id]) for user_id in sorted(users, key=key_order)]
+
+
+def split_key_ranges(user_ids, chunk_size):
+    """キー順のユーザーIDを chunk_size 人ずつのキー範囲 [(最初のユーザーID, 最後のユーザーID), ...] に分ける"""
+    return [
+        (user_ids[start], user_ids[min(start + chunk_size, len(user_ids)) - 1])
+        for start in range(0, len(user_ids), chunk_size)
+    ]
+
+
+def _iter_fetched_chunks(executor, users_ref, chunks, window):
+    """
+    チャンクを並列に取得し、チャンクの順に取得結果を返す
 
-    if not data:
+    先行して取得するチャンクは window 個までにする（先に届いたチャンクはその順番が来るまで保持する）。
+    """
+    pending = deque()
+    remaining = iter(chunks)
+    for chunk in remaining:
+        pending.append(executor.submit(fetch_users_chunk, users_ref, chunk))
+        if len(pending) >= window:
+            break
+
+    while pending:
+        users = pending.popleft().result()
+        chunk = next(remaining, None)
+        if chunk is not None:
+            pending.append(executor.submit(fetch_users_chunk, users_ref, chunk))
+        yield users
+
+
+def fetch_all_users_data(users_ref=None, output_path=None, workers=FETCH_WORKERS, chunk_size=FETCH_CHUNK_SIZE):
+    """
+    users/配下の全データを取得
+
+    ユーザーIDの一覧を shallow で取得してキー範囲に分け、workers 並列でチャンクごとに取得する。
+    output_path を指定すると、チャンクをキー順に受け取った分から raw snapshot として書き出す。
+    """
+    ref = users_ref or db.reference('users')
+    user_ids = get_with_retry(lambda: ref.get(shallow=True), 'user list') or {}
+
+    if not user_ids:
         print("⚠️  No data found in 'users' node")
         return {}
 
-    user_count = len(data)
-    print(f"✅ Fetched {user_count} users")
+    chunks = split_key_ranges(sorted(user_ids, key=key_order), chunk_size)
+    print(f"✅ Listed {len(user_ids)} users ({len(chunks)} chunks, {workers} workers)")
+
+    data = {}
+    started = time.perf_counter()
+
+    def fetched_users():
+        for index, users in enumerate(_iter_fetched_chunks(executor, ref, chunks, workers * 2), 1):
+            data.update(users)
+            if index % 50 == 0 or index == len(chunks):
+                print(f"   {index}/{len(chunks)} chunks ({len(data)} users, "
+                      f"{time.perf_counter() - started:.1f}s)")
+            yield from users
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        if output_path:
+            write_snapshot(fetched_users(), output_path)
+            print(f"✅ Raw data saved to {output_path}")
+        else:
+            for _ in fetched_users():
+                pass
+
+    print(f"✅ Fetched {len(data)} users")
 
     return data
 
 
-def save_raw_data(data, output_path='public/data/raw_data.json'):
-    """取得した生データをJSONファイルに保存"""
+def fetch_new_entries(ref, existing):
+    """
+    タイムスタンプ形式のキーを持つ子ノードから、existing に無い新しいエントリだけを取得
+
+    既存の最大キー以降を order_by_key().start_at() で問い合わせる（start_at は最大キー自身も含む）。
+    仏暦のキー（2568-...）は西暦のキーより後ろに並ぶため、仏暦のキーを持つ場合は西暦の範囲を end_at で区切って別に問い合わせる。
+    existing が空なら全件を取得する。
+    """
+    if not isinstance(existing, dict) or not existing:
+        fetched = get_with_retry(ref.get, ref.path)
+        return fetched if isinstance(fetched, dict) else {}
+
+    christian_keys = [key for key in existing if key < BUDDHIST_ERA_KEY_START]
+    buddhist_keys = [key for key in existing if key >= BUDDHIST_ERA_KEY_START]
+
+    if not buddhist_keys:
+        queries = [ref.order_by_key().start_at(max(christian_keys, key=key_order))]
+    else:
+        # 仏暦のキーを持つユーザーは西暦のキーが書き込まれることもあるため、西暦の範囲も常に問い合わせる
+        christian_query = ref.order_by_key()
+        if christian_keys:
+            christian_query = christian_query.start_at(max(christian_keys, key=key_order))
+        queries = [
+            christian_query.end_at(BUDDHIST_ERA_KEY_START),
+            ref.order_by_key().start_at(max(buddhist_keys, key=key_order)),
+        ]
+
+    new_entries = {}
+    for query in queries:
+        fetched = get_with_retry(query.get, ref.path)
+        if isinstance(fetched, dict):
+            new_entries.update((key, value) for key, value in fetched.items() if key not in existing)
+    return new_entries
+
+
+def sync_user(user_ref, user_data):
+    """
+    既知のユーザー1人を差分同期し、user_data をその場で更新する
+
+    timeStamp に新しいイベントが無いユーザーは変更なしとみなして None を返す
+    （ゲームはプレイや設定変更のたびに timeStamp にイベントを書き込むため）。
+    変更があった場合は {子ノード名: [追加されたキー], 'fields': [更新された値の名前]} を返す。
+    """
+    new_events = fetch_new_entries(user_ref.child(CHANGE_DETECTION_FIELD), user_data.get(CHANGE_DETECTION_FIELD))
+    if not new_events:
+        return None
+
+    changes = {}
+    # shallow 取得では子ノード（辞書）は True、それ以外は値そのものが返る
+    children = get_with_retry(lambda: user_ref.get(shallow=True), user_ref.path) or {}
+
+    for name in [name for name in user_data if name not in children]:
+        del user_data[name]
+        changes.setdefault('fields', []).append(name)
+
+    for name, value in children.items():
+        if value is not True:
+            if user_data.get(name) != value:
+                user_data[name] = value
+                changes.setdefault('fields', []).append(name)
+            continue
+
+        if name == CHANGE_DETECTION_FIELD:
+            new_entries = new_events
+        else:
+            new_entries = fetch_new_entries(user_ref.child(name), user_data.get(name))
+
+        existing = user_data.get(name)
+        if not isinstance(existing, dict):
+            existing = user_data[name] = {}
+        if not new_entries:
+            continue
+
+        # 既存の最大キーより前に並ぶキー（仏暦のキーを持つユーザーの西暦のキーなど）が
+        # 追加された場合は全件取得と同じキー順に並べ直す
+        last_key = max(existing, key=key_order) if existing else None
+        existing.update(new_entries)
+        if last_key is not None and any(key_order(key) < key_order(last_key) for key in new_entries):
+            user_data[name] = {key: existing[key] for key in sorted(existing, key=key_order)}
+        changes[name] = list(new_entries)
+
+    return changes
+
+
+def _sync_one_user(user_ref, user_data):
+    """
+    ユーザー1人を差分同期する（スレッドプールから呼ぶ）
+
+    新規ユーザー（user_data が None）は全体を取得して ('added', ユーザーのデータ) を、
+    既知のユーザーは ('updated', sync_user の変更内容) を返す。
+    """
+    if user_data is None:
+        fetched = get_with_retry(user_ref.get, user_ref.path)
+        return 'added', fetched
+    return 'updated', sync_user(user_ref, user_data)
+
+
+def sync_users_data(users_ref, snapshot, workers=FETCH_WORKERS):
+    """
+    snapshot（前回の users/ の内容）を差分同期して (users_data, 変更内容) を返す
+
+    ユーザーIDの一覧だけを shallow で取得し、新規ユーザーは全件、
+    既知のユーザーは新しいキーだけを取得してマージする。削除されたユーザーは snapshot からも削除する。
+    ユーザーごとの問い合わせは workers 並列で実行する（既知のユーザーの辞書はそれぞれのスレッドが更新する）。
+    """
+    user_ids = get_with_retry(lambda: users_ref.get(shallow=True), 'user list') or {}
+    user_ids = sorted(user_ids, key=key_order)
+    changes = {'addedUsers': [], 'removedUsers': [], 'updatedUsers': {}}
+
+    listed = set(user_ids)
+    for user_id in [user_id for user_id in snapshot if user_id not in listed]:
+        del snapshot[user_id]
+        changes['removedUsers'].append(user_id)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # map は全てのユーザーを先に投入するため、snapshot.get はスレッドが動く前に評価される
+        results = executor.map(
+            _sync_one_user,
+            [users_ref.child(user_id) for user_id in user_ids],
+            [snapshot.get(user_id) for user_id in user_ids],
+        )
+        for user_id, (kind, result) in zip(user_ids, results):
+            if kind == 'added':
+                if result is not None:
+                    snapshot[user_id] = result
+                    changes['addedUsers'].append(user_id)
+            elif result:
+                changes['updatedUsers'][user_id] = result
+
+    # 新規ユーザーを追加した場合は全件取得と同じキー順に並べ直す
+    if changes['addedUsers']:
+        snapshot = {user_id: snapshot[user_id] for user_id in sorted(snapshot, key=key_order)}
+
+    print(f"✅ Synced {len(snapshot)} users "
+          f"(added: {len(changes['addedUsers'])}, updated: {len(changes['updatedUsers'])}, "
+          f"removed: {len(changes['removedUsers'])})")
+
+    return snapshot, changes
+
+
+def diff_users_data(previous, current):
+    """全件取得した場合の変更内容を前回のデータとの比較で求める（sync_users_data と同じ形式）"""
+    changes = {
+        'addedUsers': [user_id for user_id in current if user_id not in previous],
+        'removedUsers': [user_id for user_id in previous if user_id not in current],
+        'updatedUsers': {},
+    }
+
+    for user_id, user_data in current.items():
+        old_data = previous.get(user_id)
+        if old_data is None:
+            continue
+
+        user_changes = {}
+        for name, value in user_data.items():
+            old_value = old_data.get(name)
+            if isinstance(value, dict):
+                old_keys = old_value if isinstance(old_value, dict) else {}
+                added = [key for key in value if key not in old_keys]
+                if added:
+                    user_changes[name] = added
+            elif value != old_value:
+                user_changes.setdefault('fields', []).append(name)
+        for name in old_data:
+            if name not in user_data:
+                user_changes.setdefault('fields', []).append(name)
+
+        if user_changes:
+            changes['updatedUsers'][user_id] = user_changes
+
+    return changes
+
+
+def load_previous_data(input_path=RAW_DATA_PATH, legacy_path=LEGACY_RAW_DATA_PATH):
+    """前回保存した生データを読み込む（無ければ None）"""
+    if os.path.exists(input_path) and is_snapshot(input_path):
+        return load_snapshot(input_path)
+
+    if not os.path.exists(legacy_path):
+        return None
+
+    with open(legacy_path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    return data if isinstance(data, dict) else None
+
+
+def save_raw_data(data, output_path=RAW_DATA_PATH):
+    """取得した生データを raw snapshot 形式で保存"""
+    # 書き込み途中で失敗しても前回のスナップショットが壊れないように一時ファイルから置き換えられる
+    write_snapshot(data.items(), output_path)
+
+    print(f"✅ Raw data saved to {output_path}")
+
+
+def save_change_log(changes, mode, user_count, output_path=CHANGE_LOG_PATH):
+    """
+    同期で追加・更新・削除されたユーザーとキーを保存
+
+    差分同期は CHANGE_DETECTION_FIELD に新しいキーがあるユーザーだけを取得するため、complete を False にして
+    検出できない変更（イベントを伴わない results / option / launch_count などの書き込み）を uncheckedFields に記録する。
+    """
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
+    change_log = {
+        'syncedAt': datetime.now().isoformat(),
+        'mode': mode,
+        'userCount': user_count,
+        'complete': mode == 'full',
+        **changes,
+    }
+    if mode == 'delta':
+        change_log['changeDetection'] = CHANGE_DETECTION_FIELD
+        change_log['uncheckedFields'] = [
+            name for name in USER_FIELDS if name != CHANGE_DETECTION_FIELD
+        ]
+
     with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+        json.dump(change_log, f, ensure_ascii=False, indent=2)
+
+    print(f"✅ Change log saved to {output_path}")
 
-    print(f"✅ Raw data saved to {output_path}")
+
+def collect_users_data(report, full=False, workers=FETCH_WORKERS, chunk_size=FETCH_CHUNK_SIZE):
+    """
+    users/ を取得して raw_data.snap と変更ログを保存し、(users_data, changes) を返す
+
+    前回のスナップショットがあれば差分同期する（full=True なら全体を取得）。
+    全件取得では workers 並列・chunk_size 人ずつ取得し、取得しながら raw_data.snap を書き出す。
+    差分同期もユーザーごとの問い合わせを workers 並列で実行する。
+    各ステージは report（pipeline_report.RunReport）に記録する。
+    """
+    # Firebase初期化
+    with report.stage('connect'):
+        users_ref = get_users_reference()
+
+    # 前回のスナップショット読み込み
+    with report.stage('load_previous') as stage:
+        snapshot = load_previous_data()
+        stage.records = len(snapshot) if snapshot is not None else 0
+
+    # データ取得（前回のスナップショットがあれば差分同期）
+    with report.stage('fetch') as stage:
+        if snapshot is None or full:
+            users_data = fetch_all_users_data(users_ref, RAW_DATA_PATH, workers=workers, chunk_size=chunk_size)
+            changes = diff_users_data(snapshot or {}, users_data)
+            mode = 'full'
+        else:
+            users_data, changes = sync_users_data(users_ref, snapshot, workers=workers)
+            mode = 'delta'
+        stage.records = len(users_data)
+
+    # 生データ保存（全件取得では取得しながら保存済み）
+    with report.stage('save') as stage:
+        if mode == 'delta' or not users_data:
+            save_raw_data(users_data)
+        save_change_log(changes, mode, len(users_data))
+        stage.records = len(users_data)
+
+    return users_data, changes
 
 
 def main():
     """メイン処理"""
+    parser = argparse.ArgumentParser(description='Fetch users/ from Firebase into raw_data.snap')
+    parser.add_argument('--full', action='store_true',
+                        help='ignore the previous snapshot and fetch all users')
+    parser.add_argument('--workers', type=int, default=FETCH_WORKERS,
+                        help=f'parallel requests for a full fetch or a delta sync (default: {FETCH_WORKERS})')
+    parser.add_argument('--chunk-size', type=int, default=FETCH_CHUNK_SIZE,
+                        help=f'users per chunk for a full fetch (default: {FETCH_CHUNK_SIZE})')
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    report = report_from_args('firebase_collector', args)
+
     print("=" * 60)
     print("Firebase Data Collector")
     print(f"Started at: {datetime.now().isoformat()}")
     print("=" * 60)
 
-    # Firebase初期化
-    initialize_firebase()
+    if args.workers < 1 or args.chunk_size < 1:
+        print("Error: --workers and --chunk-size must be positive")
+        sys.exit(1)
 
-    # データ取得
-    users_data = fetch_all_users_data()
+    collect_users_data(report, full=args.full, workers=args.workers, chunk_size=args.chunk_size)
 
-    # 生データ保存
-    save_raw_data(users_data)
+    report.print_summary()
+    report.save(args.report)
 
     print("=" * 60)
     print("✅ Collection completed successfully")
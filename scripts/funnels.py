@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Funnels
+timeStamp のイベント列に対するファネル（launch → 1曲目の GameEnd → カットシーン → 2曲目 など）の集計
+
+ファネルはステップの並び（ステップ名とイベント名のパターン）で宣言し、FunnelTracker が
+ユーザーごとにキー順に渡されるイベントを1回走査して、登録された全てのファネルを同時に進める。
+イベント名ごとに「どのファネルのどのステップに当たるか」を一度だけ求めてキャッシュするため、
+1イベントあたりの処理はそのイベントに関係するファネルの数だけで済む。
+
+ファネルの試行は最初のステップのイベントで始まり（途中の試行はそこで打ち切る）、
+次のステップのイベントが来るたびに1つ進む。window 秒を超えた試行は途中で終わったものとして扱う。
+"""
+
+from fnmatch import fnmatchcase
+
+from quantiles import PERCENTILES, ValueHistogram
+from timestamp_normalizer import timestamp_seconds
+
+# イベント名 → マッチ結果のキャッシュの上限（不正なイベント名が大量にあっても増え続けないようにする）
+_MATCH_CACHE_SIZE = 4096
+
+
+class Funnel:
+    """
+    ファネルの定義
+
+    steps は (ステップ名, イベント名のパターン または パターンのタプル) の列で、パターンは fnmatch 形式
+    （'GameEnd_*' など、大文字小文字を区別する）。window は最初のステップからの制限時間（秒、None なら無制限）。
+    """
+
+    def __init__(self, name, steps, window=None):
+        if len(steps) < 2:
+            raise ValueError(f"funnel {name} needs at least two steps")
+        self.name = name
+        self.step_names = [step_name for step_name, _ in steps]
+        self.patterns = [(patterns,) if isinstance(patterns, str) else tuple(patterns) for _, patterns in steps]
+        self.window = window
+
+    def matching_steps(self, event):
+        """event が当たるステップの番号（タプル）"""
+        return tuple(
+            index for index, patterns in enumerate(self.patterns)
+            if any(fnmatchcase(event, pattern) for pattern in patterns)
+        )
+
+
+class FunnelTracker:
+    """
+    複数のファネルの集計
+
+    counts[i][k] はファネル i のステップ k まで進んだ試行の数、latencies[i][k] はステップ k - 1 から k までの
+    秒数（整数に丸める）のヒストグラム。open_attempts はユーザーごとの途中の試行
+    {ユーザーID: {ファネルの番号: [次のステップ, 開始時刻, 直前のステップの時刻]}}（増分集計で引き継ぐ）。
+    """
+
+    def __init__(self, funnels):
+        self.funnels = funnels
+        self.counts = [[0] * len(funnel.step_names) for funnel in funnels]
+        self.latencies = [[ValueHistogram() for _ in funnel.step_names] for funnel in funnels]
+        self.open_attempts = {}
+        self._matches = {}
+
+    def _matching(self, event):
+        """event が当たる (ファネルの番号, ステップの番号のタプル) の列を求めてキャッシュする"""
+        if len(self._matches) >= _MATCH_CACHE_SIZE:
+            self._matches.clear()
+        matches = self._matches[event] = tuple(
+            (index, steps) for index, steps in
+            ((index, funnel.matching_steps(event)) for index, funnel in enumerate(self.funnels))
+            if steps
+        )
+        return matches
+
+    def add(self, user_id, event, timestamp_key):
+        """
+        ユーザーのイベントを全てのファネルに渡す（ユーザーごとにキー順に呼ぶ）
+
+        時刻（timestamp_key の秒）はいずれかのファネルに当たるイベントだけで求める。
+        """
+        matches = self._matches.get(event)
+        if matches is None:
+            matches = self._matching(event)
+        if not matches:
+            return
+        seconds = timestamp_seconds(timestamp_key)
+        if seconds is None:
+            return
+
+        attempts = self.open_attempts.get(user_id)
+        for index, steps in matches:
+            attempt = attempts.get(index) if attempts else None
+            if attempt is not None:
+                window = self.funnels[index].window
+                if window is not None and seconds - attempt[1] > window:
+                    del attempts[index]
+                elif attempt[0] in steps:
+                    step = attempt[0]
+                    self.counts[index][step] += 1
+                    self.latencies[index][step].add(round(seconds - attempt[2]))
+                    if step + 1 == len(self.counts[index]):
+                        del attempts[index]
+                    else:
+                        attempt[0] = step + 1
+                        attempt[2] = seconds
+                    continue
+
+            if 0 in steps:
+                # 新しい試行（途中の試行は打ち切る）
+                self.counts[index][0] += 1
+                if attempts is None:
+                    attempts = self.open_attempts[user_id] = {}
+                attempts[index] = [1, seconds, seconds]
+
+        if attempts is not None and not attempts:
+            del self.open_attempts[user_id]
+
+    def to_state(self):
+        return {
+            'counts': [list(counts) for counts in self.counts],
+            'latencies': [[histogram.to_state() for histogram in histograms] for histograms in self.latencies],
+            # JSON のキーは文字列になるため、途中の試行は [ファネルの番号, 試行] の組で持つ
+            'openAttempts': {
+                user_id: [[index, list(attempt)] for index, attempt in attempts.items()]
+                for user_id, attempts in self.open_attempts.items()
+            },
+        }
+
+    @classmethod
+    def from_state(cls, funnels, state):
+        tracker = cls(funnels)
+        tracker.counts = [list(counts) for counts in state['counts']]
+        tracker.latencies = [
+            [ValueHistogram.from_state(histogram) for histogram in histograms] for histograms in state['latencies']
+        ]
+        tracker.open_attempts = {
+            user_id: {index: list(attempt) for index, attempt in attempts}
+            for user_id, attempts in state['openAttempts'].items()
+        }
+        return tracker
+
+    def merge(self, other):
+        """別のシャードの集計を結合する（シャード間でユーザーは重複しない）"""
+        for counts, more in zip(self.counts, other.counts):
+            for step, count in enumerate(more):
+                counts[step] += count
+        for histograms, more in zip(self.latencies, other.latencies):
+            for histogram, other_histogram in zip(histograms, more):
+                histogram.merge(other_histogram)
+        self.open_attempts.update(other.open_attempts)
+
+    def summary(self, percents=PERCENTILES):
+        """
+        ファネルごとのステップの試行数・転換率・離脱率・所要時間
+
+        conversionRate は最初のステップに対する割合、dropOffRate は直前のステップから進まなかった割合（%）。
+        latency は直前のステップからの秒数のパーセンタイル（最初のステップは None）。
+        """
+        funnels = []
+        for funnel, counts, latencies in zip(self.funnels, self.counts, self.latencies):
+            steps = []
+            for step, (step_name, count) in enumerate(zip(funnel.step_names, counts)):
+                previous = counts[step - 1] if step else count
+                steps.append({
+                    'step': step_name,
+                    'count': count,
+                    'conversionRate': round(count / counts[0] * 100, 2) if counts[0] else 0,
+                    'dropOffRate': round((previous - count) / previous * 100, 2) if previous else 0,
+                    'latency': latencies[step].percentiles(percents) if step else None,
+                })
+            funnels.append({'name': funnel.name, 'window': funnel.window, 'steps': steps})
+        return funnels
@@ -2,12 +2,28 @@
 """
 Google Analytics 4 Data Collector
 GA4からガイドサイトのアクセスデータを取得してJSONファイルに保存
+
+各レポートはスレッドプールで並行して取得する。同時に実行する run_report の数は
+ReportClient で制限し、一時的なエラーは指数バックオフでリトライする。
+
+日別・言語別・ページ別・ガイドラインのレポートは日付ごとに ga4_cache.json.gz にキャッシュし、
+まだ数値が変わる直近の日（今日と前日）だけを取得して、確定した日はキャッシュから合算する。
+日をまたいで合算できない言語別・ページ別の activeUsers（期間中のユニークユーザー数）は
+キャッシュせず、date を含まない全期間のレポートから毎回取得する。
 """
 
+import argparse
+import gzip
 import json
 import os
+import random
 import sys
-from datetime import datetime, timedelta
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from google.api_core import exceptions as api_exceptions
 from google.analytics.data_v1beta import BetaAnalyticsDataClient
 from google.analytics.data_v1beta.types import (
     DateRange,
@@ -17,6 +33,29 @@ from google.analytics.data_v1beta.types import (
 )
 from google.oauth2 import service_account
 
+from pipeline_report import add_report_arguments, report_from_args
+
+GA4_CACHE_PATH = 'public/data/ga4_cache.json.gz'
+CACHE_VERSION = 2
+
+# 全期間のレポートの開始日
+ALL_TIME_START_DATE = '2024-01-01'
+
+# 1回の run_report で取得する最大行数（超える場合は offset でページング）
+REPORT_ROW_LIMIT = 100000
+
+# 同時に実行する run_report の上限（GA4 のプロパティごとの同時リクエスト数の制限より小さくする）
+DEFAULT_MAX_CONCURRENCY = 4
+
+# リトライする一時的なエラー
+RETRYABLE_ERRORS = (
+    api_exceptions.ServiceUnavailable,
+    api_exceptions.DeadlineExceeded,
+    api_exceptions.InternalServerError,
+    api_exceptions.TooManyRequests,
+    api_exceptions.ResourceExhausted,
+)
+
 
 def initialize_ga4_client():
     """GA4クライアントを初期化"""
@@ -54,6 +93,36 @@ def initialize_ga4_client():
     return client
 
 
+class ReportClient:
+    """
+    BetaAnalyticsDataClient の run_report に同時実行数の上限とリトライを付けるラッパー
+
+    client は run_report(request) を持つオブジェクト（テストでは偽のクライアントを渡せる）。
+    RETRYABLE_ERRORS は max_attempts 回まで、backoff_seconds × 2^(試行回数-1)（+ジッター）待ってリトライする。
+    """
+
+    def __init__(self, client, max_concurrency=DEFAULT_MAX_CONCURRENCY, max_attempts=4,
+                 backoff_seconds=1.0, sleep=time.sleep):
+        self._client = client
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self._sleep = sleep
+
+    def run_report(self, request):
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with self._semaphore:
+                    return self._client.run_report(request)
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_attempts:
+                    raise
+                delay = self.backoff_seconds * 2 ** (attempt - 1) * (1 + random.random() * 0.1)
+                print(f"⚠️  GA4 request failed ({type(e).__name__}), retrying in {delay:.1f}s "
+                      f"({attempt}/{self.max_attempts - 1})")
+                self._sleep(delay)
+
+
 def fetch_overall_metrics(client, property_id):
     """全体のKPI（総PV、総UU、今日のアクセス）を取得"""
     # 全期間のデータ
@@ -75,8 +144,9 @@ def fetch_overall_metrics(client, property_id):
         ],
     )
 
-    response_all_time = client.run_report(request_all_time)
-    response_today = client.run_report(request_today)
+    # 2つのレポートを並行して取得
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        response_all_time, response_today = executor.map(client.run_report, [request_all_time, request_today])
 
     # 全期間の集計
     total_page_views = 0
@@ -101,33 +171,136 @@ def fetch_overall_metrics(client, property_id):
     }
 
 
-def fetch_daily_metrics(client, property_id, days=30):
-    """過去N日間の日別アクセス数を取得"""
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        date_ranges=[DateRange(start_date=f"{days}daysAgo", end_date="today")],
-        dimensions=[Dimension(name="date")],
-        metrics=[
-            Metric(name="screenPageViews"),
-            Metric(name="activeUsers"),
-        ],
-    )
+def _fetch_rows(client, property_id, start_date, dimensions, metrics, dimension_filter=None):
+    """start_date〜今日のレポートの行を全て取得（REPORT_ROW_LIMIT 行ずつページング）"""
+    rows = []
+    while True:
+        request_args = {
+            'property': f"properties/{property_id}",
+            'date_ranges': [DateRange(start_date=start_date, end_date="today")],
+            'dimensions': [Dimension(name=name) for name in dimensions],
+            'metrics': [Metric(name=name) for name in metrics],
+            'limit': REPORT_ROW_LIMIT,
+            'offset': len(rows),
+        }
+        if dimension_filter:
+            request_args['dimension_filter'] = dimension_filter
+
+        response = client.run_report(RunReportRequest(**request_args))
+        rows.extend(response.rows)
+
+        if not response.rows or len(rows) >= response.row_count:
+            return rows
+
+
+def _format_date(date_str):
+    """YYYYMMDD形式をYYYY-MM-DD形式に変換"""
+    return f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
+
+
+def fetch_daily_rows(client, property_id, start_date):
+    """日別のアクセス数を取得 {日付: [pageViews, activeUsers]}"""
+    rows = _fetch_rows(client, property_id, start_date, ['date'], ['screenPageViews', 'activeUsers'])
+
+    daily_rows = {}
+    for row in rows:
+        date = _format_date(row.dimension_values[0].value)
+        daily_rows[date] = [int(row.metric_values[0].value), int(row.metric_values[1].value)]
+
+    return daily_rows
+
+
+def fetch_language_rows(client, property_id, start_date):
+    """日別・言語別のページビューを取得 {日付: {言語: pageViews}}"""
+    rows = _fetch_rows(client, property_id, start_date, ['date', 'language'], ['screenPageViews'])
+
+    language_rows = defaultdict(dict)
+    for row in rows:
+        date = _format_date(row.dimension_values[0].value)
+        language_rows[date][row.dimension_values[1].value] = int(row.metric_values[0].value)
+
+    return dict(language_rows)
+
+
+def fetch_page_rows(client, property_id, start_date):
+    """日別・ページ別のページビューを取得 {日付: [[pagePath, pageTitle, pageViews], ...]}"""
+    rows = _fetch_rows(client, property_id, start_date, ['date', 'pagePath', 'pageTitle'], ['screenPageViews'])
+
+    page_rows = defaultdict(list)
+    for row in rows:
+        date = _format_date(row.dimension_values[0].value)
+        page_rows[date].append([
+            row.dimension_values[1].value,
+            row.dimension_values[2].value,
+            int(row.metric_values[0].value),
+        ])
 
-    response = client.run_report(request)
+    return dict(page_rows)
 
-    daily_data = []
-    for row in response.rows:
-        date_str = row.dimension_values[0].value  # YYYYMMDD形式
-        # YYYY-MM-DD形式に変換
-        formatted_date = f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
-        page_views = int(row.metric_values[0].value)
-        active_users = int(row.metric_values[1].value)
 
-        daily_data.append({
-            'date': formatted_date,
-            'pageViews': page_views,
-            'activeUsers': active_users,
-        })
+def fetch_language_users(client, property_id):
+    """全期間の言語別のユニークユーザー数を取得 {言語: activeUsers}"""
+    rows = _fetch_rows(client, property_id, ALL_TIME_START_DATE, ['language'], ['activeUsers'])
+    return {row.dimension_values[0].value: int(row.metric_values[0].value) for row in rows}
+
+
+def fetch_page_users(client, property_id):
+    """全期間のページ別のユニークユーザー数を取得 {(pagePath, pageTitle): activeUsers}"""
+    rows = _fetch_rows(client, property_id, ALL_TIME_START_DATE, ['pagePath', 'pageTitle'], ['activeUsers'])
+    return {
+        (row.dimension_values[0].value, row.dimension_values[1].value): int(row.metric_values[0].value)
+        for row in rows
+    }
+
+
+def fetch_guideline_rows(client, property_id, start_date):
+    """ガイドラインページの日別・ページ別のページビューを取得 {日付: {pagePath: pageViews}}"""
+    dimension_filter = {
+        "filter": {
+            "field_name": "pagePath",
+            "string_filter": {
+                "match_type": "CONTAINS",
+                "value": "guideline"
+            }
+        }
+    }
+    rows = _fetch_rows(client, property_id, start_date, ['date', 'pagePath'], ['screenPageViews'],
+                       dimension_filter=dimension_filter)
+
+    guideline_rows = defaultdict(dict)
+    for row in rows:
+        date = _format_date(row.dimension_values[0].value)
+        guideline_rows[date][row.dimension_values[1].value] = int(row.metric_values[0].value)
+
+    return dict(guideline_rows)
+
+
+# キャッシュする日別レポート（名前 → 取得関数）
+CACHED_REPORTS = {
+    'daily': fetch_daily_rows,
+    'languages': fetch_language_rows,
+    'pages': fetch_page_rows,
+    'guideline': fetch_guideline_rows,
+}
+
+
+def _cutoff_date(cache, days):
+    """キャッシュの最新日（GA4上の今日）から days 日前の日付"""
+    latest = date.fromisoformat(cache['syncedThrough'])
+    return (latest - timedelta(days=days)).isoformat()
+
+
+def build_daily_metrics(cache, days=30):
+    """キャッシュから過去N日間の日別アクセス数を作る"""
+    if not cache['syncedThrough']:
+        return []
+
+    cutoff = _cutoff_date(cache, days)
+    daily_data = [
+        {'date': day, 'pageViews': page_views, 'activeUsers': active_users}
+        for day, (page_views, active_users) in cache['reports']['daily'].items()
+        if day >= cutoff
+    ]
 
     # 日付順にソート（昇順）
     daily_data.sort(key=lambda x: x['date'])
@@ -136,31 +309,21 @@ def fetch_daily_metrics(client, property_id, days=30):
     return daily_data
 
 
-def fetch_language_distribution(client, property_id):
-    """言語別アクセス分布を取得"""
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        date_ranges=[DateRange(start_date="2024-01-01", end_date="today")],
-        dimensions=[Dimension(name="language")],
-        metrics=[
-            Metric(name="screenPageViews"),
-            Metric(name="activeUsers"),
-        ],
-    )
-
-    response = client.run_report(request)
+def build_language_distribution(cache, language_users):
+    """
+    言語別アクセス分布を作る
 
-    language_data = []
-    for row in response.rows:
-        language = row.dimension_values[0].value
-        page_views = int(row.metric_values[0].value)
-        active_users = int(row.metric_values[1].value)
+    pageViews はキャッシュの日別の値の合計、activeUsers は全期間のレポート（fetch_language_users）の値。
+    """
+    page_views = defaultdict(int)
+    for day in sorted(cache['reports']['languages']):
+        for language, views in cache['reports']['languages'][day].items():
+            page_views[language] += views
 
-        language_data.append({
-            'language': language,
-            'pageViews': page_views,
-            'activeUsers': active_users,
-        })
+    language_data = [
+        {'language': language, 'pageViews': views, 'activeUsers': language_users.get(language, 0)}
+        for language, views in page_views.items()
+    ]
 
     # ページビュー数でソート（降順）
     language_data.sort(key=lambda x: x['pageViews'], reverse=True)
@@ -169,36 +332,22 @@ def fetch_language_distribution(client, property_id):
     return language_data
 
 
-def fetch_page_distribution(client, property_id):
-    """ページパス別アクセス分布を取得"""
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        date_ranges=[DateRange(start_date="2024-01-01", end_date="today")],
-        dimensions=[
-            Dimension(name="pagePath"),
-            Dimension(name="pageTitle"),
-        ],
-        metrics=[
-            Metric(name="screenPageViews"),
-            Metric(name="activeUsers"),
-        ],
-    )
+def build_page_distribution(cache, page_users):
+    """
+    ページパス別アクセス分布を作る
 
-    response = client.run_report(request)
+    pageViews はキャッシュの日別の値の合計、activeUsers は全期間のレポート（fetch_page_users）の値。
+    """
+    page_views = defaultdict(int)
+    for day in sorted(cache['reports']['pages']):
+        for page_path, page_title, views in cache['reports']['pages'][day]:
+            page_views[(page_path, page_title)] += views
 
-    page_data = []
-    for row in response.rows:
-        page_path = row.dimension_values[0].value
-        page_title = row.dimension_values[1].value
-        page_views = int(row.metric_values[0].value)
-        active_users = int(row.metric_values[1].value)
-
-        page_data.append({
-            'pagePath': page_path,
-            'pageTitle': page_title,
-            'pageViews': page_views,
-            'activeUsers': active_users,
-        })
+    page_data = [
+        {'pagePath': page_path, 'pageTitle': page_title, 'pageViews': views,
+         'activeUsers': page_users.get((page_path, page_title), 0)}
+        for (page_path, page_title), views in page_views.items()
+    ]
 
     # ページビュー数でソート（降順）
     page_data.sort(key=lambda x: x['pageViews'], reverse=True)
@@ -207,67 +356,39 @@ def fetch_page_distribution(client, property_id):
     return page_data
 
 
-def fetch_guideline_monthly_stats(client, property_id):
-    """ガイドラインページの月別言語別アクセス統計を取得"""
-    request = RunReportRequest(
-        property=f"properties/{property_id}",
-        date_ranges=[DateRange(start_date="2024-01-01", end_date="today")],
-        dimensions=[
-            Dimension(name="pagePath"),
-            Dimension(name="yearMonth"),
-        ],
-        metrics=[
-            Metric(name="screenPageViews"),
-        ],
-        dimension_filter={
-            "filter": {
-                "field_name": "pagePath",
-                "string_filter": {
-                    "match_type": "CONTAINS",
-                    "value": "guideline"
-                }
-            }
-        }
-    )
+def guideline_language(page_path):
+    """ガイドラインページのパスから言語を判定"""
+    # 実際に存在する9言語のみ判定（日本語、英語、韓国語、簡体中国語、繁体中国語、フランス語、スペイン語、ポルトガル語、ロシア語）
+    path_lower = page_path.lower()
+
+    if '/zh-hans' in path_lower or '/guideline/zh-hans' in path_lower:
+        return 'zh-hans'
+    elif '/zh-hant' in path_lower or '/guideline/zh-hant' in path_lower:
+        return 'zh-hant'
+    elif '/en' in path_lower or '/guideline/en' in path_lower:
+        return 'en'
+    elif '/ko' in path_lower or '/guideline/ko' in path_lower or 'ko/' in path_lower:
+        return 'ko'
+    elif '/fr' in path_lower or '/guideline/fr' in path_lower:
+        return 'fr'
+    elif '/es' in path_lower or '/guideline/es' in path_lower:
+        return 'es'
+    elif '/pt' in path_lower or '/guideline/pt' in path_lower:
+        return 'pt'
+    elif '/ru' in path_lower or '/guideline/ru' in path_lower:
+        return 'ru'
+    else:
+        return 'ja'  # デフォルトは日本語
 
-    response = client.run_report(request)
 
+def build_guideline_monthly_stats(cache):
+    """キャッシュからガイドラインページの月別言語別アクセス統計を作る"""
     # 月別言語別に集計
-    from collections import defaultdict
     monthly_lang_data = defaultdict(lambda: defaultdict(int))
 
-    for row in response.rows:
-        page_path = row.dimension_values[0].value
-        year_month = row.dimension_values[1].value  # YYYYMM形式
-        page_views = int(row.metric_values[0].value)
-
-        # 年月をYYYY-MM形式に変換
-        formatted_month = f"{year_month[:4]}-{year_month[4:]}"
-
-        # ページパスから言語を判定
-        # 実際に存在する9言語のみ判定（日本語、英語、韓国語、簡体中国語、繁体中国語、フランス語、スペイン語、ポルトガル語、ロシア語）
-        path_lower = page_path.lower()
-
-        if '/zh-hans' in path_lower or '/guideline/zh-hans' in path_lower:
-            lang = 'zh-hans'
-        elif '/zh-hant' in path_lower or '/guideline/zh-hant' in path_lower:
-            lang = 'zh-hant'
-        elif '/en' in path_lower or '/guideline/en' in path_lower:
-            lang = 'en'
-        elif '/ko' in path_lower or '/guideline/ko' in path_lower or 'ko/' in path_lower:
-            lang = 'ko'
-        elif '/fr' in path_lower or '/guideline/fr' in path_lower:
-            lang = 'fr'
-        elif '/es' in path_lower or '/guideline/es' in path_lower:
-            lang = 'es'
-        elif '/pt' in path_lower or '/guideline/pt' in path_lower:
-            lang = 'pt'
-        elif '/ru' in path_lower or '/guideline/ru' in path_lower:
-            lang = 'ru'
-        else:
-            lang = 'ja'  # デフォルトは日本語
-
-        monthly_lang_data[formatted_month][lang] += page_views
+    for day in sorted(cache['reports']['guideline']):
+        for page_path, page_views in cache['reports']['guideline'][day].items():
+            monthly_lang_data[day[:7]][guideline_language(page_path)] += page_views
 
     # 結果を整形
     result = []
@@ -280,6 +401,117 @@ def fetch_guideline_monthly_stats(client, property_id):
     return result
 
 
+def new_ga4_cache(property_id):
+    """空のGA4キャッシュ"""
+    return {
+        'version': CACHE_VERSION,
+        'propertyId': str(property_id),
+        'syncedThrough': None,
+        'reports': {name: {} for name in CACHED_REPORTS},
+    }
+
+
+def load_ga4_cache(property_id, cache_path=GA4_CACHE_PATH):
+    """前回のGA4キャッシュを読み込む（無い・形式が合わない場合は空のキャッシュ）"""
+    if not os.path.exists(cache_path):
+        print(f"⚠️  {cache_path} not found (fetching from {ALL_TIME_START_DATE})")
+        return new_ga4_cache(property_id)
+
+    with gzip.open(cache_path, 'rt', encoding='utf-8') as f:
+        cache = json.load(f)
+
+    if (cache.get('version') != CACHE_VERSION
+            or cache.get('propertyId') != str(property_id)
+            or list(cache.get('reports', {})) != list(CACHED_REPORTS)):
+        print(f"⚠️  {cache_path} is incompatible with this collector (fetching from {ALL_TIME_START_DATE})")
+        return new_ga4_cache(property_id)
+
+    print(f"✅ GA4 cache loaded (synced through {cache['syncedThrough']})")
+    return cache
+
+
+def save_ga4_cache(cache, cache_path=GA4_CACHE_PATH):
+    """GA4キャッシュを保存（書き込み途中のファイルが残らないよう一時ファイル経由）"""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+    temp_path = f"{cache_path}.tmp"
+    with gzip.open(temp_path, 'wt', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temp_path, cache_path)
+
+    print(f"✅ GA4 cache saved to {cache_path}")
+
+
+def refetch_start_date(cache):
+    """
+    再取得を始める日付
+
+    GA4 の数値は当日と前日はまだ変わるため、キャッシュの最新日（前回実行時の今日）の前日から取り直す。
+    キャッシュが空なら全期間を取得する。
+    """
+    if not cache['syncedThrough']:
+        return ALL_TIME_START_DATE
+
+    return (date.fromisoformat(cache['syncedThrough']) - timedelta(days=1)).isoformat()
+
+
+def update_ga4_cache(cache, report_client, property_id, executor):
+    """確定していない日以降の日別レポートを並行して取得し、キャッシュの該当日を置き換える"""
+    start_date = refetch_start_date(cache)
+    print(f"Fetching GA4 reports from {start_date}")
+
+    futures = {
+        name: executor.submit(fetch_rows, report_client, property_id, start_date)
+        for name, fetch_rows in CACHED_REPORTS.items()
+    }
+
+    synced_through = cache['syncedThrough']
+    for name, future in futures.items():
+        fetched = future.result()
+        cached = cache['reports'][name]
+        for day in [day for day in cached if day >= start_date]:
+            del cached[day]
+        cached.update(fetched)
+
+        if fetched:
+            synced_through = max(filter(None, [synced_through, max(fetched)]))
+
+    cache['syncedThrough'] = synced_through
+
+
+def fetch_all_reports(client, property_id, daily_metrics_days=30, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                      cache=None):
+    """
+    全レポートを並行して取得し、ga4_data.json の各セクションを返す
+
+    client は BetaAnalyticsDataClient（または run_report を持つ偽のクライアント）。
+    日別・言語別・ページ別・ガイドラインのレポートは日付をキーに cache（load_ga4_cache の戻り値）へ
+    保存し、確定していない直近の日だけを取得してキャッシュと合わせる。cache は更新される。
+    言語別・ページ別の activeUsers は全期間のレポートから取得する（日別の値の合計はユニークユーザー数にならない）。
+    """
+    if cache is None:
+        cache = new_ga4_cache(property_id)
+
+    report_client = ReportClient(client, max_concurrency=max_concurrency)
+
+    with ThreadPoolExecutor(max_workers=len(CACHED_REPORTS) + 3) as executor:
+        overall_future = executor.submit(fetch_overall_metrics, report_client, property_id)
+        language_users_future = executor.submit(fetch_language_users, report_client, property_id)
+        page_users_future = executor.submit(fetch_page_users, report_client, property_id)
+        update_ga4_cache(cache, report_client, property_id, executor)
+        overall_metrics = overall_future.result()
+        language_users = language_users_future.result()
+        page_users = page_users_future.result()
+
+    return {
+        'overallMetrics': overall_metrics,
+        'dailyMetrics': build_daily_metrics(cache, days=daily_metrics_days),
+        'languageDistribution': build_language_distribution(cache, language_users),
+        'pageDistribution': build_page_distribution(cache, page_users),
+        'guidelineMonthlyStats': build_guideline_monthly_stats(cache),
+    }
+
+
 def save_ga4_data(data, output_path='public/data/ga4_data.json'):
     """GA4データをJSONファイルに保存"""
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
@@ -290,10 +522,8 @@ def save_ga4_data(data, output_path='public/data/ga4_data.json'):
     print(f"✅ GA4 data saved to {output_path}")
 
 
-def main():
-    """メイン処理"""
-    print("=== GA4 Data Collector ===")
-
+def ga4_settings():
+    """環境変数のGA4の設定 (property_id, daily_metrics_days, max_concurrency)"""
     # Property IDを環境変数から取得
     property_id = os.environ.get('GA4_PROPERTY_ID', '358776412')
     print(f"Property ID: {property_id}")
@@ -302,28 +532,62 @@ def main():
     daily_metrics_days = int(os.environ.get('GA4_DAILY_METRICS_DAYS', '30'))
     print(f"Daily metrics period: {daily_metrics_days} days")
 
+    # 同時に実行するリクエスト数を環境変数から取得（デフォルト: 4）
+    max_concurrency = int(os.environ.get('GA4_MAX_CONCURRENCY', str(DEFAULT_MAX_CONCURRENCY)))
+
+    return property_id, daily_metrics_days, max_concurrency
+
+
+def collect_ga4_data(report, property_id, daily_metrics_days=30, max_concurrency=DEFAULT_MAX_CONCURRENCY,
+                     full=False):
+    """
+    GA4のレポートを取得してキャッシュと ga4_data.json を保存し、ga4_data を返す
+
+    full=True ならキャッシュを使わずに全期間を取得し直す。各ステージは report（pipeline_report.RunReport）に記録する。
+    """
     # GA4クライアント初期化
-    client = initialize_ga4_client()
+    with report.stage('connect'):
+        client = initialize_ga4_client()
 
-    # データ取得
-    overall_metrics = fetch_overall_metrics(client, property_id)
-    daily_metrics = fetch_daily_metrics(client, property_id, days=daily_metrics_days)
-    language_distribution = fetch_language_distribution(client, property_id)
-    page_distribution = fetch_page_distribution(client, property_id)
-    guideline_monthly_stats = fetch_guideline_monthly_stats(client, property_id)
+    # 前回のキャッシュを読み込み（--full の場合は全期間を取得し直す）
+    with report.stage('load_cache') as stage:
+        cache = new_ga4_cache(property_id) if full else load_ga4_cache(property_id)
+        stage.records = sum(len(days) for days in cache['reports'].values())
+
+    # データ取得（並行）
+    with report.stage('fetch') as stage:
+        reports = fetch_all_reports(client, property_id, daily_metrics_days, max_concurrency, cache=cache)
+        stage.records = sum(len(rows) for rows in reports.values() if isinstance(rows, list))
 
     # データをまとめる
     ga4_data = {
         'lastUpdated': datetime.now().isoformat(),
-        'overallMetrics': overall_metrics,
-        'dailyMetrics': daily_metrics,
-        'languageDistribution': language_distribution,
-        'pageDistribution': page_distribution,
-        'guidelineMonthlyStats': guideline_monthly_stats,
+        **reports,
     }
 
     # JSONファイルに保存
-    save_ga4_data(ga4_data)
+    with report.stage('save'):
+        save_ga4_cache(cache)
+        save_ga4_data(ga4_data)
+
+    return ga4_data
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='Fetch Google Analytics 4 reports into ga4_data.json')
+    parser.add_argument('--full', action='store_true',
+                        help=f'ignore the cache and fetch all reports from {ALL_TIME_START_DATE}')
+    add_report_arguments(parser)
+    args = parser.parse_args()
+    report = report_from_args('ga_collector', args)
+
+    print("=== GA4 Data Collector ===")
+
+    collect_ga4_data(report, *ga4_settings(), full=args.full)
+
+    report.print_summary()
+    report.save(args.report)
 
     print("=== GA4 Data Collection Complete ===")
 
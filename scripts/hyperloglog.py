@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+HyperLogLog
+ユニークユーザー数を固定サイズのレジスタで推定するスケッチ
+
+同じ precision のスケッチ同士はレジスタごとの最大値で結合でき（シャード・前回の集計状態との結合）、
+to_state / from_state で JSON 化できる。推定値の相対標準誤差は 1.04 / sqrt(2^precision)。
+"""
+
+import base64
+import hashlib
+import math
+from functools import lru_cache
+
+MIN_PRECISION = 4
+MAX_PRECISION = 16
+
+# 既定の相対標準誤差（precision 12、レジスタ 4096 バイト）
+DEFAULT_ERROR = 0.02
+
+_HASH_BITS = 64
+# 2^-rank の表（rank は最大 64 - MIN_PRECISION + 1）
+_INVERSE_POWERS = [2.0 ** -rank for rank in range(_HASH_BITS + 2)]
+
+
+def precision_for_error(error):
+    """相対標準誤差が error 以下になる最小の precision"""
+    if error <= 0:
+        raise ValueError(f"error must be positive: {error}")
+    precision = math.ceil(math.log2((1.04 / error) ** 2))
+    return min(max(precision, MIN_PRECISION), MAX_PRECISION)
+
+
+def relative_error(precision):
+    """precision のスケッチの相対標準誤差"""
+    return 1.04 / math.sqrt(1 << precision)
+
+
+@lru_cache(maxsize=1 << 16)
+def _hash64(item):
+    """要素の64ビットハッシュ（同じユーザーIDが何度も追加されるのでキャッシュする）"""
+    return int.from_bytes(hashlib.blake2b(str(item).encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _alpha(register_count):
+    if register_count == 16:
+        return 0.673
+    if register_count == 32:
+        return 0.697
+    if register_count == 64:
+        return 0.709
+    return 0.7213 / (1 + 1.079 / register_count)
+
+
+class HyperLogLog:
+    """
+    ユニークな要素数を推定するスケッチ
+
+    add / update は set と同じ名前なので、ユーザーIDのセットの代わりにそのまま使える。
+    """
+
+    __slots__ = ('precision', 'registers')
+
+    def __init__(self, precision, registers=None):
+        if not MIN_PRECISION <= precision <= MAX_PRECISION:
+            raise ValueError(f"precision must be between {MIN_PRECISION} and {MAX_PRECISION}: {precision}")
+        self.precision = precision
+        self.registers = bytearray(registers) if registers is not None else bytearray(1 << precision)
+
+    def add(self, item):
+        hashed = _hash64(item)
+        remaining_bits = _HASH_BITS - self.precision
+        index = hashed >> remaining_bits
+        rank = remaining_bits - (hashed & ((1 << remaining_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def update(self, items):
+        for item in items:
+            self.add(item)
+
+    def merge(self, other):
+        """other（同じ precision）の要素を取り込む"""
+        if other.precision != self.precision:
+            raise ValueError(f"cannot merge precision {other.precision} into {self.precision}")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self):
+        """ユニークな要素数の推定値"""
+        register_count = len(self.registers)
+        estimate = _alpha(register_count) * register_count * register_count / sum(
+            _INVERSE_POWERS[rank] for rank in self.registers
+        )
+
+        # 少ない要素数では空のレジスタ数による線形カウントの方が正確
+        if estimate <= 2.5 * register_count:
+            zeros = self.registers.count(0)
+            if zeros:
+                estimate = register_count * math.log(register_count / zeros)
+
+        return int(round(estimate))
+
+    @property
+    def relative_error(self):
+        return relative_error(self.precision)
+
+    def to_state(self):
+        """JSON 化できる形（レジスタは base64）"""
+        return {'p': self.precision, 'registers': base64.b64encode(bytes(self.registers)).decode('ascii')}
+
+    @classmethod
+    def from_state(cls, state):
+        """to_state の値から復元"""
+        return cls(state['p'], base64.b64decode(state['registers']))
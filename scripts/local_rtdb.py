@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Local Realtime Database
+JSONファイルを Firebase Realtime Database の代わりに使うための参照クラス
+
+firebase_admin.db の Reference / Query のうち、コレクターが使う部分だけを同じ呼び出し方で提供する。
+Firebase に接続せずに firebase_collector の差分同期を確認する場合に使う:
+
+    FIREBASE_LOCAL_DB=path/to/db.json python scripts/firebase_collector.py
+"""
+
+import copy
+import json
+import os
+
+
+def key_order(key):
+    """Realtime Database のキー順（32bit整数として解釈できるキーが先で数値順、残りは文字列順）"""
+    try:
+        number = int(key)
+    except ValueError:
+        return (1, 0, key)
+    if str(number) == key and -2 ** 31 <= number < 2 ** 31:
+        return (0, number, '')
+    return (1, 0, key)
+
+
+def _sorted_value(value):
+    """辞書をキー順に並べ替えたコピーを返す（サーバーのレスポンスと同じ順序にする）"""
+    if isinstance(value, dict):
+        return {key: _sorted_value(value[key]) for key in sorted(value, key=key_order)}
+    return copy.deepcopy(value)
+
+
+class LocalDatabase:
+    """JSONファイル全体をデータベースのルートとして扱う"""
+
+    def __init__(self, path):
+        self.path = path
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                self.root = json.load(f)
+        else:
+            self.root = None
+
+    def reference(self, path='/'):
+        """db.reference(path) に相当する参照を返す"""
+        return LocalReference(self, [segment for segment in path.split('/') if segment])
+
+    def save(self):
+        """変更をファイルに書き戻す"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.root, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class LocalReference:
+    """firebase_admin.db.Reference の代替"""
+
+    def __init__(self, database, segments):
+        self._database = database
+        self._segments = segments
+
+    @property
+    def key(self):
+        return self._segments[-1] if self._segments else None
+
+    @property
+    def path(self):
+        return '/' + '/'.join(self._segments)
+
+    def child(self, path):
+        return LocalReference(self._database, self._segments + [s for s in path.split('/') if s])
+
+    def _resolve(self):
+        node = self._database.root
+        for segment in self._segments:
+            if not isinstance(node, dict):
+                return None
+            node = node.get(segment)
+        return node
+
+    def get(self, shallow=False):
+        """値を返す（shallow=True なら子の辞書は True に置き換える）"""
+        value = self._resolve()
+        if shallow and isinstance(value, dict):
+            return {
+                key: True if isinstance(value[key], dict) else value[key]
+                for key in sorted(value, key=key_order)
+            }
+        return _sorted_value(value)
+
+    def set(self, value):
+        """値を書き込んでファイルに保存する"""
+        if not self._segments:
+            self._database.root = copy.deepcopy(value)
+        else:
+            if not isinstance(self._database.root, dict):
+                self._database.root = {}
+            node = self._database.root
+            for segment in self._segments[:-1]:
+                if not isinstance(node.get(segment), dict):
+                    node[segment] = {}
+                node = node[segment]
+            node[self._segments[-1]] = copy.deepcopy(value)
+        self._database.save()
+
+    def update(self, value):
+        """子の値をまとめて書き込む"""
+        for key, child_value in value.items():
+            self.child(key).set(child_value)
+
+    def delete(self):
+        """値を削除する"""
+        if not self._segments:
+            self._database.root = None
+        else:
+            parent = LocalReference(self._database, self._segments[:-1])._resolve()
+            if isinstance(parent, dict):
+                parent.pop(self._segments[-1], None)
+        self._database.save()
+
+    def order_by_key(self):
+        return LocalQuery(self)
+
+
+class LocalQuery:
+    """firebase_admin.db.Query の代替（order_by_key のみ）"""
+
+    def __init__(self, reference):
+        self._reference = reference
+        self._start = None
+        self._end = None
+        self._limit_first = None
+        self._limit_last = None
+
+    def start_at(self, start):
+        self._start = start
+        return self
+
+    def end_at(self, end):
+        self._end = end
+        return self
+
+    def limit_to_first(self, limit):
+        self._limit_first = limit
+        return self
+
+    def limit_to_last(self, limit):
+        self._limit_last = limit
+        return self
+
+    def get(self):
+        """条件に一致する子をキー順で返す（一致しない場合は None）"""
+        value = self._reference._resolve()
+        if not isinstance(value, dict):
+            return None
+
+        keys = sorted(value, key=key_order)
+        if self._start is not None:
+            keys = [key for key in keys if key_order(key) >= key_order(self._start)]
+        if self._end is not None:
+            keys = [key for key in keys if key_order(key) <= key_order(self._end)]
+        if self._limit_first is not None:
+            keys = keys[:self._limit_first]
+        if self._limit_last is not None:
+            keys = keys[-self._limit_last:] if self._limit_last else []
+
+        if not keys:
+            return None
+        return {key: _sorted_value(value[key]) for key in keys}
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Pipeline
+Firebase の取得 → GA4 の取得 → 集計を1プロセスで実行し、ステージ間のデータをメモリで受け渡す
+
+    python scripts/pipeline.py [--full] [--workers 0] [--recent-plays-archive]
+    python scripts/pipeline.py --skip-firebase --skip-ga4     # 前回のファイルから集計だけ（デバッグ用）
+
+各入力（users/ と GA4 のレポート）のフィンガープリントを取り、集計の入力（2つのフィンガープリント・
+集計のオプション・今日の日付・scripts/ のコード）が前回の実行と同じなら集計と書き出しを省略する。
+users/ のフィンガープリントは保存した raw_data.snap のバイト列のハッシュ（users/ を直列化し直さない）。
+GA4 のレポートは当日分の指標が1日の中でも変わるため、GA4 を取得した実行ではほぼ毎回集計し直すことになる。
+GitHub Actions では changed=true/false を $GITHUB_OUTPUT に出力し、変化が無ければ Next.js のビルドと
+デプロイを省略する。フィンガープリントは public/data/pipeline_state.json に保存する。
+
+取得したデータは従来通り raw_data.snap（次回の差分同期用）と ga4_data.json にも保存するため、
+firebase_collector.py / ga_collector.py / data_aggregator.py をファイル経由で個別に実行することもできる。
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import os
+import sys
+from datetime import date, datetime
+
+import data_aggregator
+import firebase_collector
+from dashboard_sections import load_manifest
+from pipeline_report import PIPELINE_REPORT_PATH, RunReport
+
+PIPELINE_STATE_PATH = 'public/data/pipeline_state.json'
+PIPELINE_STATE_VERSION = 2
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _json_bytes(value):
+    """フィンガープリント用の正規化したJSON（キー順を揃える）"""
+    return json.dumps(value, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def fingerprint_raw_data():
+    """
+    users/ のフィンガープリント（集計する生データのファイルのバイト列のハッシュ）
+
+    raw_data.snap は同じ内容なら同じバイト列で書き出される（raw_snapshot.write_snapshot）。
+    """
+    input_path = data_aggregator.RAW_DATA_PATH
+    if not os.path.exists(input_path):
+        input_path = data_aggregator.LEGACY_RAW_DATA_PATH
+
+    digest = hashlib.sha256()
+    with open(input_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint_ga4(ga4_data):
+    """GA4データのフィンガープリント（取得時刻 lastUpdated は含めない、当日分の指標の変化は含む）"""
+    if ga4_data is None:
+        return None
+    return hashlib.sha256(_json_bytes({k: v for k, v in ga4_data.items() if k != 'lastUpdated'})).hexdigest()
+
+
+def fingerprint_code():
+    """scripts/ の Python コードのフィンガープリント（集計ロジックが変わったら集計し直す）"""
+    digest = hashlib.sha256()
+    for path in sorted(glob.glob(os.path.join(SCRIPTS_DIR, '*.py'))):
+        digest.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def fingerprint_aggregation(fingerprints, options):
+    """集計の入力全体のフィンガープリント（未来日付の除外があるため今日の日付も含める）"""
+    return hashlib.sha256(_json_bytes({
+        'inputs': fingerprints,
+        'options': options,
+        'today': date.today().isoformat(),
+        'code': fingerprint_code(),
+    })).hexdigest()
+
+
+def load_pipeline_state(state_path=PIPELINE_STATE_PATH):
+    """前回のフィンガープリント（無い・形式が合わない場合は空）"""
+    if not os.path.exists(state_path):
+        return {}
+
+    with open(state_path, 'r', encoding='utf-8') as f:
+        state = json.load(f)
+
+    return state.get('fingerprints', {}) if state.get('version') == PIPELINE_STATE_VERSION else {}
+
+
+def save_pipeline_state(fingerprints, state_path=PIPELINE_STATE_PATH):
+    os.makedirs(os.path.dirname(state_path) or '.', exist_ok=True)
+    with open(state_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'version': PIPELINE_STATE_VERSION,
+            'updatedAt': datetime.now().isoformat(),
+            'fingerprints': fingerprints,
+        }, f, ensure_ascii=False, indent=2)
+
+
+def write_github_output(name, value):
+    """GitHub Actions のステップ出力（$GITHUB_OUTPUT が無ければ何もしない）"""
+    output_path = os.environ.get('GITHUB_OUTPUT')
+    if output_path:
+        with open(output_path, 'a', encoding='utf-8') as f:
+            f.write(f"{name}={value}\n")
+
+
+def _run_report(script, args):
+    """スクリプトごとの RunReport（--profile は <スクリプト>:<ステージ> で指定）"""
+    profile_script, _, profile_stage = (args.profile or '').partition(':')
+    if profile_script != script:
+        return RunReport(script)
+    return RunReport(script, profile_stage=profile_stage, profile_path=args.profile_output)
+
+
+def collect_firebase(args):
+    """users/ を取得（--skip-firebase なら前回の raw_data.snap を読む）"""
+    if args.skip_firebase:
+        users_data = data_aggregator.load_raw_data()
+        if users_data is None:
+            sys.exit(1)
+        return users_data
+
+    report = _run_report('firebase_collector', args)
+    users_data, _ = firebase_collector.collect_users_data(report, full=args.full)
+    report.print_summary()
+    report.save(args.report)
+    return users_data
+
+
+def collect_ga4(args):
+    """GA4のレポートを取得（--skip-ga4 なら前回の ga4_data.json を読む）"""
+    if args.skip_ga4:
+        return data_aggregator.load_ga4_data()
+
+    # google-analytics-data は GA4 を取得する場合だけ必要
+    import ga_collector
+
+    report = _run_report('ga_collector', args)
+    ga4_data = ga_collector.collect_ga4_data(report, *ga_collector.ga4_settings(), full=args.full)
+    report.print_summary()
+    report.save(args.report)
+    return ga4_data
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description='Collect Firebase and GA4 data and aggregate it in one process')
+    parser.add_argument('--full', action='store_true',
+                        help='fetch all users and GA4 reports and rebuild the aggregation from scratch')
+    parser.add_argument('--force', action='store_true',
+                        help='aggregate even if no input has changed since the last run')
+    parser.add_argument('--skip-firebase', action='store_true',
+                        help='use the existing raw_data.snap instead of fetching from Firebase')
+    parser.add_argument('--skip-ga4', action='store_true',
+                        help='use the existing ga4_data.json instead of fetching from GA4')
+    parser.add_argument('--pipeline-state', default=PIPELINE_STATE_PATH,
+                        help='path of the input fingerprints of the last run')
+    data_aggregator.add_aggregation_arguments(parser)
+    parser.add_argument('--report', default=PIPELINE_REPORT_PATH,
+                        help='path of the machine-readable run report')
+    parser.add_argument('--profile', metavar='SCRIPT:STAGE',
+                        help='run cProfile on one stage, e.g. data_aggregator:aggregate')
+    parser.add_argument('--profile-output', metavar='PATH',
+                        help='where to write the cProfile stats (default: <script>-<stage>.prof)')
+    args = parser.parse_args()
+    workers, sketch_precision = data_aggregator.aggregation_options(args)
+
+    print("=" * 60)
+    print("Pipeline")
+    print(f"Started at: {datetime.now().isoformat()}")
+    print("=" * 60)
+
+    users_data = collect_firebase(args)
+    ga4_data = collect_ga4(args)
+
+    # 入力のフィンガープリント
+    report = _run_report('data_aggregator', args)
+    with report.stage('fingerprint') as stage:
+        fingerprints = {'firebase': fingerprint_raw_data(), 'ga4': fingerprint_ga4(ga4_data)}
+        options = {
+            'archive': args.recent_plays_archive,
+            'sketchPrecision': sketch_precision,
+        }
+        fingerprints['aggregation'] = fingerprint_aggregation(dict(fingerprints), options)
+        stage.records = len(users_data)
+
+    previous = load_pipeline_state(args.pipeline_state)
+    for name in ('firebase', 'ga4'):
+        status = 'unchanged' if previous.get(name) == fingerprints[name] else 'changed'
+        print(f"{name}: {status} ({fingerprints[name] and fingerprints[name][:12]})")
+
+    changed = (args.force or args.full
+               or previous.get('aggregation') != fingerprints['aggregation']
+               or load_manifest() is None)
+    if changed:
+        data_aggregator.aggregate_and_save(
+            users_data, ga4_data, report, state_path=args.state, full=args.full, workers=workers,
+            archive=args.recent_plays_archive, sketch_precision=sketch_precision, report_path=args.report
+        )
+        save_pipeline_state(fingerprints, args.pipeline_state)
+    else:
+        print("✅ No input has changed since the last run (aggregation skipped)")
+
+    report.print_summary()
+    report.save(args.report)
+    write_github_output('changed', 'true' if changed else 'false')
+
+    print("=" * 60)
+    print(f"✅ Pipeline completed successfully ({'dashboard updated' if changed else 'nothing to update'})")
+    print("=" * 60)
+
+
+if __name__ == '__main__':
+    main()
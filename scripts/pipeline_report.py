@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+"""
+Pipeline Report
+firebase_collector / ga_collector / data_aggregator の各ステージの実行時間・CPU時間・ピークメモリ・
+処理件数を記録し、実行レポート（public/data/pipeline_report.json）に保存する
+
+    report = RunReport('data_aggregator', profile_stage=args.profile)
+    with report.stage('aggregate') as stage:
+        sections = aggregate_sections(users_data)
+        stage.records = len(sections)
+    report.print_summary()
+    report.save()
+
+レポートファイルにはスクリプトごとに最後の実行が残る（{'version', 'runs': {スクリプト名: 実行}}）。
+ピークメモリは Linux ではステージごとに最大RSSをリセットして測る（リセットできない環境ではプロセス開始からの最大RSS）。
+CPU時間には、ステージ内で終了した子プロセス（並列集計のワーカー）の分も含める。
+profile_stage を指定すると、そのステージを cProfile で計測して .prof ファイルに保存する。
+"""
+
+import cProfile
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+PIPELINE_REPORT_PATH = 'public/data/pipeline_report.json'
+REPORT_VERSION = 1
+
+
+def _reset_peak_rss():
+    """最大RSS（VmHWM）を現在のRSSにリセット（Linux のみ、できなければ False）"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss_mb(resettable):
+    """最大RSS（MB）: リセットできる環境では VmHWM、それ以外は ru_maxrss（Linux は KB 単位）"""
+    if resettable:
+        try:
+            with open('/proc/self/status', 'r') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return int(line.split()[1]) / 1024
+        except OSError:
+            pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _cpu_seconds():
+    """このプロセスと終了済みの子プロセスの CPU 時間（user + system）"""
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime
+
+
+class Stage:
+    """1ステージの計測結果（records は呼び出し側が処理件数を設定する）"""
+
+    def __init__(self, name):
+        self.name = name
+        self.records = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_mb = 0.0
+        self.error = None
+
+    def to_dict(self):
+        stage = {
+            'name': self.name,
+            'wallSeconds': round(self.wall_seconds, 3),
+            'cpuSeconds': round(self.cpu_seconds, 3),
+            'peakMb': round(self.peak_mb, 1),
+            'records': self.records,
+        }
+        if self.error:
+            stage['error'] = self.error
+        return stage
+
+
+class RunReport:
+    """1回の実行のステージごとの計測結果"""
+
+    def __init__(self, script, profile_stage=None, profile_path=None):
+        self.script = script
+        self.started_at = datetime.now().isoformat()
+        self.finished_at = None
+        self.stages = []
+        self.profile_stage = profile_stage
+        self.profile_path = profile_path or f"{script}-{profile_stage}.prof"
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name):
+        """with ブロックを1ステージとして計測する（例外が起きても記録してから送出する）"""
+        stage = Stage(name)
+        self.stages.append(stage)
+
+        resettable = _reset_peak_rss()
+        profiler = cProfile.Profile() if name == self.profile_stage else None
+        wall_start = time.perf_counter()
+        cpu_start = _cpu_seconds()
+        if profiler:
+            profiler.enable()
+        try:
+            yield stage
+        except BaseException as e:
+            stage.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            if profiler:
+                profiler.disable()
+            stage.wall_seconds = time.perf_counter() - wall_start
+            stage.cpu_seconds = _cpu_seconds() - cpu_start
+            stage.peak_mb = _peak_rss_mb(resettable)
+            if profiler:
+                profiler.dump_stats(self.profile_path)
+                print(f"✅ Profile of stage '{name}' saved to {self.profile_path}")
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self._start
+
+    def to_dict(self):
+        return {
+            'script': self.script,
+            'startedAt': self.started_at,
+            'finishedAt': self.finished_at or datetime.now().isoformat(),
+            'totalSeconds': round(self.total_seconds, 3),
+            'stages': [stage.to_dict() for stage in self.stages],
+        }
+
+    def print_summary(self):
+        """ステージごとの計測結果を表で表示"""
+        print(f"{'stage':<24}{'wall (s)':>10}{'cpu (s)':>10}{'peak (MB)':>11}{'records':>12}")
+        for stage in self.stages:
+            records = '-' if stage.records is None else stage.records
+            print(f"{stage.name:<24}{stage.wall_seconds:>10.2f}{stage.cpu_seconds:>10.2f}"
+                  f"{stage.peak_mb:>11.1f}{records:>12}")
+        print(f"{'total':<24}{self.total_seconds:>10.2f}")
+
+    def save(self, report_path=PIPELINE_REPORT_PATH):
+        """レポートファイルのこのスクリプトの実行を置き換えて保存（他のスクリプトの実行は残す）"""
+        self.finished_at = datetime.now().isoformat()
+        report = load_pipeline_report(report_path) or {'version': REPORT_VERSION, 'runs': {}}
+        report['runs'][self.script] = self.to_dict()
+
+        os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+        temp_path = f"{report_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, report_path)
+
+        print(f"✅ Run report saved to {report_path}")
+
+
+def load_pipeline_report(report_path=PIPELINE_REPORT_PATH):
+    """実行レポート（無い・形式が合わない場合は None）"""
+    if not os.path.exists(report_path):
+        return None
+
+    with open(report_path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+
+    return report if report.get('version') == REPORT_VERSION else None
+
+
+def pipeline_summary(runs):
+    """ダッシュボードの meta.pipeline 用の要約（スクリプトごとの終了時刻・合計時間・ステージの時間と件数）"""
+    return {
+        script: {
+            'finishedAt': run['finishedAt'],
+            'totalSeconds': round(run['totalSeconds'], 2),
+            'stages': [
+                {'name': stage['name'], 'seconds': round(stage['wallSeconds'], 2), 'records': stage['records']}
+                for stage in run['stages']
+            ],
+        }
+        for script, run in runs.items()
+    }
+
+
+def add_report_arguments(parser):
+    """実行レポートと cProfile のコマンドライン引数を追加"""
+    parser.add_argument('--report', default=PIPELINE_REPORT_PATH,
+                        help='path of the machine-readable run report')
+    parser.add_argument('--profile', metavar='STAGE',
+                        help='run cProfile on the given stage and dump the stats')
+    parser.add_argument('--profile-output', metavar='PATH',
+                        help='where to write the cProfile stats (default: <script>-<stage>.prof)')
+
+
+def report_from_args(script, args):
+    """add_report_arguments の引数から RunReport を作る"""
+    return RunReport(script, profile_stage=args.profile, profile_path=args.profile_output)
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Quantiles
+値ごとの件数（ヒストグラム）から平均値・中央値・パーセンタイルを求める
+
+元の値のリストを保持せず、メモリは値の種類数（0-100 の整数なら 101 ビン）で決まる。
+同じ種類のヒストグラム同士は件数を足すだけで結合できる（シャード・前回の集計状態との結合）。
+mean / median は元の値のリストに statistics.mean / median を適用した場合と同じ型・値を返す。
+"""
+
+from collections import Counter
+from fractions import Fraction
+
+# ダッシュボードに出力するパーセンタイル
+PERCENTILES = (10, 25, 50, 75, 90)
+
+
+class _QuantileMixin:
+    """items()（値の昇順の (値, 件数)）から統計量を計算する"""
+
+    def total(self):
+        return sum(count for _, count in self.items())
+
+    def nth_value(self, index):
+        """昇順に並べたときの index 番目（0始まり）の値"""
+        seen = 0
+        for value, count in self.items():
+            seen += count
+            if seen > index:
+                return value
+        raise IndexError(index)
+
+    def mean(self):
+        """平均値（statistics.mean と同じ: 値が全て整数で割り切れる場合は int、それ以外は float）"""
+        items = self.items()
+        count = sum(n for _, n in items)
+        total = sum(Fraction(value) * n for value, n in items)
+        mean = total / count
+        if mean.denominator == 1 and all(isinstance(value, int) for value, _ in items):
+            return int(mean)
+        return float(mean)
+
+    def median(self):
+        """中央値（statistics.median と同じ）"""
+        count = self.total()
+        middle = count // 2
+        if count % 2 == 1:
+            return self.nth_value(middle)
+        return (self.nth_value(middle - 1) + self.nth_value(middle)) / 2
+
+    def percentile(self, percent):
+        """
+        percent パーセンタイル（0-100 の整数、両端を含む線形補間）
+
+        statistics.quantiles(method='inclusive') / numpy.percentile の既定と同じ定義。
+        50 は median() と同じ値を返す。
+        """
+        if percent == 50:
+            return self.median()
+
+        position, remainder = divmod((self.total() - 1) * percent, 100)
+        lower = self.nth_value(position)
+        if remainder == 0:
+            return lower
+        upper = self.nth_value(position + 1)
+        return lower + (upper - lower) * remainder / 100
+
+    def percentiles(self, percents=PERCENTILES, digits=2):
+        """{'p10': 値, ...}（件数が0なら全て0）"""
+        if not self.total():
+            return {f"p{percent}": 0 for percent in percents}
+        return {f"p{percent}": round(self.percentile(percent), digits) for percent in percents}
+
+
+class IntegerHistogram(_QuantileMixin):
+    """0〜size-1 の整数値の件数（固定サイズのビン）"""
+
+    __slots__ = ('bins',)
+
+    def __init__(self, size, bins=None):
+        self.bins = list(bins) if bins is not None else [0] * size
+
+    def add(self, value, count=1):
+        self.bins[value] += count
+
+    def merge(self, other):
+        self.bins = [count + more for count, more in zip(self.bins, other.bins)]
+
+    def items(self):
+        return [(value, count) for value, count in enumerate(self.bins) if count]
+
+    def to_state(self):
+        return list(self.bins)
+
+
+class ValueHistogram(_QuantileMixin):
+    """任意の数値の件数（値の種類が件数よりずっと少ない場合に使う）"""
+
+    __slots__ = ('counts',)
+
+    def __init__(self, counts=None):
+        self.counts = Counter(counts or {})
+
+    def add(self, value, count=1):
+        self.counts[value] += count
+
+    def merge(self, other):
+        self.counts.update(other.counts)
+
+    def items(self):
+        return sorted(self.counts.items())
+
+    def to_state(self):
+        return [[value, count] for value, count in self.items()]
+
+    @classmethod
+    def from_state(cls, state):
+        return cls({value: count for value, count in state})
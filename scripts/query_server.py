@@ -0,0 +1,462 @@
+#!/usr/bin/env python3
+"""
+Query Server
+集計結果をメモリに読み込み、期間・楽曲・難易度・Platform などで絞った集計を HTTP（JSON）で返すローカル用のサーバー
+
+    python scripts/query_server.py                       # http://127.0.0.1:8765
+    python scripts/query_server.py --from-raw            # raw_data.snap からロールアップキューブを作る
+    curl 'http://127.0.0.1:8765/query?metric=plays&by=platform&since=2025-10-01&song=Song01'
+    curl 'http://127.0.0.1:8765/query?metric=clearRate&by=day&days=7&difficulty=Hard,Normal'
+    curl 'http://127.0.0.1:8765/sections/kpi'
+    curl -X POST 'http://127.0.0.1:8765/reload'
+
+エンドポイント:
+    GET  /health            データセットの世代・セル数・キャッシュの状態
+    GET  /query             metric（plays / averageScore / clears / clearRate）, by（次元、カンマ区切り）,
+                            since / until（YYYY-MM-DD）または days, song（= gameType）, difficulty, platform,
+                            character, costume, clearRank（カンマ区切りで複数指定）
+    GET  /sections          集計済みのセクション名の一覧
+    GET  /sections/<name>   集計済みのセクション（public/data/dashboard）
+    POST /reload            データセットを読み込み直す
+
+集計は data_aggregator.py が保存したロールアップキューブ（rollup_cube.json.gz）から求め、
+同じクエリの結果はデータセットの世代ごとに LRU キャッシュに保持する。
+入力ファイル（キューブとマニフェスト、--from-raw なら生データ）の更新時刻を定期的に確認し、
+変わっていれば別スレッドで読み込んでからデータセットの参照を差し替える。処理中のリクエストは
+受け付けた時点のデータセットで応答し、読み込みに失敗した場合は前のデータセットのまま応答を続ける。
+標準ライブラリだけで動き、ダッシュボードの生成（GitHub Actions）には使わない。
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import signal
+import sys
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import data_aggregator
+from dashboard_sections import MANIFEST_NAME, SECTIONS_DIR, read_sections
+from rollup_cube import DIMENSIONS, ROLLUP_CUBE_PATH, RollupCube, load_rollup_cube
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+DEFAULT_CACHE_SIZE = 256
+# 入力ファイルの更新を確認する間隔（秒）
+DEFAULT_POLL_INTERVAL = 5.0
+# keep-alive の接続が次のリクエストを待つ時間（秒）
+KEEP_ALIVE_TIMEOUT = 15.0
+
+METRICS = ('plays', 'averageScore', 'clears', 'clearRate')
+
+# 絞り込みのクエリパラメータ → キューブの次元（song は楽曲 = gameType の別名）
+FILTER_PARAMETERS = {'song': 'gameType', **{dimension: dimension for dimension in DIMENSIONS[1:]}}
+QUERY_PARAMETERS = ('metric', 'by', 'since', 'until', 'days', *FILTER_PARAMETERS)
+
+STATUS_TEXT = {
+    200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+}
+
+
+class QueryError(ValueError):
+    """クエリパラメータの誤り（400 で返す）"""
+
+
+class LRUCache:
+    """件数に上限のある LRU キャッシュ（上限が 0 なら保持しない）"""
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def stats(self):
+        return {'size': len(self.entries), 'maxSize': self.max_size, 'hits': self.hits, 'misses': self.misses}
+
+
+def _parse_day(name, value):
+    try:
+        return date.fromisoformat(value).isoformat()
+    except ValueError:
+        raise QueryError(f"{name} must be YYYY-MM-DD: {value}") from None
+
+
+def parse_query(params, today=None):
+    """
+    クエリパラメータ（parse_qs の値）を正規化したクエリ (metric, by, since, until, where) にする
+
+    where は ((次元, (値, ...)), ...) で、次元と値を並べ替えるため同じ条件のクエリは同じキーになる。
+    """
+    unknown = [name for name in params if name not in QUERY_PARAMETERS]
+    if unknown:
+        raise QueryError(f"unknown parameters: {', '.join(unknown)}")
+
+    def values(name):
+        return [value for item in params.get(name, []) for value in item.split(',') if value]
+
+    metrics = values('metric') or ['plays']
+    if len(metrics) != 1 or metrics[0] not in METRICS:
+        raise QueryError(f"metric must be one of {', '.join(METRICS)}")
+
+    by = tuple(dict.fromkeys(values('by'))) or ('day',)
+    unknown = [dimension for dimension in by if dimension not in DIMENSIONS]
+    if unknown:
+        raise QueryError(f"unknown dimensions: {', '.join(unknown)} (expected {', '.join(DIMENSIONS)})")
+
+    since = until = None
+    if values('since'):
+        since = _parse_day('since', values('since')[-1])
+    if values('until'):
+        until = _parse_day('until', values('until')[-1])
+    if values('days'):
+        try:
+            days = int(values('days')[-1])
+        except ValueError:
+            days = 0
+        if days <= 0:
+            raise QueryError("days must be a positive integer")
+        since = ((today or date.today()) - timedelta(days=days - 1)).isoformat()
+
+    where = {}
+    for name, dimension in FILTER_PARAMETERS.items():
+        for value in values(name):
+            where.setdefault(dimension, set()).add(value)
+
+    return (
+        metrics[0], by, since, until,
+        tuple(sorted((dimension, tuple(sorted(field_values))) for dimension, field_values in where.items())),
+    )
+
+
+def run_query(cube, query):
+    """
+    クエリをキューブで集計した行のリスト
+
+    日付で分ける場合は日付の昇順、それ以外は指標の降順（同じ値ならプレイ数の降順）。
+    """
+    metric, by, since, until, where = query
+    rows = [
+        {**{dimension: row[dimension] for dimension in by}, metric: row[metric]}
+        for row in cube.rollup_rows(by, since=since, until=until, where={d: set(v) for d, v in where})
+    ]
+    rows.sort(key=lambda row: row[metric], reverse=True)
+    if 'day' in by:
+        rows.sort(key=lambda row: row['day'])
+    return rows
+
+
+def _query_dict(query):
+    metric, by, since, until, where = query
+    return {'metric': metric, 'by': list(by), 'since': since, 'until': until,
+            'where': {dimension: list(values) for dimension, values in where}}
+
+
+def _mtimes(paths):
+    """ファイルごとの更新時刻（無いファイルは None）"""
+    mtimes = {}
+    for path in paths:
+        try:
+            mtimes[path] = os.stat(path).st_mtime_ns
+        except FileNotFoundError:
+            mtimes[path] = None
+    return mtimes
+
+
+class Dataset:
+    """読み込んだデータセット（差し替えるときは新しいインスタンスを作り、読み込み後は変更しない）"""
+
+    def __init__(self, generation, cube, sections, sources):
+        self.generation = generation
+        self.cube = cube
+        self.sections = sections
+        # 読み込みを始めた時点の入力ファイルの更新時刻
+        self.sources = sources
+        self.loaded_at = datetime.now().isoformat()
+
+
+class QueryService:
+    """データセットの読み込み・差し替えとクエリの処理"""
+
+    def __init__(self, cube_path=ROLLUP_CUBE_PATH, sections_dir=SECTIONS_DIR, raw_path=None,
+                 cache_size=DEFAULT_CACHE_SIZE):
+        self.cube_path = cube_path
+        self.sections_dir = sections_dir
+        # 指定した場合はキューブのファイルの代わりに生データからキューブを作る
+        self.raw_path = raw_path
+        self.cache = LRUCache(cache_size)
+        self.dataset = None
+        self._generation = 0
+        self._failed_sources = None
+        self._reload_lock = asyncio.Lock()
+        # 計算中のクエリ（同じクエリが同時に来ても1回だけ計算する）
+        self._pending = {}
+        self._connections = set()
+
+    def _source_paths(self):
+        source = self.raw_path if self.raw_path is not None else self.cube_path
+        return [source, os.path.join(self.sections_dir, MANIFEST_NAME)]
+
+    def _load(self, generation, sources):
+        """データセットを読み込む（別スレッドで実行する）"""
+        if self.raw_path is not None:
+            users_data = data_aggregator.open_raw_data(self.raw_path)
+            if users_data is None:
+                raise FileNotFoundError(self.raw_path)
+            cube = RollupCube.from_dict(data_aggregator.calculate_rollup_cube(users_data))
+        else:
+            cube = load_rollup_cube(self.cube_path)
+            if cube is None:
+                raise ValueError(f"no usable rollup cube at {self.cube_path}")
+
+        sections = read_sections(self.sections_dir) or {}
+        sections.pop('lastUpdated', None)
+        return Dataset(generation, cube, sections, sources)
+
+    async def reload(self, force=False):
+        """入力ファイルが変わっていれば（force なら常に）読み込み直して差し替える"""
+        async with self._reload_lock:
+            sources = _mtimes(self._source_paths())
+            if not force and (
+                (self.dataset is not None and sources == self.dataset.sources) or sources == self._failed_sources
+            ):
+                return False
+
+            started = time.perf_counter()
+            try:
+                dataset = await asyncio.to_thread(self._load, self._generation + 1, sources)
+            except Exception as e:
+                # 同じ入力では読み込み直さない（ファイルが更新されたら再び試す）
+                self._failed_sources = sources
+                print(f"⚠️  Failed to load the dataset, keeping the current one: {e}")
+                return False
+
+            self._generation = dataset.generation
+            self.dataset = dataset
+            self.cache.clear()
+            print(f"✅ Loaded dataset #{dataset.generation} ({len(dataset.cube)} cells, "
+                  f"{len(dataset.sections)} sections) in {time.perf_counter() - started:.2f}s")
+            return True
+
+    async def watch(self, interval):
+        """
+        interval 秒ごとに入力ファイルの更新を確認する
+
+        集計はキューブとセクションを順に書き出すため、更新時刻が前回の確認から変わっていない
+        （書き出しが終わった）ときだけ読み込む。
+        """
+        previous = None
+        while True:
+            await asyncio.sleep(interval)
+            sources = _mtimes(self._source_paths())
+            if sources == previous:
+                await self.reload()
+            previous = sources
+
+    async def query(self, params):
+        """(データセット, 行のリスト, キャッシュから返したか)"""
+        # このリクエストは途中で差し替えがあっても受け付けた時点のデータセットで応答する
+        dataset = self.dataset
+        query = parse_query(params)
+        key = (dataset.generation, query)
+
+        rows = self.cache.get(key)
+        if rows is not None:
+            return dataset, query, rows, True
+
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = asyncio.ensure_future(asyncio.to_thread(run_query, dataset.cube, query))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(key, None))
+        # 接続が切れても計算は止めない（同じクエリを待っている他のリクエストがある）
+        rows = await asyncio.shield(pending)
+        if dataset is self.dataset:
+            self.cache.put(key, rows)
+        return dataset, query, rows, False
+
+    async def dispatch(self, method, target):
+        """(ステータス, レスポンスの値)"""
+        url = urlsplit(target)
+        path = url.path.rstrip('/') or '/'
+
+        if path == '/reload':
+            if method != 'POST':
+                return 405, {'error': 'use POST'}
+            reloaded = await self.reload(force=True)
+            return 200, {'reloaded': reloaded, 'generation': self.dataset.generation}
+
+        if method != 'GET':
+            return 405, {'error': 'use GET'}
+
+        dataset = self.dataset
+        if path == '/health':
+            return 200, {
+                'status': 'ok',
+                'generation': dataset.generation,
+                'loadedAt': dataset.loaded_at,
+                'cells': len(dataset.cube),
+                'days': len(dataset.cube.days()),
+                'cache': self.cache.stats(),
+            }
+        if path == '/query':
+            started = time.perf_counter()
+            try:
+                dataset, query, rows, cached = await self.query(parse_qs(url.query))
+            except QueryError as e:
+                return 400, {'error': str(e)}
+            return 200, {
+                'generation': dataset.generation,
+                'query': _query_dict(query),
+                'cached': cached,
+                'elapsedMs': round((time.perf_counter() - started) * 1000, 3),
+                'rows': rows,
+            }
+        if path == '/sections':
+            return 200, {'generation': dataset.generation, 'sections': list(dataset.sections)}
+        if path.startswith('/sections/'):
+            name = unquote(path[len('/sections/'):])
+            if name not in dataset.sections:
+                return 404, {'error': f"unknown section: {name}"}
+            return 200, dataset.sections[name]
+
+        return 404, {'error': f"not found: {path}"}
+
+    async def handle_connection(self, reader, writer):
+        """HTTP/1.1 の接続を処理する（keep-alive に対応、リクエストボディは読み捨てる）"""
+        self._connections.add(writer)
+        try:
+            while True:
+                request_line = await asyncio.wait_for(reader.readline(), KEEP_ALIVE_TIMEOUT)
+                if not request_line.strip():
+                    break
+                parts = request_line.decode('latin-1').split()
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length:
+                    await reader.readexactly(length)
+
+                if len(parts) != 3:
+                    status, body = 400, {'error': 'malformed request line'}
+                    keep_alive = False
+                else:
+                    method, target, version = parts
+                    keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                    try:
+                        status, body = await self.dispatch(method, target)
+                    except Exception as e:
+                        print(f"⚠️  {method} {target} failed: {e}")
+                        status, body = 500, {'error': 'internal error'}
+
+                payload = json.dumps(body, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+                writer.write((
+                    f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n"
+                    "Content-Type: application/json; charset=utf-8\r\n"
+                    f"Content-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                    "\r\n"
+                ).encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, ValueError):
+            # 待ち時間切れ・途中で切れた接続・長すぎる行・不正な Content-Length は接続を閉じるだけ
+            pass
+        finally:
+            self._connections.discard(writer)
+            writer.close()
+
+    def close_connections(self):
+        for writer in list(self._connections):
+            writer.close()
+
+
+async def serve(service, host=DEFAULT_HOST, port=DEFAULT_PORT, poll_interval=DEFAULT_POLL_INTERVAL):
+    """データセットを読み込んでサーバーを起動し、SIGINT / SIGTERM まで応答する"""
+    await service.reload(force=True)
+    if service.dataset is None:
+        print("Error: no dataset to serve")
+        return 1
+
+    try:
+        server = await asyncio.start_server(service.handle_connection, host, port)
+    except OSError as e:
+        print(f"Error: cannot listen on {host}:{port}: {e}")
+        return 1
+    print(f"✅ Serving queries on http://{host}:{port} (Ctrl+C to stop)")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signal_number in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signal_number, stop.set)
+        except NotImplementedError:  # Windows ではシグナルハンドラを登録できない（Ctrl+C は KeyboardInterrupt）
+            pass
+
+    watcher = asyncio.create_task(service.watch(poll_interval)) if poll_interval > 0 else None
+    try:
+        await stop.wait()
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+        server.close()
+        service.close_connections()
+        await server.wait_closed()
+    print("✅ Query server stopped")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve filtered queries over the aggregated data from memory')
+    parser.add_argument('--host', default=DEFAULT_HOST, help='address to listen on')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on')
+    parser.add_argument('--cube', default=ROLLUP_CUBE_PATH, help='path of the rollup cube')
+    parser.add_argument('--sections-dir', default=SECTIONS_DIR, help='directory of the dashboard sections')
+    parser.add_argument('--from-raw', nargs='?', const=data_aggregator.RAW_DATA_PATH, metavar='PATH',
+                        help='build the rollup cube from the raw data instead of reading the saved cube')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE,
+                        help='number of query results to keep (0 disables the cache)')
+    parser.add_argument('--poll', type=float, default=DEFAULT_POLL_INTERVAL, metavar='SECONDS',
+                        help='how often to check the inputs for a new aggregation (0 disables hot reload)')
+    args = parser.parse_args()
+
+    service = QueryService(args.cube, args.sections_dir, raw_path=args.from_raw, cache_size=args.cache_size)
+    try:
+        sys.exit(asyncio.run(serve(service, args.host, args.port, args.poll)))
+    except KeyboardInterrupt:
+        print("✅ Query server stopped")
+
+
+if __name__ == '__main__':
+    main()
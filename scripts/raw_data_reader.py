@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Raw Data Reader
+raw_data.json（{user_id: user_data, ...}）または raw snapshot（raw_data.snap）を1ユーザーずつ読み込む
+
+ファイル全体を json.load せずに、ユーザー1人分ずつ辞書に変換して返すため、
+使用メモリはユーザー数ではなく最大のユーザー1人分のデータ量で決まる。
+"""
+
+import json
+import re
+
+from raw_snapshot import is_snapshot, iter_snapshot_shards, iter_snapshot_users
+
+# 非インデント形式のファイルを読み込む単位（文字数）
+CHUNK_SIZE = 1 << 20
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+def iter_raw_users(input_path):
+    """
+    raw_data.json の (user_id, user_data) を1件ずつ返すジェネレータ
+
+    firebase_collector が書き出すインデント付きの形式は行単位で区切って読み、
+    それ以外（1行のJSONなど）はチャンク単位で読みながら1件ずつデコードする。
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        first_line = f.readline()
+        if first_line.strip() == '{':
+            yield from _iter_indented(f)
+        else:
+            f.seek(0)
+            yield from _iter_compact(f)
+
+
+def _member_text(lines):
+    """トップレベルの1メンバー分の行を '"user_id": {...}' の文字列にする"""
+    text = ''.join(lines).rstrip()
+    if text.endswith(','):
+        text = text[:-1]
+    return text
+
+
+def _decode_member(text):
+    """'"user_id": {...}' の文字列をデコード"""
+    member = json.loads('{' + text + '}')
+    if len(member) != 1:
+        raise ValueError('raw data member spans an unexpected number of keys')
+    return next(iter(member.items()))
+
+
+def _iter_indented_members(f):
+    """
+    インデント付きの形式のトップレベルのメンバーを文字列のまま返す（先頭の '{' の行は読み込み済み）
+
+    トップレベルのメンバーは同じ深さの '"' で始まる行から始まり、それより深い行は全てそのメンバーの一部になる。
+    JSON の文字列は改行を含まないため、行の先頭だけを見れば区切りが分かる。
+    """
+    member_prefix = None
+    lines = []
+
+    for line in f:
+        if line.startswith('}'):
+            break
+
+        if member_prefix is None:
+            stripped = line.lstrip(' \t')
+            if not stripped.startswith('"'):
+                continue
+            member_prefix = line[:len(line) - len(stripped)] + '"'
+
+        if line.startswith(member_prefix) and lines:
+            yield _member_text(lines)
+            lines = []
+        lines.append(line)
+
+    if lines:
+        yield _member_text(lines)
+
+
+def _iter_indented(f):
+    """インデント付きの形式を1ユーザーずつデコードする"""
+    for text in _iter_indented_members(f):
+        yield _decode_member(text)
+
+
+def iter_raw_shards(input_path, shard_size):
+    """
+    raw_data.json を shard_size 人ずつの JSON 文字列（{user_id: user_data, ...}）に分ける
+
+    インデント付きの形式はデコードせずに行を連結するだけなので、
+    デコードは文字列を受け取った側（並列集計のワーカー）で行われる。
+    """
+    with open(input_path, 'r', encoding='utf-8') as f:
+        first_line = f.readline()
+        if first_line.strip() == '{':
+            members = []
+            for text in _iter_indented_members(f):
+                members.append(text)
+                if len(members) >= shard_size:
+                    yield '{' + ','.join(members) + '}'
+                    members = []
+            if members:
+                yield '{' + ','.join(members) + '}'
+            return
+
+        f.seek(0)
+        shard = {}
+        for user_id, user_data in _iter_compact(f):
+            shard[user_id] = user_data
+            if len(shard) >= shard_size:
+                yield json.dumps(shard, ensure_ascii=False)
+                shard = {}
+        if shard:
+            yield json.dumps(shard, ensure_ascii=False)
+
+
+class _StreamBuffer:
+    """ファイルを必要な分だけ読み足しながら JSON の値を1つずつデコードする"""
+
+    def __init__(self, f, chunk_size):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.text = ''
+        self.pos = 0
+
+    def read_more(self):
+        """デコード済みの部分を捨てて読み足す（ファイル末尾なら False）"""
+        self.text = self.text[self.pos:]
+        self.pos = 0
+        # 未処理部分と同じ量を読み足すことで、大きな値でも再デコードの回数を対数回に抑える
+        chunk = self.f.read(max(self.chunk_size, len(self.text)))
+        if not chunk:
+            return False
+        self.text += chunk
+        return True
+
+    def peek(self):
+        """空白を飛ばして次の文字を返す（ファイル末尾なら ''）"""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text) or not self.read_more():
+                return self.text[self.pos:self.pos + 1]
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"expected {char!r} in raw data but found {found!r}")
+        self.pos += 1
+
+    def decode(self):
+        """次の値を1つデコードする"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.text, self.pos)
+            except json.JSONDecodeError:
+                if self.read_more():
+                    continue
+                raise
+            # バッファの末尾で終わった数値などは続きがある可能性がある
+            if end == len(self.text) and self.read_more():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_compact(f, chunk_size=CHUNK_SIZE):
+    """インデントの無い形式をチャンク単位で読む"""
+    buffer = _StreamBuffer(f, chunk_size)
+    buffer.expect('{')
+    if buffer.peek() == '}':
+        return
+
+    while True:
+        user_id = buffer.decode()
+        if not isinstance(user_id, str):
+            raise ValueError('raw data keys must be strings')
+        buffer.expect(':')
+        yield user_id, buffer.decode()
+
+        if buffer.peek() == ',':
+            buffer.pos += 1
+        else:
+            buffer.expect('}')
+            return
+
+
+class RawDataReader:
+    """
+    raw_data.json / raw snapshot を辞書の代わりに集計へ渡すためのラッパー
+
+    items() を呼ぶたびにファイルを先頭から読み直すため、
+    増分集計から全件の再集計に切り替える場合のように複数回走査できる。
+    """
+
+    def __init__(self, input_path):
+        self.input_path = input_path
+        self.snapshot = is_snapshot(input_path)
+
+    def items(self):
+        if self.snapshot:
+            return iter_snapshot_users(self.input_path)
+        return iter_raw_users(self.input_path)
+
+    def shards(self, shard_size):
+        """並列集計用に shard_size 人ずつのシャード（JSON 文字列または辞書）を返す"""
+        if self.snapshot:
+            return iter_snapshot_shards(self.input_path, shard_size)
+        return iter_raw_shards(self.input_path, shard_size)
+
+    def __iter__(self):
+        return (user_id for user_id, _ in self.items())
+
+    def __bool__(self):
+        # 辞書と同じく、ユーザーが1人もいなければ偽（先頭の1件だけを読む）
+        return next(iter(self.items()), None) is not None
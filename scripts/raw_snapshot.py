@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Raw Snapshot
+Firebase の users/ を保存するコンパクトな圧縮バイナリ形式（raw_data.snap）
+
+ファイルは gzip 圧縮され、先頭のヘッダーの後にユーザー SHARD_SIZE 人ごとのフレームが続く。
+各フレームは [(user_id, user_data), ...] の pickle で、書き込み前に文字列をインターンするため
+フィールド名や 'Clear'・'Normal'・'GameEnd_D01ihuu' などの繰り返し現れる値はフレーム内で1回だけ保存される。
+読み込み時は辞書・リスト・文字列・数値以外のオブジェクトを復元しない（任意のクラスは読み込めない）。
+
+raw_data.json との相互変換:
+
+    python scripts/raw_snapshot.py to-json public/data/raw_data.snap public/data/raw_data.json
+    python scripts/raw_snapshot.py from-json public/data/raw_data.json public/data/raw_data.snap
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import pickle
+
+MAGIC = b'GAMES-DASHBOARD-RAW-SNAPSHOT\n'
+FORMAT_VERSION = 1
+
+# 1フレームに入れるユーザー数
+SHARD_SIZE = 500
+
+# 圧縮レベル（書き込み時間とサイズのバランス）
+COMPRESS_LEVEL = 6
+
+
+class _DataUnpickler(pickle.Unpickler):
+    """組み込みのデータ型だけを復元する Unpickler"""
+
+    def find_class(self, module, name):
+        raise pickle.UnpicklingError(f"raw snapshot must not contain objects ({module}.{name})")
+
+
+def is_snapshot(path):
+    """path が raw snapshot 形式のファイルか"""
+    try:
+        with gzip.open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except (OSError, EOFError):
+        return False
+
+
+def _intern(value, intern):
+    """value 内の文字列を intern（strings.setdefault）が返す共有の文字列オブジェクトに置き換えたコピーを返す"""
+    value_type = type(value)
+    if value_type is dict:
+        interned = {}
+        for key, item in value.items():
+            item_type = type(item)
+            if item_type is str:
+                item = intern(item, item)
+            elif item_type is dict or item_type is list:
+                item = _intern(item, intern)
+            interned[intern(key, key) if type(key) is str else key] = item
+        return interned
+    if value_type is list:
+        return [_intern(item, intern) for item in value]
+    if value_type is str:
+        return intern(value, value)
+    return value
+
+
+def write_snapshot(users_items, output_path, shard_size=SHARD_SIZE):
+    """
+    (user_id, user_data) の列を raw snapshot として保存し、ユーザー数を返す
+
+    書き込み途中で失敗しても前回のファイルが壊れないように一時ファイルから置き換える。
+    """
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+
+    tmp_path = f"{output_path}.tmp"
+    user_count = 0
+    # mtime=0: 同じ内容なら同じバイト列になるようにする（pipeline.py はファイルのハッシュで変更を検出する）
+    with gzip.GzipFile(tmp_path, 'wb', compresslevel=COMPRESS_LEVEL, mtime=0) as f:
+        f.write(MAGIC)
+        pickle.dump({'version': FORMAT_VERSION}, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        strings = {}
+        frame = []
+        for user_id, user_data in users_items:
+            frame.append((user_id, _intern(user_data, strings.setdefault)))
+            if len(frame) >= shard_size:
+                pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+                user_count += len(frame)
+                frame = []
+                # pickle の参照はフレーム内でしか効かないため、文字列のテーブルもフレームごとに作り直す
+                strings = {}
+        if frame:
+            pickle.dump(frame, f, protocol=pickle.HIGHEST_PROTOCOL)
+            user_count += len(frame)
+    os.replace(tmp_path, output_path)
+
+    return user_count
+
+
+def iter_snapshot_frames(input_path):
+    """raw snapshot のフレーム（[(user_id, user_data), ...]）を順に返す"""
+    with gzip.open(input_path, 'rb') as gz:
+        f = io.BufferedReader(gz, buffer_size=1 << 20)
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{input_path} is not a raw snapshot")
+
+        unpickler = _DataUnpickler(f)
+        header = unpickler.load()
+        if header.get('version') != FORMAT_VERSION:
+            raise ValueError(f"unsupported raw snapshot version: {header.get('version')}")
+
+        while True:
+            try:
+                frame = _DataUnpickler(f).load()
+            except EOFError:
+                return
+            yield frame
+
+
+def iter_snapshot_users(input_path):
+    """raw snapshot の (user_id, user_data) を1件ずつ返す"""
+    for frame in iter_snapshot_frames(input_path):
+        yield from frame
+
+
+def iter_snapshot_shards(input_path, shard_size):
+    """raw snapshot を shard_size 人ずつの {user_id: user_data} に分ける"""
+    shard = {}
+    for user_id, user_data in iter_snapshot_users(input_path):
+        shard[user_id] = user_data
+        if len(shard) >= shard_size:
+            yield shard
+            shard = {}
+    if shard:
+        yield shard
+
+
+def load_snapshot(input_path):
+    """raw snapshot 全体を {user_id: user_data} として読み込む"""
+    return dict(iter_snapshot_users(input_path))
+
+
+def convert_json_to_snapshot(json_path, snapshot_path):
+    """raw_data.json を raw snapshot に変換し、ユーザー数を返す"""
+    from raw_data_reader import iter_raw_users
+
+    return write_snapshot(iter_raw_users(json_path), snapshot_path)
+
+
+def convert_snapshot_to_json(snapshot_path, json_path):
+    """raw snapshot を従来の raw_data.json（indent=2）に変換し、ユーザー数を返す"""
+    data = load_snapshot(snapshot_path)
+    os.makedirs(os.path.dirname(json_path) or '.', exist_ok=True)
+
+    with open(json_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+
+    return len(data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert between raw_data.json and the raw snapshot format')
+    parser.add_argument('direction', choices=('to-json', 'from-json'))
+    parser.add_argument('input_path')
+    parser.add_argument('output_path')
+    args = parser.parse_args()
+
+    if args.direction == 'to-json':
+        user_count = convert_snapshot_to_json(args.input_path, args.output_path)
+    else:
+        user_count = convert_json_to_snapshot(args.input_path, args.output_path)
+
+    print(f"✅ Converted {user_count} users: {args.input_path} → {args.output_path}")
+
+
+if __name__ == '__main__':
+    main()
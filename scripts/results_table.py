@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Results Table
+users → results → {フィールド: 値} の入れ子辞書を1回だけ平坦化した列指向テーブル
+文字列フィールドは辞書エンコードした整数配列として保持し、集計を NumPy のベクトル演算で行う
+"""
+
+from array import array
+
+try:
+    import numpy as np
+except ImportError:  # NumPy が無い環境では data_aggregator が従来のアキュムレータで集計する
+    np = None
+
+from aggregation_engine import Accumulator
+
+NUMPY_AVAILABLE = np is not None
+
+# 辞書エンコードする文字列フィールド
+ENCODED_FIELDS = ('character', 'difficulty', 'gameType', 'clearRank', 'clearType', 'platform', 'costume')
+
+# 値が無い（または偽値の）セルのコード
+MISSING = -1
+
+# 集計対象の日付（'YYYY-MM-DD'、除外対象は MISSING）の列。results のフィールドと同じく辞書エンコードする
+DAY_COLUMN = 'day'
+
+
+class ResultsTableBuilder(Accumulator):
+    """
+    1パス集計中に results を列へ追記し、ResultsTable を組み立てる
+
+    table() を呼ぶとそれまでに追記された行を1つのバッチとして確定し、
+    以降に追記された行は次のバッチになる（増分集計で未来日付の行を後から追加する場合など）。
+    """
+
+    def __init__(self):
+        self.dictionaries = {field: {} for field in (*ENCODED_FIELDS, DAY_COLUMN)}
+        self.user_ids = []
+        self._user_positions = {}
+        self._batch = -1
+        self._table = None
+        self._start_batch()
+
+    def _start_batch(self):
+        self.codes = {field: array('i') for field in (*ENCODED_FIELDS, DAY_COLUMN)}
+        self.scores = array('d')
+        self.score_valid = array('b')
+        self.clear_rates = array('h')
+        self.user_index = array('i')
+        self.non_dict_count = 0
+        self._dirty = False
+        # 行追加ループで使う (フィールド名, 値→コード辞書, 列の append) の組
+        self._encoders = [
+            (field, self.dictionaries[field], self.codes[field].append) for field in ENCODED_FIELDS
+        ]
+
+    def add_result(self, user_id, result_id, result_data, day):
+        self._dirty = True
+        if not isinstance(result_data, dict):
+            self.non_dict_count += 1
+            return
+
+        for field, dictionary, append in self._encoders:
+            value = result_data.get(field)
+            if value:
+                code = dictionary.get(value)
+                if code is None:
+                    code = dictionary[value] = len(dictionary)
+                append(code)
+            else:
+                append(MISSING)
+
+        if day is None:
+            self.codes[DAY_COLUMN].append(MISSING)
+        else:
+            day_dictionary = self.dictionaries[DAY_COLUMN]
+            code = day_dictionary.get(day)
+            if code is None:
+                code = day_dictionary[day] = len(day_dictionary)
+            self.codes[DAY_COLUMN].append(code)
+
+        # スコア（数値に変換できない場合は無効）
+        score = result_data.get('score')
+        try:
+            self.scores.append(float(score) if score is not None else 0.0)
+            self.score_valid.append(score is not None)
+        except (ValueError, TypeError):
+            self.scores.append(0.0)
+            self.score_valid.append(False)
+
+        # clearRate（0-100の範囲外・変換不能は無効）
+        clear_rate = result_data.get('clearRate')
+        rate_value = MISSING
+        if clear_rate is not None:
+            try:
+                rate_value = int(clear_rate)
+            except (ValueError, TypeError):
+                pass
+            if not 0 <= rate_value <= 100:
+                rate_value = MISSING
+        self.clear_rates.append(rate_value)
+
+        # ユーザー番号（初出順）
+        position = self._user_positions.get(user_id)
+        if position is None:
+            position = self._user_positions[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        self.user_index.append(position)
+
+    def table(self):
+        """未確定の行をバッチとして確定して返す（新しい行が無ければ前回のバッチを返す）"""
+        if self._table is None or self._dirty:
+            self._batch += 1
+            self._table = ResultsTable(
+                batch=self._batch,
+                columns={field: np.frombuffer(codes, dtype=np.int32) for field, codes in self.codes.items()},
+                values={field: list(dictionary) for field, dictionary in self.dictionaries.items()},
+                scores=np.frombuffer(self.scores, dtype=np.float64),
+                score_valid=np.frombuffer(self.score_valid, dtype=np.int8).astype(bool),
+                clear_rates=np.frombuffer(self.clear_rates, dtype=np.int16),
+                user_index=np.frombuffer(self.user_index, dtype=np.int32),
+                user_ids=self.user_ids,
+                non_dict_count=self.non_dict_count,
+            )
+            self._start_batch()
+        return self._table
+
+    def result(self):
+        return None
+
+
+class ResultsTable:
+    """
+    列指向の results テーブル（辞書型の results 1件 = 1行）
+
+    columns[field] はコードの配列で、values[field][code] が元の値。
+    コードは初出順に振られるため、コード順に並べると従来の Counter の挿入順と一致する。
+    user_index は user_ids（初出順のユーザーID）への添字。
+    """
+
+    def __init__(self, batch, columns, values, scores, score_valid, clear_rates, user_index, user_ids, non_dict_count):
+        self.batch = batch
+        self.columns = columns
+        self.values = values
+        self.scores = scores
+        self.score_valid = score_valid
+        self.clear_rates = clear_rates
+        self.user_index = user_index
+        self.user_ids = user_ids
+        self.non_dict_count = non_dict_count
+
+    @property
+    def row_count(self):
+        return len(self.user_index)
+
+    def _group_keys(self, fields):
+        """fields の全てに値がある行のマスクと、値の組を合成した整数キー"""
+        columns = [self.columns[field] for field in fields]
+        mask = np.ones(self.row_count, dtype=bool)
+        for column in columns:
+            mask &= column >= 0
+
+        keys = np.zeros(int(mask.sum()), dtype=np.int64)
+        sizes = [max(len(self.values[field]), 1) for field in fields]
+        for column, size in zip(columns, sizes):
+            keys = keys * size + column[mask]
+        return mask, keys, sizes
+
+    def _decode(self, fields, sizes, key):
+        """合成した整数キーを値のタプルに戻す"""
+        codes = []
+        for size in reversed(sizes):
+            key, code = divmod(key, size)
+            codes.append(code)
+        return tuple(self.values[field][code] for field, code in zip(fields, reversed(codes)))
+
+    def group_counts(self, fields):
+        """
+        fields の値の組ごとの件数を初出順で返す
+
+        fields の全てに値がある行だけを対象とし、[(値のタプル, 件数), ...] を返す。
+        """
+        _, keys, sizes = self._group_keys(fields)
+        unique_keys, first_index, counts = np.unique(keys, return_index=True, return_counts=True)
+
+        return [
+            (self._decode(fields, sizes, int(unique_keys[position])), int(counts[position]))
+            for position in np.argsort(first_index, kind='stable')
+        ]
+
+    def group_users(self, fields):
+        """fields の値の組ごとのユニークユーザーIDのリストを初出順で返す"""
+        mask, keys, sizes = self._group_keys(fields)
+        unique_keys, first_index = np.unique(keys, return_index=True)
+
+        # (値の組, ユーザー) の重複を除き、値の組ごとに区切る
+        user_count = max(len(self.user_ids), 1)
+        pairs = np.unique(keys * user_count + self.user_index[mask])
+        group_of_pair = np.searchsorted(unique_keys, pairs // user_count)
+        bounds = np.searchsorted(group_of_pair, np.arange(len(unique_keys) + 1))
+        users = (pairs % user_count).tolist()
+
+        user_ids = self.user_ids
+        return [
+            (
+                self._decode(fields, sizes, int(unique_keys[position])),
+                [user_ids[index] for index in users[bounds[position]:bounds[position + 1]]]
+            )
+            for position in np.argsort(first_index, kind='stable')
+        ]
+
+    def valid_scores(self):
+        """数値に変換できたスコア（行順）"""
+        return self.scores[self.score_valid]
+
+    def clear_rate_histogram(self):
+        """0-100 の clearRate ごとの行数"""
+        return np.bincount(self.clear_rates[self.clear_rates >= 0], minlength=101).tolist()
+
+    def cube_cells(self, fields, clear_values):
+        """
+        日付と fields の値の組ごとの (値のタプル, プレイ数, スコアの合計, 有効なスコアの件数, クリア数) を初出順に返す
+
+        group_counts と違い値が無い行も含め、値のタプルでは None にする（先頭は日付、集計対象外なら None）。
+        クリア数は clearType が clear_values のプレイ数。
+        """
+        columns = [self.columns[DAY_COLUMN]] + [self.columns[field] for field in fields]
+        values = [self.values[DAY_COLUMN]] + [self.values[field] for field in fields]
+
+        # 列を1つずつ合成し、そのたびに番号を詰め直して整数キーの桁あふれを防ぐ
+        groups = np.zeros(self.row_count, dtype=np.int64)
+        for column, field_values in zip(columns, values):
+            groups = groups * (len(field_values) + 1) + (column + 1)
+            groups = np.unique(groups, return_inverse=True)[1].reshape(-1)
+        _, first_rows = np.unique(groups, return_index=True)
+        group_count = len(first_rows)
+
+        plays = np.bincount(groups, minlength=group_count)
+        score_sums = np.bincount(groups, weights=np.where(self.score_valid, self.scores, 0.0), minlength=group_count)
+        score_counts = np.bincount(groups, weights=self.score_valid, minlength=group_count)
+        clear_codes = [
+            code for code, value in enumerate(self.values['clearType']) if value in clear_values
+        ]
+        clears = np.bincount(groups[np.isin(self.columns['clearType'], clear_codes)], minlength=group_count)
+
+        # 初出順のグループごとに各列の値を取り出す（値が無いセルは None）
+        order = np.argsort(first_rows, kind='stable')
+        rows = first_rows[order]
+        keys = zip(*[
+            [None if code < 0 else field_values[code] for code in column[rows].tolist()]
+            for column, field_values in zip(columns, values)
+        ])
+        return zip(
+            keys, plays[order].tolist(), score_sums[order].tolist(),
+            score_counts[order].astype(np.int64).tolist(), clears[order].tolist()
+        )
+
+    def user_tallies(self, clear_values):
+        """ユーザーごとの (ユーザーID, プレイ数, clearType が clear_values のプレイ数)（初出順）"""
+        column = self.columns['clearType']
+        clear_codes = [
+            code for code, value in enumerate(self.values['clearType']) if value in clear_values
+        ]
+        user_count = len(self.user_ids)
+        totals = np.bincount(self.user_index, minlength=user_count)
+        clears = np.bincount(self.user_index[np.isin(column, clear_codes)], minlength=user_count)
+
+        return [
+            (self.user_ids[index], int(totals[index]), int(clears[index]))
+            for index in np.flatnonzero(totals)
+        ]
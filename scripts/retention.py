@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Retention
+日別アクティブユーザーのビットマップと、そこから求めるリテンション（D1/D7/D30）・週別コホート
+
+ユーザーIDを初出順の連番に置き換え、日ごとにアクティブなユーザーの連番のビットを立てる（1ユーザー1日1ビット）。
+ある日に初めてアクティブになったユーザー（コホート）のうち n 日後もアクティブだった人数は
+2つのビットマップの AND と popcount で求まるため、日付 × ユーザーの組を数え直さずに済む。
+"""
+
+import base64
+from datetime import date, timedelta
+
+# リテンションを求める日数（初日の n 日後にアクティブだった割合）
+RETENTION_DAYS = (1, 7, 30)
+
+# ローリングアクティブユーザーの名前 → 日数（その日を含む直近 n 日間に起動したユーザー数）
+ROLLING_WINDOWS = {'wau': 7, 'mau28': 28, 'mau': 30}
+# stickiness（DAU / MAU）の分母
+STICKINESS_WINDOW = 'mau'
+
+# バイトの値ごとの立っているビットの位置
+_BYTE_BITS = [tuple(bit for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+
+def _shift_day(day, days):
+    return (date.fromisoformat(day) + timedelta(days=days)).isoformat()
+
+
+def _week_start(day):
+    """day を含む週の月曜日"""
+    value = date.fromisoformat(day)
+    return (value - timedelta(days=value.weekday())).isoformat()
+
+
+def _rate(count, total):
+    return round(count / total * 100, 2) if total else 0
+
+
+class ActivityBitmaps:
+    """
+    日別のアクティブユーザーのビットマップ
+
+    days[day] はユーザーの連番 n のビット（n // 8 バイト目の n % 8 ビット）を立てた bytearray。
+    user_ids[n] が連番 n のユーザーID。
+    """
+
+    def __init__(self):
+        self.user_ids = []
+        self._positions = {}
+        self.days = {}
+
+    def position(self, user_id):
+        """ユーザーの連番（初出なら末尾に追加）"""
+        position = self._positions.get(user_id)
+        if position is None:
+            position = self._positions[user_id] = len(self.user_ids)
+            self.user_ids.append(user_id)
+        return position
+
+    def add(self, position, day):
+        """連番 position のユーザーを day のアクティブユーザーにする"""
+        bitmap = self.days.get(day)
+        if bitmap is None:
+            bitmap = self.days[day] = bytearray()
+        byte = position >> 3
+        if byte >= len(bitmap):
+            bitmap.extend(bytes(byte + 1 - len(bitmap)))
+        bitmap[byte] |= 1 << (position & 7)
+
+    def positions(self, day):
+        """day にアクティブだったユーザーの連番（昇順）"""
+        positions = []
+        for byte_index, byte in enumerate(self.days.get(day, b'')):
+            if byte:
+                base = byte_index << 3
+                positions.extend([base + bit for bit in _BYTE_BITS[byte]])
+        return positions
+
+    def bitmap(self, day):
+        """day のビットマップ（int、ビット n が連番 n のユーザー）"""
+        return int.from_bytes(self.days.get(day, b''), 'little')
+
+    def _set_bitmap(self, day, value):
+        self.days[day] = bytearray(value.to_bytes((value.bit_length() + 7) // 8, 'little'))
+
+    def merge(self, other):
+        """
+        別のビットマップを結合する
+
+        ユーザーが重ならない場合（並列集計のシャード）は other の連番を後ろにずらしてそのまま OR する。
+        """
+        offset = len(self.user_ids)
+        if any(user_id in self._positions for user_id in other.user_ids):
+            # 重なるユーザーがいれば連番を付け直してビットを1つずつ移す
+            positions = [self.position(user_id) for user_id in other.user_ids]
+            for day in other.days:
+                for position in other.positions(day):
+                    self.add(positions[position], day)
+            return
+
+        for user_id in other.user_ids:
+            self.position(user_id)
+        for day in other.days:
+            self._set_bitmap(day, self.bitmap(day) | other.bitmap(day) << offset)
+
+    def to_state(self):
+        return {
+            'users': self.user_ids,
+            'days': {day: base64.b64encode(bytes(bitmap)).decode('ascii') for day, bitmap in self.days.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        activity = cls()
+        for user_id in state['users']:
+            activity.position(user_id)
+        activity.days = {day: bytearray(base64.b64decode(bitmap)) for day, bitmap in state['days'].items()}
+        return activity
+
+
+def retention_summary(activity, retention_days=RETENTION_DAYS):
+    """
+    リテンションのセクション
+
+    コホートは初めてアクティブになった日（週）のユーザー。
+    daily は日ごとの新規ユーザー数と retention_days ごとのリテンション（%、その日がデータの最終日より後なら None）、
+    overall は観測できたコホート全体での値、weeklyCohorts はコホートの週ごとの k 週後にアクティブだった割合
+    （最後の週はデータの最終日までの途中の値）。
+    """
+    days = sorted(activity.days)
+    bitmaps = {day: activity.bitmap(day) for day in days}
+    last_day = days[-1] if days else None
+
+    # 日ごとのコホート（それまでにアクティブだったユーザーを除く）
+    cohorts = {}
+    seen = 0
+    for day in days:
+        cohorts[day] = bitmaps[day] & ~seen
+        seen |= bitmaps[day]
+
+    daily = []
+    cohort_users = [0] * len(retention_days)
+    retained_users = [0] * len(retention_days)
+    for day in days:
+        cohort = cohorts[day]
+        size = cohort.bit_count()
+        rates = []
+        for index, offset in enumerate(retention_days):
+            target = _shift_day(day, offset)
+            if target > last_day:
+                rates.append(None)
+                continue
+            retained = (cohort & bitmaps.get(target, 0)).bit_count()
+            cohort_users[index] += size
+            retained_users[index] += retained
+            rates.append(_rate(retained, size))
+        daily.append({'date': day, 'newUsers': size, 'retention': rates})
+
+    # 週別コホート（アクティブな日が無い週も 0 として並べる）
+    weeks = []
+    if days:
+        week = _week_start(days[0])
+        while week <= last_day:
+            weeks.append(week)
+            week = _shift_day(week, 7)
+    week_active = {week: 0 for week in weeks}
+    week_cohorts = {week: 0 for week in weeks}
+    for day in days:
+        week = _week_start(day)
+        week_active[week] |= bitmaps[day]
+        week_cohorts[week] |= cohorts[day]
+
+    weekly = []
+    for index, week in enumerate(weeks):
+        cohort = week_cohorts[week]
+        size = cohort.bit_count()
+        if not size:
+            continue
+        weekly.append({
+            'week': week,
+            'newUsers': size,
+            'retention': [_rate((cohort & week_active[later]).bit_count(), size) for later in weeks[index:]],
+        })
+
+    return {
+        'days': list(retention_days),
+        'overall': [
+            {'day': offset, 'cohortUsers': cohort_users[index], 'retainedUsers': retained_users[index],
+             'rate': _rate(retained_users[index], cohort_users[index])}
+            for index, offset in enumerate(retention_days)
+        ],
+        'daily': daily,
+        'weeklyCohorts': weekly,
+    }
+
+
+def rolling_active_users(activity, windows=ROLLING_WINDOWS):
+    """
+    日ごとの直近 n 日間のアクティブユーザー数と stickiness（DAU / MAU、%）
+
+    行は dailyActiveUsers と同じ日付（起動があった日）の昇順で、窓は起動が無かった日も含めた暦日で数える。
+    窓ごとにユーザーの参照カウント（窓の中でアクティブだった日数）を持ち、日を1つ進めるたびに
+    窓に入る日のユーザーを足して窓から出る日のユーザーを引くため、時間はユーザー × 日の数に比例する。
+    """
+    days = sorted(activity.days)
+    if not days:
+        return []
+
+    refcounts = {name: [0] * len(activity.user_ids) for name in windows}
+    active = dict.fromkeys(windows, 0)
+    longest = max(windows.values())
+    # 窓に残っている日のユーザーの連番（窓から出たら捨てる）
+    window_positions = {}
+
+    rows = []
+    current = date.fromisoformat(days[0])
+    last = date.fromisoformat(days[-1])
+    while current <= last:
+        day = current.isoformat()
+        entering = activity.positions(day) if day in activity.days else None
+        window_positions[current] = entering
+
+        for name, size in windows.items():
+            counts = refcounts[name]
+            if entering:
+                for position in entering:
+                    if not counts[position]:
+                        active[name] += 1
+                    counts[position] += 1
+            leaving = window_positions.get(current - timedelta(days=size))
+            if leaving:
+                for position in leaving:
+                    counts[position] -= 1
+                    if not counts[position]:
+                        active[name] -= 1
+
+        if entering is not None:
+            rows.append({
+                'date': day,
+                'dau': len(entering),
+                **active,
+                'stickiness': _rate(len(entering), active[STICKINESS_WINDOW]),
+            })
+        window_positions.pop(current - timedelta(days=longest), None)
+        current += timedelta(days=1)
+
+    return rows
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Rollup Cube
+プレイ記録（results）を 日付 × 楽曲 × 難易度 × キャラクター × Platform × Costume × クリアランク の
+組ごとに事前集計したキューブ（プレイ数・スコアの合計と件数・クリア数）
+
+    python scripts/rollup_cube.py --by platform --days 7            # 直近7日間の Platform 別
+    python scripts/rollup_cube.py --by gameType difficulty --since 2025-10-01 --until 2025-10-31
+    python scripts/rollup_cube.py --by character --where platform=Steam
+
+キャラクター別・楽曲×難易度別などの件数のセクションは、キューブを次元に沿って合計して求める。
+data_aggregator.py は集計のたびにキューブを public/data/rollup_cube.json.gz に保存するため、
+期間を絞った集計は生データを読み直さずにキューブから求められる。
+値が無い（または偽値の）次元は None として1つのセルにまとめ、日付が None のセルは集計対象外の日付
+（異常年・未来日付）のプレイ。同じ次元のキューブ同士はセルごとに足すだけで結合できる。
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+from datetime import date, timedelta
+from operator import itemgetter
+
+ROLLUP_CUBE_PATH = 'public/data/rollup_cube.json.gz'
+CUBE_VERSION = 1
+
+# セルのキーの次元（順番がキーのタプルの並び）と、セルごとの集計値
+DIMENSIONS = ('day', 'gameType', 'difficulty', 'character', 'platform', 'costume', 'clearRank')
+MEASURES = ('plays', 'scoreSum', 'scoreCount', 'clears')
+
+# results のフィールドから取る次元（day 以外）
+RESULT_DIMENSIONS = DIMENSIONS[1:]
+
+
+def _check_dimensions(dimensions):
+    """未知の次元があれば ValueError"""
+    unknown = [dimension for dimension in dimensions if dimension not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"unknown dimensions: {', '.join(unknown)} (expected {', '.join(DIMENSIONS)})")
+
+
+def _key_getter(indexes):
+    """キーのタプルから indexes の値のタプルを取り出す関数"""
+    if len(indexes) == 1:
+        index = indexes[0]
+        return lambda key: (key[index],)
+    return itemgetter(*indexes)
+
+
+def _project(cells, indexes):
+    """セル（(キー, 集計値) の列）を indexes の次元について合計する（値が None の次元も残す）"""
+    group_of = _key_getter(indexes)
+    projected = {}
+    for key, cell in cells:
+        group = group_of(key)
+        total = projected.get(group)
+        if total is None:
+            projected[group] = list(cell)
+        else:
+            total[0] += cell[0]
+            total[1] += cell[1]
+            total[2] += cell[2]
+            total[3] += cell[3]
+    return projected
+
+
+class RollupCube:
+    """{次元の値のタプル: [plays, scoreSum, scoreCount, clears]}（セルは初出順）"""
+
+    def __init__(self, cells=None):
+        self.cells = cells if cells is not None else {}
+        # 日付を合計したセル（日付で絞らない集計用、セルを追加したら作り直す）
+        self._all_days = None
+
+    def __len__(self):
+        return len(self.cells)
+
+    def add(self, key, plays=1, score_sum=0.0, score_count=0, clears=0):
+        """セル key（DIMENSIONS の順の値のタプル）に集計値を加える"""
+        self._all_days = None
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [plays, score_sum, score_count, clears]
+        else:
+            cell[0] += plays
+            cell[1] += score_sum
+            cell[2] += score_count
+            cell[3] += clears
+
+    def merge(self, other):
+        """別のキューブのセルを加える（other のセルの初出順で追加する）"""
+        for key, cell in other.cells.items():
+            self.add(key, *cell)
+
+    def days(self):
+        """集計対象の日付（昇順）"""
+        return sorted({key[0] for key in self.cells if key[0] is not None})
+
+    def rollup(self, dimensions, since=None, until=None, where=None):
+        """
+        dimensions 以外の次元を合計した {dimensions の値のタプル: [集計値]}（初出順）
+
+        since / until（'YYYY-MM-DD'、両端を含む）を指定すると集計対象の日付のセルだけを合計する。
+        where は {次元: 値 または 値の集合} の絞り込み。
+        dimensions のいずれかの値が None のセルは含めない（セクションが値の無いフィールドを数えないのと同じ）。
+        日付で絞らず日付でも分けない場合は、日付を合計したセル（日付の数だけ少ない）から求める。
+        """
+        where = where or {}
+        _check_dimensions([*dimensions, *where])
+        by_date = since is not None or until is not None
+
+        if by_date or 'day' in dimensions or 'day' in where:
+            cells = self.cells.items()
+        else:
+            if self._all_days is None:
+                # 日付の位置は None にして元のセルと同じ添字のまま合計する
+                self._all_days = _project(
+                    (((None, *key[1:]), cell) for key, cell in self.cells.items()), range(len(DIMENSIONS))
+                )
+            cells = self._all_days.items()
+
+        if by_date:
+            cells = (
+                (key, cell) for key, cell in cells
+                if key[0] is not None and (since is None or key[0] >= since) and (until is None or key[0] <= until)
+            )
+        if where:
+            filters = [
+                (DIMENSIONS.index(dimension),
+                 values if isinstance(values, (set, frozenset, list, tuple)) else {values})
+                for dimension, values in where.items()
+            ]
+            cells = (
+                (key, cell) for key, cell in cells
+                if all(key[index] in values for index, values in filters)
+            )
+
+        projected = _project(cells, [DIMENSIONS.index(dimension) for dimension in dimensions])
+        return {group: total for group, total in projected.items() if None not in group}
+
+    def rollup_rows(self, dimensions, since=None, until=None, where=None):
+        """rollup の結果を行の辞書のリストにする（平均スコア・クリア率を含め、プレイ数の降順）"""
+        rows = []
+        for group, (plays, score_sum, score_count, clears) in self.rollup(dimensions, since, until, where).items():
+            rows.append({
+                **dict(zip(dimensions, group)),
+                'plays': plays,
+                'averageScore': round(score_sum / score_count, 2) if score_count else 0,
+                'clears': clears,
+                'clearRate': round(clears / plays * 100, 2) if plays else 0,
+            })
+        rows.sort(key=lambda row: row['plays'], reverse=True)
+        return rows
+
+    def to_dict(self):
+        """
+        JSON 化できる形
+
+        values は次元ごとの値の一覧（初出順）、codes は次元ごとのセルの値の values での添字、
+        totals は集計値ごとのセルの値（セルの数がプレイ数に近い疎なキューブでも行ごとのリストを作らない）。
+        """
+        keys = list(self.cells)
+        values = []
+        codes = []
+        for index in range(len(DIMENSIONS)):
+            column = list(map(itemgetter(index), keys))
+            dimension_values = list(dict.fromkeys(column))
+            code_of = {value: code for code, value in enumerate(dimension_values)}
+            values.append(dimension_values)
+            codes.append(list(map(code_of.__getitem__, column)))
+
+        return {
+            'version': CUBE_VERSION,
+            'dimensions': list(DIMENSIONS),
+            'measures': list(MEASURES),
+            'values': values,
+            'codes': codes,
+            'totals': [list(totals) for totals in zip(*self.cells.values())] or [[] for _ in MEASURES],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        keys = zip(*[
+            [dimension_values[code] for code in dimension_codes]
+            for dimension_values, dimension_codes in zip(data['values'], data['codes'])
+        ])
+        return cls({key: list(cell) for key, cell in zip(keys, zip(*data['totals']))})
+
+
+def save_rollup_cube(cube_data, cube_path=ROLLUP_CUBE_PATH):
+    """キューブ（RollupCube.to_dict の値）を gzip 圧縮の JSON で保存（一時ファイル経由）"""
+    os.makedirs(os.path.dirname(cube_path) or '.', exist_ok=True)
+
+    # コードの列は繰り返しが多く、最大圧縮（compresslevel=9）では大きさがほぼ変わらずに時間だけかかる
+    payload = json.dumps(cube_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    temp_path = f"{cube_path}.tmp"
+    with open(temp_path, 'wb') as f:
+        f.write(gzip.compress(payload, compresslevel=6))
+    os.replace(temp_path, cube_path)
+
+    print(f"✅ Rollup cube saved to {cube_path} ({len(cube_data['totals'][0])} cells)")
+
+
+def load_rollup_cube(cube_path=ROLLUP_CUBE_PATH):
+    """保存したキューブ（無い・形式が合わない場合は None）"""
+    if not os.path.exists(cube_path):
+        print(f"Error: {cube_path} not found (run data_aggregator.py first)")
+        return None
+
+    with gzip.open(cube_path, 'rt', encoding='utf-8') as f:
+        data = json.load(f)
+
+    if data.get('version') != CUBE_VERSION or data.get('dimensions') != list(DIMENSIONS):
+        print(f"Error: {cube_path} was written by an incompatible aggregator")
+        return None
+    return RollupCube.from_dict(data)
+
+
+def _parse_where(value):
+    dimension, _, field_value = value.partition('=')
+    if not field_value:
+        raise argparse.ArgumentTypeError(f"expected DIMENSION=VALUE: {value}")
+    return dimension, field_value
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Answer filtered play-count queries from the saved rollup cube')
+    parser.add_argument('--cube', default=ROLLUP_CUBE_PATH, help='path of the rollup cube')
+    parser.add_argument('--by', nargs='+', default=['day'], metavar='DIMENSION',
+                        help=f"dimensions to group by ({', '.join(DIMENSIONS)})")
+    parser.add_argument('--days', type=int, help='only the last N days including today')
+    parser.add_argument('--since', help='first day (YYYY-MM-DD)')
+    parser.add_argument('--until', help='last day (YYYY-MM-DD)')
+    parser.add_argument('--where', type=_parse_where, action='append', default=[], metavar='DIMENSION=VALUE',
+                        help='only cells where the dimension has this value (repeatable)')
+    args = parser.parse_args()
+
+    cube = load_rollup_cube(args.cube)
+    if cube is None:
+        sys.exit(1)
+
+    since = args.since
+    if args.days:
+        since = (date.today() - timedelta(days=args.days - 1)).isoformat()
+    where = {}
+    for dimension, value in args.where:
+        where.setdefault(dimension, set()).add(value)
+
+    try:
+        rows = cube.rollup_rows(args.by, since=since, until=args.until, where=where)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print(json.dumps(rows, ensure_ascii=False, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Sessions
+timeStamp のイベントと results のプレイ記録からプレイセッションを復元する
+
+ユーザーごとにキー順のイベントを1回走査し、前の活動から gap 秒以上空いた場合と、
+活動（プレイや launch / AppStart 以外のイベント）のあとに launch / AppStart が来た場合にセッションを区切る
+（launch の直後の AppStart は同じセッション）。
+results はプレイ時刻でソートしてイベントの列とマージ結合し、イベントと同じく活動として扱う
+（プレイ時刻がイベントより前なら先に処理する）。1プレイ = セッションの曲数 1。
+
+終わったセッションは長さ・曲数のヒストグラムと開始日ごとの数に足して捨て、
+ユーザーごとに最後のセッションだけを保持する（増分集計で次回の新しいイベントが続きになる場合がある）。
+"""
+
+from quantiles import PERCENTILES, ValueHistogram
+
+# セッションを区切る無操作の時間（秒）
+DEFAULT_SESSION_GAP = 30 * 60
+
+# セッションを開始するイベント
+SESSION_START_EVENTS = frozenset(['launch', 'AppStart'])
+
+# セッションの長さの区分（秒、上限を含まない）
+SESSION_LENGTH_BRACKETS = [('<1m', 60), ('1-5m', 5 * 60), ('5-15m', 15 * 60), ('15-30m', 30 * 60),
+                           ('30-60m', 60 * 60), ('60m+', None)]
+# 曲数の分布で個別に数える最大の曲数（それ以上は「N+」にまとめる）
+MAX_SONGS_BUCKET = 10
+
+# ユーザーの最後のセッション: [開始時刻, 最後の活動の時刻, 曲数, 開始日, 活動があったか, ユーザーのセッション数]
+_START, _LAST, _SONGS, _DAY, _ACTIVE, _USER_SESSIONS = range(6)
+
+
+def _length_brackets(lengths):
+    counts = [0] * len(SESSION_LENGTH_BRACKETS)
+    for length, count in lengths.items():
+        for index, (_, upper) in enumerate(SESSION_LENGTH_BRACKETS):
+            if upper is None or length < upper:
+                counts[index] += count
+                break
+    return [{'bracket': name, 'sessions': count} for (name, _), count in zip(SESSION_LENGTH_BRACKETS, counts)]
+
+
+def _song_buckets(songs):
+    counts = [0] * (MAX_SONGS_BUCKET + 1)
+    for value, count in songs.items():
+        counts[min(value, MAX_SONGS_BUCKET)] += count
+    return [
+        {'songs': str(value) if value < MAX_SONGS_BUCKET else f"{MAX_SONGS_BUCKET}+", 'sessions': count}
+        for value, count in enumerate(counts)
+    ]
+
+
+def _stats(histogram, percents):
+    if not histogram.total():
+        return {'mean': 0, **histogram.percentiles(percents)}
+    return {'mean': round(histogram.mean(), 2), **histogram.percentiles(percents)}
+
+
+class Sessionizer:
+    """
+    ユーザーごとの時刻順の活動をセッションに分ける
+
+    start_user → add_play（プレイ時刻、順不同）→ add_event（時刻順）→ end_user の順に呼ぶ。
+    lengths / songs は終わったセッションの長さ（秒、整数に丸める）・曲数のヒストグラム、
+    days は開始日ごとのセッション数、open_sessions はユーザーごとの最後のセッション。
+    """
+
+    def __init__(self, gap=DEFAULT_SESSION_GAP):
+        self.gap = gap
+        self.lengths = ValueHistogram()
+        self.songs = ValueHistogram()
+        self.days = {}
+        self.open_sessions = {}
+        self._session = None
+        self._plays = []
+        # 次に処理するプレイの位置（None ならまだソートしていない）
+        self._next_play = None
+
+    def start_user(self, user_id):
+        self._session = self.open_sessions.get(user_id)
+        self._plays = []
+        self._next_play = None
+
+    def add_play(self, seconds, day):
+        self._plays.append((seconds, day))
+
+    def _close(self, session):
+        self.lengths.add(round(session[_LAST] - session[_START]))
+        self.songs.add(session[_SONGS])
+        self.days[session[_DAY]] = self.days.get(session[_DAY], 0) + 1
+
+    def _activity(self, seconds, day, song=False, start_event=False):
+        session = self._session
+        if session is None or seconds - session[_LAST] > self.gap or (start_event and session[_ACTIVE]):
+            user_sessions = 1
+            if session is not None:
+                self._close(session)
+                user_sessions = session[_USER_SESSIONS] + 1
+            session = self._session = [seconds, seconds, 0, day, False, user_sessions]
+        if seconds > session[_LAST]:
+            session[_LAST] = seconds
+        if song:
+            session[_SONGS] += 1
+        if not start_event:
+            session[_ACTIVE] = True
+
+    def _drain_plays(self, until=None):
+        """時刻が until 以下の（None なら全ての）プレイを活動として処理する"""
+        plays = self._plays
+        if self._next_play is None:
+            plays.sort()
+            self._next_play = 0
+        while self._next_play < len(plays) and (until is None or plays[self._next_play][0] <= until):
+            seconds, day = plays[self._next_play]
+            self._activity(seconds, day, song=True)
+            self._next_play += 1
+
+    def add_event(self, event, seconds, day):
+        self._drain_plays(seconds)
+        self._activity(seconds, day, start_event=event in SESSION_START_EVENTS)
+
+    def end_user(self, user_id):
+        self._drain_plays()
+        if self._session is not None:
+            self.open_sessions[user_id] = self._session
+        self._session = None
+        self._plays = []
+
+    def to_state(self):
+        return {
+            'lengths': self.lengths.to_state(),
+            'songs': self.songs.to_state(),
+            'days': dict(self.days),
+            'openSessions': {user_id: list(session) for user_id, session in self.open_sessions.items()},
+        }
+
+    @classmethod
+    def from_state(cls, state, gap=DEFAULT_SESSION_GAP):
+        sessionizer = cls(gap)
+        sessionizer.lengths = ValueHistogram.from_state(state['lengths'])
+        sessionizer.songs = ValueHistogram.from_state(state['songs'])
+        sessionizer.days = dict(state['days'])
+        sessionizer.open_sessions = {user_id: list(session) for user_id, session in state['openSessions'].items()}
+        return sessionizer
+
+    def merge(self, other):
+        """別のシャードの集計を結合する（シャード間でユーザーは重複しない）"""
+        self.lengths.merge(other.lengths)
+        self.songs.merge(other.songs)
+        for day, count in other.days.items():
+            self.days[day] = self.days.get(day, 0) + count
+        self.open_sessions.update(other.open_sessions)
+
+    def summary(self, percents=PERCENTILES):
+        """
+        セッションの指標（最後のセッションも終わったものとして数える）
+
+        sessionLength は秒、sessionsPerDay は開始日ごとのセッション数（日付順）。
+        """
+        lengths = ValueHistogram(self.lengths.counts)
+        songs = ValueHistogram(self.songs.counts)
+        days = dict(self.days)
+        per_user = ValueHistogram()
+        for session in self.open_sessions.values():
+            lengths.add(round(session[_LAST] - session[_START]))
+            songs.add(session[_SONGS])
+            days[session[_DAY]] = days.get(session[_DAY], 0) + 1
+            per_user.add(session[_USER_SESSIONS])
+
+        return {
+            'gapSeconds': self.gap,
+            'totalSessions': lengths.total(),
+            'sessionLength': {**_stats(lengths, percents), 'distribution': _length_brackets(lengths.counts)},
+            'songsPerSession': {**_stats(songs, percents), 'distribution': _song_buckets(songs.counts)},
+            'sessionsPerUser': _stats(per_user, percents),
+            'sessionsPerDay': [{'date': day, 'sessions': days[day]} for day in sorted(days)],
+        }
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Synthetic Data
+FIREBASE_DATA_STRUCTURE.md と同じ構造の users/ を任意のユーザー数で生成する（ベンチマーク用）
+
+    python scripts/synthetic_data.py 100000 /tmp/raw_100k.snap [--seed 0]
+    python scripts/synthetic_data.py 1000 /tmp/raw_1k.json
+
+同じ seed なら何度生成しても同じデータになる。ユーザーごとに seed とユーザー番号から乱数を作るため、
+小さいデータは大きいデータの先頭と一致する（1k は 1M の先頭 1k ユーザー）。
+
+1ユーザーあたりのプレイ数・イベント数は本番データ（約16.5kユーザー・約125kプレイ）に合わせ、
+本番で見つかっている異常値も一定の割合で含める:
+- 仏暦のタイムスタンプ（2568年）、テストデータの2019年、データ期間より後の日付
+- 辞書ではない results のエントリ、数値ではない score / clearRate
+- 旧形式のカットシーンイベント（CutSceneStart_Daia_1）と表記ゆれ（Hiakru）
+"""
+
+import argparse
+import json
+import os
+import random
+from datetime import datetime, timedelta
+
+from raw_snapshot import write_snapshot
+
+DEFAULT_SEED = 0
+# 生成ロジックを変えたら上げる（ベンチマークの生成済みデータを作り直す）
+GENERATOR_VERSION = 1
+
+# データ期間（DATA_END より後の日付は未来日付の異常値としてだけ使う）
+DATA_START = datetime(2025, 9, 1)
+DATA_END = datetime(2025, 11, 12)
+
+SONGS = {
+    'Daia': ['D01ihuu', 'D02krmi', 'D03trko', 'D04angr'],
+    'Seika': ['S01suyo', 'S02arru', 'S03unmi', 'S04haku'],
+    'Hikaru': ['H01uiri', 'H02moon', 'H03gara', 'H04hiso'],
+}
+OTHER_SONGS = ['Allkank', 'Allkank_Destroy', 'Music_Tutorial']
+DIFFICULTIES = ['Easy', 'Normal', 'Hard']
+CLEAR_RANKS = ['MMM', 'MM', 'M', 'A', 'B', 'C', 'D', 'None']
+CLEAR_TYPES = ['Failed', 'Clear', 'FullCombo', 'Perfect']
+CLEAR_TYPE_WEIGHTS = [30, 50, 15, 5]
+LANGUAGES = ['ja', 'en', 'es', 'zh', 'ko']
+LANGUAGE_WEIGHTS = [45, 35, 8, 7, 5]
+SYSTEM_LANGUAGES = {'ja': 'Japanese', 'en': 'English', 'es': 'Spanish', 'zh': 'ChineseSimplified', 'ko': 'Korean'}
+# platform / costume は実データの値ではない（集計の分岐と種類数を再現するための値）
+PLATFORMS = ['Windows', 'Mac', 'Switch', 'PS5']
+PLATFORM_WEIGHTS = [60, 10, 20, 10]
+COSTUMES = [f"Costume{number:02d}" for number in range(12)]
+# カットシーン名（キャラクターのカットシーンはイベント名の表記に合わせて Hiakru）
+CUTSCENES = ['Op', 'Ed1', 'Ed2'] + [
+    f"{character}_{number}" for character in ('Daia', 'Seika', 'Hiakru') for number in range(1, 6)
+]
+
+# 1ユーザーあたりのセッション数・1セッションあたりのプレイ数（平均が本番の約7.6プレイ/ユーザーになる値）
+MEAN_EXTRA_SESSIONS = 2.0
+NO_PLAY_SESSION_RATE = 0.3
+MEAN_PLAYS_PER_SESSION = 3.6
+CUTSCENE_RATE = 0.3
+OPTION_RATE = 0.9
+
+# 異常値の割合（本番の除外データは全体の約0.26%）
+BUDDHIST_ERA_RATE = 0.0024
+TEST_YEAR_RATE = 0.0001
+FUTURE_DATE_RATE = 0.0001
+NON_DICT_RESULT_RATE = 0.001
+INVALID_VALUE_RATE = 0.002
+LEGACY_CUTSCENE_RATE = 0.1
+
+_PUSH_ID_CHARS = '-0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ_abcdefghijklmnopqrstuvwxyz'
+
+
+def _user_id(rng):
+    """Firebase の push ID と同じ形式（20文字）のユーザーID"""
+    return ''.join(rng.choice(_PUSH_ID_CHARS) for _ in range(20))
+
+
+def _geometric(rng, mean):
+    """平均 mean の幾何分布（0以上の整数）"""
+    count = 0
+    stop = 1 / (mean + 1)
+    while rng.random() >= stop:
+        count += 1
+    return count
+
+
+class _UserClock:
+    """ユーザーのイベント時刻（キーが重複しないように単調増加させる）"""
+
+    def __init__(self, rng, start):
+        self.rng = rng
+        self.now = start
+
+    def advance(self, **delta):
+        self.now += timedelta(**delta)
+
+    def key(self, anomalies=True):
+        """現在時刻のタイムスタンプキー（一定の割合で異常な年・日付にする）"""
+        self.now += timedelta(milliseconds=self.rng.randint(1, 999))
+        moment = self.now
+        year = moment.year
+        if anomalies:
+            roll = self.rng.random()
+            if roll < BUDDHIST_ERA_RATE:
+                year += 543
+            elif roll < BUDDHIST_ERA_RATE + TEST_YEAR_RATE:
+                year = 2019
+            elif roll < BUDDHIST_ERA_RATE + TEST_YEAR_RATE + FUTURE_DATE_RATE:
+                moment = DATA_END + timedelta(days=self.rng.randint(1, 40), seconds=self.rng.randint(0, 86399))
+                year = moment.year
+        return f"{year:04d}{moment.strftime('-%m-%d-%H-%M-%S')}-{moment.microsecond // 1000:03d}"
+
+
+def _result(rng, character, song, difficulty, play_count, total_play_count, anomalies):
+    """results の1エントリ"""
+    clear_rate = min(100, max(0, int(rng.gauss(55, 30))))
+    clear_type = rng.choices(CLEAR_TYPES, CLEAR_TYPE_WEIGHTS)[0]
+    if clear_type == 'Failed':
+        clear_rank = 'None' if clear_rate < 30 else rng.choice(CLEAR_RANKS[4:])
+    else:
+        clear_rank = rng.choice(CLEAR_RANKS[:7])
+    score = rng.randint(0, 99999)
+
+    result = {
+        'affinityLevel': 1 + total_play_count // 10,
+        'affinityMidLevel': 1 + total_play_count % 10,
+        'character': character,
+        'clearRank': clear_rank,
+        'clearRate': clear_rate,
+        'clearType': clear_type,
+        'difficulty': difficulty,
+        'gameType': song,
+        'maxScore': max(score, rng.randint(0, 99999)),
+        'playCount': play_count,
+        'playMode': 'Story',
+        'score': score,
+        'totalPlayCount': total_play_count,
+    }
+    if rng.random() < 0.85:
+        result['platform'] = rng.choices(PLATFORMS, PLATFORM_WEIGHTS)[0]
+    if rng.random() < 0.7:
+        result['costume'] = rng.choice(COSTUMES)
+
+    if anomalies and rng.random() < INVALID_VALUE_RATE:
+        result[rng.choice(['score', 'clearRate'])] = rng.choice(['', '-', 'error'])
+    return result
+
+
+def _cutscene_events(rng, clock, timestamps, anomalies):
+    """カットシーン1回分の Start / Skip / End イベント"""
+    cutscene = rng.choice(CUTSCENES)
+    legacy = anomalies and '_' in cutscene and rng.random() < LEGACY_CUTSCENE_RATE
+
+    def event(action):
+        return f"CutScene{action}_{cutscene}" if legacy else f"CutScene_{cutscene}_{action}"
+
+    timestamps[clock.key(anomalies)] = event('Start')
+    skipped = rng.random() < 0.5
+    if skipped:
+        clock.advance(seconds=rng.randint(1, 20))
+        timestamps[clock.key(anomalies)] = event('Skip')
+    # End が記録されないセッションもある（アプリ終了など）
+    if rng.random() < 0.75:
+        clock.advance(seconds=rng.randint(1, 5) if skipped else rng.randint(30, 180))
+        timestamps[clock.key(anomalies)] = event('End')
+
+
+def generate_user(index, seed=DEFAULT_SEED, anomalies=True):
+    """index 番目のユーザーの (user_id, user_data)"""
+    rng = random.Random(f"{seed}:{index}")
+    data_days = (DATA_END - DATA_START).days
+    clock = _UserClock(rng, DATA_START + timedelta(days=rng.randint(0, data_days),
+                                                   seconds=rng.randint(0, 86399)))
+    language = rng.choices(LANGUAGES, LANGUAGE_WEIGHTS)[0]
+
+    results = {}
+    timestamps = {}
+    song_play_counts = {}
+    session_count = 1 + _geometric(rng, MEAN_EXTRA_SESSIONS)
+
+    for _ in range(session_count):
+        timestamps[clock.key(anomalies)] = 'launch'
+        clock.advance(seconds=rng.randint(1, 10))
+        timestamps[clock.key(anomalies)] = 'AppStart'
+
+        plays = 0 if rng.random() < NO_PLAY_SESSION_RATE else 1 + _geometric(rng, MEAN_PLAYS_PER_SESSION - 1)
+        for _ in range(plays):
+            character = rng.choice(list(SONGS))
+            song = rng.choice(SONGS[character]) if rng.random() < 0.95 else rng.choice(OTHER_SONGS)
+            difficulty = rng.choices(DIFFICULTIES, [35, 45, 20])[0]
+            clock.advance(seconds=rng.randint(90, 300))
+
+            song_play_counts[song] = song_play_counts.get(song, 0) + 1
+            event_key = clock.key(anomalies)
+            timestamps[event_key] = f"GameEnd_{song}"
+            result_key = f"{clock.key(anomalies)}_{song}_{difficulty}"
+            if anomalies and rng.random() < NON_DICT_RESULT_RATE:
+                results[result_key] = rng.choice(['', 'error', 0])
+            else:
+                results[result_key] = _result(rng, character, song, difficulty, song_play_counts[song],
+                                              len(results) + 1, anomalies)
+
+            if rng.random() < CUTSCENE_RATE:
+                clock.advance(seconds=rng.randint(1, 10))
+                _cutscene_events(rng, clock, timestamps, anomalies)
+
+        if rng.random() < 0.2:
+            clock.advance(seconds=rng.randint(5, 60))
+            timestamps[clock.key(anomalies)] = 'OptionExit'
+        clock.advance(hours=rng.randint(1, 72))
+
+    user_data = {
+        'launch_count': session_count,
+        'systemLanguage': SYSTEM_LANGUAGES[language],
+    }
+    if rng.random() < OPTION_RATE:
+        option_clock = _UserClock(rng, DATA_START + timedelta(days=rng.randint(0, data_days)))
+        user_data['option'] = {}
+        for _ in range(1 + _geometric(rng, 0.5)):
+            option_clock.advance(days=rng.randint(0, 3))
+            user_data['option'][option_clock.key(anomalies=False)] = {
+                'Resolution': rng.choice(['1920x1080', '1280x720', '2560x1440']),
+                'bgm': rng.randint(0, 10),
+                'isFullScreen': rng.random() < 0.6,
+                'movie': rng.randint(0, 10),
+                'se': rng.randint(0, 10),
+                'settingLanguage': language if rng.random() < 0.9 else rng.choice(LANGUAGES),
+                'voice': rng.randint(0, 10),
+            }
+    # Firebase は空のノードを保存しない
+    if results:
+        user_data['results'] = results
+    if timestamps:
+        user_data['timeStamp'] = timestamps
+
+    return _user_id(rng), user_data
+
+
+def generate_users(user_count, seed=DEFAULT_SEED, anomalies=True):
+    """user_count 人の (user_id, user_data) を順に返す"""
+    for index in range(user_count):
+        yield generate_user(index, seed, anomalies)
+
+
+def _write_json(users_items, output_path):
+    """(user_id, user_data) の列を raw_data.json（1ユーザーずつ書き出す）として保存"""
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    user_count = 0
+    with open(output_path, 'w', encoding='utf-8') as f:
+        f.write('{')
+        for user_id, user_data in users_items:
+            if user_count:
+                f.write(',')
+            f.write(f"\n{json.dumps(user_id)}: {json.dumps(user_data, ensure_ascii=False)}")
+            user_count += 1
+        f.write('\n}\n')
+    return user_count
+
+
+def write_synthetic_data(user_count, output_path, seed=DEFAULT_SEED, anomalies=True):
+    """
+    合成データを output_path に保存し、件数の辞書を返す
+
+    拡張子が .json なら raw_data.json 形式、それ以外は raw snapshot 形式で保存する。
+    """
+    counts = {'users': 0, 'results': 0, 'events': 0}
+
+    def counted(users_items):
+        for user_id, user_data in users_items:
+            counts['users'] += 1
+            counts['results'] += len(user_data.get('results', {}))
+            counts['events'] += len(user_data.get('timeStamp', {}))
+            yield user_id, user_data
+
+    users_items = counted(generate_users(user_count, seed, anomalies))
+    if output_path.endswith('.json'):
+        _write_json(users_items, output_path)
+    else:
+        write_snapshot(users_items, output_path)
+
+    counts['bytes'] = os.path.getsize(output_path)
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate synthetic Firebase users/ data for benchmarks')
+    parser.add_argument('user_count', type=int)
+    parser.add_argument('output_path', help='.json for raw_data.json, otherwise a raw snapshot')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED)
+    parser.add_argument('--no-anomalies', action='store_true', help='do not include anomalous timestamps and values')
+    args = parser.parse_args()
+
+    counts = write_synthetic_data(args.user_count, args.output_path, args.seed, not args.no_anomalies)
+    print(f"✅ Generated {counts['users']} users, {counts['results']} results, {counts['events']} events "
+          f"→ {args.output_path} ({counts['bytes'] / (1024 * 1024):.1f} MB)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Timestamp Normalizer
+results / timeStamp のキー（YYYY-MM-DD-HH-MM-SS-MS形式）を1回だけ解析して正規化する
+"""
+
+from datetime import datetime, date
+from functools import lru_cache
+
+# 集計対象とする年（これ以外の年は異常値として除外）
+VALID_YEAR = 2025
+
+
+def convert_buddhist_era_to_christian_era(date_string):
+    """
+    タイ仏暦（Buddhist Era）を西暦（Christian Era）に変換
+    2568年 → 2025年 (2568 - 543 = 2025)
+    """
+    try:
+        parts = date_string.split('-')
+        year = int(parts[0])
+
+        # 2500年以上の年は仏暦と判断して変換
+        if year >= 2500:
+            year = year - 543
+            parts[0] = str(year)
+            return '-'.join(parts)
+
+        return date_string
+    except:
+        return date_string
+
+
+class TimestampNormalizer:
+    """
+    タイムスタンプキーの正規化とフィルタリング
+
+    normalize(key) は (正規化済みキー, 日付) を返す。
+    正規化済みキーは仏暦を西暦に変換したキー、日付は集計対象なら 'YYYY-MM-DD'、
+    除外対象（異常年・未来日付・解析不能）なら None。
+    キーの先頭10文字（日付部分）ごとに解析結果をキャッシュするため、
+    strptime を呼ぶのは異なる日付ごとに1回だけになる。
+    """
+
+    def __init__(self, today=None):
+        self.today = today or date.today()
+        # 日付部分 → (変換後の日付部分 or None, 集計対象の日付 or None)、固定長で解析できない場合は False
+        self._prefix_cache = {}
+
+    def normalize(self, key):
+        """キーを正規化して (正規化済みキー, 日付 or None) を返す"""
+        # 固定長形式（YYYY-MM-DD-...）はスライスで解析
+        if key[10:11] == '-':
+            prefix = key[:10]
+            entry = self._prefix_cache.get(prefix)
+            if entry is None:
+                entry = self._prefix_cache[prefix] = self._parse_prefix(prefix)
+            if entry is not False:
+                converted_prefix, day = entry
+                if converted_prefix is not None:
+                    key = converted_prefix + key[10:]
+                return key, day
+
+        return self._normalize_slow(key)
+
+    def is_future(self, key):
+        """正規化済みキーが今日より後の日付（時間が経てば集計対象になるキー）か"""
+        try:
+            parts = key.split('_')[0].split('-')
+            if int(parts[0]) != VALID_YEAR:
+                return False
+            date_obj = datetime.strptime('-'.join(parts[:3]), '%Y-%m-%d').date()
+        except:
+            return False
+        return date_obj > self.today
+
+    def _parse_prefix(self, prefix):
+        """'YYYY-MM-DD' 形式の日付部分を解析"""
+        if prefix[4] != '-' or prefix[7] != '-':
+            return False
+        year_part, month_part, day_part = prefix[:4], prefix[5:7], prefix[8:10]
+        if not (year_part.isdigit() and month_part.isdigit() and day_part.isdigit()):
+            return False
+
+        year = int(year_part)
+        converted_prefix = None
+
+        # 2500年以上の年は仏暦と判断して変換
+        if year >= 2500:
+            year = year - 543
+            converted_prefix = f"{year}{prefix[4:]}"
+
+        # 異常な年を除外（2025年のみ許可）
+        if year != VALID_YEAR:
+            return converted_prefix, None
+
+        try:
+            date_obj = date(year, int(month_part), int(day_part))
+        except ValueError:
+            return converted_prefix, None
+
+        # 未来の日付を除外
+        if date_obj > self.today:
+            return converted_prefix, None
+
+        return converted_prefix, converted_prefix or prefix
+
+    def _normalize_slow(self, key):
+        """
+        固定長でないキーを従来どおり split() と strptime で解析
+
+        日付は 0 埋めされていないキー（2025-9-5-...）でも 'YYYY-MM-DD' に揃えて返す。
+        """
+        key = convert_buddhist_era_to_christian_era(key)
+        try:
+            parts = key.split('_')[0].split('-')
+            year = int(parts[0])
+            if year != VALID_YEAR:
+                return key, None
+
+            date_obj = datetime.strptime('-'.join(parts[:3]), '%Y-%m-%d').date()
+            if date_obj > self.today:
+                return key, None
+        except:
+            return key, None
+
+        return key, date_obj.isoformat()
+
+
+@lru_cache(maxsize=4096)
+def _day_seconds(year, month, day):
+    return date(int(year), int(month), int(day)).toordinal() * 86400
+
+
+@lru_cache(maxsize=1 << 16)
+def _hour_seconds(prefix):
+    """'YYYY-MM-DD-HH' の秒（同じ日時のキーが多いのでキャッシュする）"""
+    return _day_seconds(prefix[:4], prefix[5:7], prefix[8:10]) + int(prefix[11:13]) * 3600
+
+
+def timestamp_seconds(key):
+    """
+    正規化済みキー（YYYY-MM-DD-HH-MM-SS-MS）の時刻を秒で返す（紀元からの日数 × 86400 + 時刻、ミリ秒は小数）
+
+    時刻の差（セッションの長さ・イベントの間隔）を求めるためのもので、解析できない場合は None。
+    """
+    try:
+        # 固定長形式はスライスで解析
+        if len(key) >= 23 and key[10] == '-' and key[13] == '-' and key[16] == '-' and key[19] == '-':
+            return _hour_seconds(key[:13]) + int(key[14:16]) * 60 + int(key[17:19]) + int(key[20:23]) / 1000
+
+        parts = key.split('_', 1)[0].split('-')
+        seconds = _day_seconds(*parts[:3])
+        if len(parts) > 3:
+            seconds += int(parts[3]) * 3600
+        if len(parts) > 4:
+            seconds += int(parts[4]) * 60
+        if len(parts) > 5:
+            seconds += int(parts[5])
+        if len(parts) > 6:
+            seconds += int(parts[6]) / 1000
+    except (TypeError, ValueError):
+        return None
+    return seconds